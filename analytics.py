@@ -0,0 +1,215 @@
+"""
+Wire geometry analytics of a program, planned or legacy.
+
+Per wire, as array operations over the whole program:
+    length      srce pad to dest pad, mm
+    angle       direction from srce to dest, degrees
+    span        reach across the ranks, along the side's axis (y for N and S, x for W and E), mm
+    srce_pitch  distance to the previous srce pad of the same srce ref system, taken in pad
+                order along the side, not in bonding order, mm
+    dest_pitch  the same between the dest pads of one dest ref system, mm
+Summaries (count, min, max, mean, 5th, 50th and 95th percentiles) and histograms are
+given for the whole program, per side and per srce ref system. Limits flag wires outside
+a range, e.g. --limit length 0.5 6 for wires too short or too long to loop.
+
+Legacy .CAD programs have no sides, so their wires are classified as cad2svg.py does.
+
+Usage:
+    python analytics.py name.plan [--limit METRIC MIN MAX ...] [--bins 20] [--html name_stats.html]
+Writes name_stats.json.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from plan import read_program
+from sectors import FOUR_SIDES, axes, classify, wire_angles
+
+METRICS = ['length', 'angle', 'span', 'srce_pitch', 'dest_pitch']
+PERCENTILES = [5, 50, 95]
+MAX_ROWS = 20  # wires listed per flagged limit, counts are always complete
+
+
+def wire_metrics(plan) -> dict:
+    """Metrics of every wire, NaN where a pitch has no previous pad"""
+    wires = plan.wires
+    sides = np.asarray(wires['side'], dtype=np.int64)
+    names = list(plan.sides)
+    layout = plan.settings.get('sectors', FOUR_SIDES)
+    if len(wires) and (sides < 0).any():
+        names = [sector[0] for sector in layout]
+        sides = classify(wire_angles(wires['sx'], wires['sy'], wires['dx'], wires['dy']), layout)
+    # axis of each side by its sector name, by its compass letter for the N1, W1 ... of multidie.py
+    axis_of = dict(zip([sector[0] for sector in layout], axes(layout)))
+    along_x = np.array([axis_of.get(name, 'x' if name[:1] in 'WE' else 'y') == 'x' for name in names], dtype=bool)
+
+    ddx = wires['dx'] - wires['sx']
+    ddy = wires['dy'] - wires['sy']
+    span = np.abs(np.where(along_x[sides], ddx, ddy))
+
+    # neighbouring pads of one ref system, ordered along the side: bonding order follows the pin list
+    return {
+        'length': np.hypot(ddx, ddy),
+        'angle': np.degrees(np.arctan2(ddy, ddx)),
+        'span': span,
+        'srce_pitch': pad_pitch(wires['sx'], wires['sy'], wires['srce_ref'], along_x[sides]),
+        'dest_pitch': pad_pitch(wires['dx'], wires['dy'], wires['dest_ref'], along_x[sides]),
+        'side': sides,
+        'side_names': names,
+    }
+
+
+def pad_pitch(x, y, refs, across_x):
+    """
+    Distance of each pad to the previous one of its ref system, in order along the side, NaN for the first
+    across_x is True where ranks share x, i.e. the pads of a rank are ordered by y
+    """
+    pitch = np.full(len(refs), np.nan)
+    if not len(refs):
+        return pitch
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    refs = np.asarray(refs)
+    order = np.lexsort((np.where(across_x, y, x), refs))
+    same = np.r_[False, refs[order][1:] == refs[order][:-1]]
+    gaps = np.r_[np.nan, np.hypot(np.diff(x[order]), np.diff(y[order]))]
+    pitch[order[same]] = gaps[same]
+    return pitch
+
+
+def group_summary(values, groups, count) -> dict:
+    """Count, min, max, mean and percentiles of values per group, NaN values left out"""
+    ok = ~np.isnan(values)
+    values = values[ok]
+    groups = groups[ok]
+    order = np.lexsort((values, groups))
+    values = values[order]
+    bounds = np.searchsorted(groups[order], np.arange(count + 1))
+    n = np.diff(bounds)
+    has = n > 0
+    lo = bounds[:-1]
+    summary = {'count': n.tolist()}
+    sums = np.add.reduceat(values, lo[has]) if len(values) else np.zeros(0)
+    for key, pick in (('min', lambda: values[lo[has]]), ('max', lambda: values[lo[has] + n[has] - 1]),
+                      ('mean', lambda: sums / n[has])):
+        col = np.full(count, np.nan)
+        col[has] = pick()
+        summary[key] = col
+    for q in PERCENTILES:
+        # linear interpolation between the sorted values, as np.percentile
+        at = lo[has] + (n[has] - 1) * q / 100
+        below = np.floor(at).astype(np.int64)
+        above = np.minimum(below + 1, lo[has] + n[has] - 1)
+        col = np.full(count, np.nan)
+        col[has] = values[below] + (values[above] - values[below]) * (at - below)
+        summary[f'p{q}'] = col
+    return {key: _plain(val) for key, val in summary.items()}
+
+
+def _plain(values):
+    """List for JSON, None for NaN, rounded to the micron"""
+    if isinstance(values, list):
+        return values
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+
+def group_histograms(values, groups, count, edges) -> list:
+    """Counts per bin of values per group, all groups over the same bin edges"""
+    ok = ~np.isnan(values)
+    bins = np.clip(np.searchsorted(edges, values[ok], side='right') - 1, 0, len(edges) - 2)
+    flat = np.bincount(groups[ok] * (len(edges) - 1) + bins, minlength=count * (len(edges) - 1))
+    return flat.reshape(count, len(edges) - 1).tolist()
+
+
+def flag_limits(metrics, wires, limits) -> list:
+    """Wires outside each [min, max] limit"""
+    flags = []
+    for metric, (low, high) in limits.items():
+        values = metrics[metric]
+        out = np.flatnonzero(~np.isnan(values) & ((values < low) | (values > high)))
+        flags.append({'metric': metric, 'min': low, 'max': high, 'count': int(len(out)),
+                      'wires': wires['wire'][out[:MAX_ROWS]].tolist()})
+    return flags
+
+
+def analyse(plan, limits=None, bins=20) -> dict:
+    """Summaries and histograms of every metric, whole program, per side and per srce ref system"""
+    metrics = wire_metrics(plan)
+    wires = plan.wires
+    refs, ref_group = np.unique(wires['srce_ref'], return_inverse=True)
+    groupings = {
+        'all': (np.zeros(len(wires), dtype=np.int64), ['all']),
+        'side': (metrics['side'], metrics['side_names']),
+        'srce_ref': (ref_group.ravel(), refs.tolist()),
+    }
+    report = {'wires': len(wires), 'metrics': {}, 'limits': flag_limits(metrics, wires, limits or {})}
+    for metric in METRICS:
+        values = metrics[metric]
+        finite = values[~np.isnan(values)]
+        edges = np.histogram_bin_edges(finite, bins=bins) if len(finite) else np.linspace(0, 1, bins + 1)
+        entry = {'edges': _plain(edges)}
+        for name, (groups, labels) in groupings.items():
+            entry[name] = {
+                'groups': labels,
+                'summary': group_summary(values, groups, len(labels)),
+                'histogram': group_histograms(values, groups, len(labels), edges),
+            }
+        report['metrics'][metric] = entry
+    return report
+
+
+def html_table(report, title) -> str:
+    """Summary tables per metric and grouping, flagged limits first"""
+    rows = [f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<title>{title} wire statistics</title>',
+            '<meta charset="utf-8">',
+            '<style>body { font-family: sans-serif; } table { border-collapse: collapse; margin-bottom: 1em; }'
+            ' td, th { border: 1px solid #ccc; padding: 2px 6px; text-align: right; } .flag { color: #c00; }</style>',
+            f'</head>\n<body>\n<h1>{title}: {report["wires"]} wires</h1>']
+    for flag in report['limits']:
+        cls = ' class="flag"' if flag['count'] else ''
+        rows.append(f'<p{cls}>{flag["metric"]} outside {flag["min"]} to {flag["max"]}: {flag["count"]} wires'
+                    + (f' (e.g. {", ".join(map(str, flag["wires"]))})' if flag['count'] else '') + '</p>')
+    keys = ['count', 'min', 'max', 'mean'] + [f'p{q}' for q in PERCENTILES]
+    for metric, entry in report['metrics'].items():
+        rows.append(f'<h2>{metric}</h2>')
+        for grouping in ('all', 'side', 'srce_ref'):
+            table = entry[grouping]
+            rows.append('<table>\n<tr><th>' + grouping + '</th>' + ''.join(f'<th>{k}</th>' for k in keys) + '</tr>')
+            for i, label in enumerate(table['groups']):
+                cells = ''.join(f'<td>{"" if table["summary"][k][i] is None else table["summary"][k][i]}</td>'
+                                for k in keys)
+                rows.append(f'<tr><th>{label}</th>{cells}</tr>')
+            rows.append('</table>')
+    rows.append('</body>\n</html>')
+    return '\n'.join(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wire geometry statistics of a program')
+    parser.add_argument('program', help='.plan or .CAD file')
+    parser.add_argument('--limit', nargs=3, action='append', default=[], metavar=('METRIC', 'MIN', 'MAX'),
+                        help=f'flag wires outside a range, metric one of {", ".join(METRICS)}')
+    parser.add_argument('--bins', type=int, default=20, help='histogram bins per metric')
+    parser.add_argument('--html', help='also write the summaries as an html table')
+    args = parser.parse_args()
+
+    name = args.program.rsplit('.', 1)[0]
+    checks = {}
+    for metric, low, high in args.limit:
+        if metric not in METRICS:
+            parser.error(f'unknown metric {metric}')
+        checks[metric] = (float(low), float(high))
+    result = analyse(read_program(args.program), checks, args.bins)
+    with open(name + '_stats.json', 'wt') as fout:
+        json.dump(result, fout, indent=1)
+    print(name + '_stats.json file created')
+    for metric in METRICS:
+        overall = result['metrics'][metric]['all']['summary']
+        print(f"{metric:11s} min {overall['min'][0]}  p50 {overall['p50'][0]}  max {overall['max'][0]}")
+    for flag in result['limits']:
+        print(f"{flag['metric']} outside {flag['min']} to {flag['max']}: {flag['count']} wires")
+    if args.html:
+        with open(args.html, 'wt') as fout:
+            fout.write(html_table(result, name))
+        print(args.html, 'file created')
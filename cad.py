@@ -32,9 +32,17 @@ TODO
 Over-write user-settings with config file and/or accept input.
 """
 
-from math import radians, pi, cos, sin, atan2
 import sys
 
+from cad4wires.settings import user_settings
+from plan import Plan, SRCE, DEST, wire_table, ref_table
+from emit import write_cad, write_programs
+from integrity import Integrity
+from metrics import Run
+from refpoints import farthest_pair
+from runstats import RunningStats
+from sectors import FOUR_SIDES, sort_by_sector, tuned_sides
+
 
 def list_n(ll, n):
     new = []
@@ -43,12 +51,6 @@ def list_n(ll, n):
     return new
 
 
-def mid_value(num_list):
-    n = sorted(num_list)
-    m = rnd((n[0] + n[-1]) / 2)
-    return m
-
-
 def rnd(num):
     return round(num, 3)
 
@@ -104,75 +106,6 @@ def dbg_num_wires(wirelist, string):
     print(string, total)
 
 
-def rotate_pt(o_x, o_y, pt_x, pt_y, angle):
-    """rotate around given origin"""
-    angle = radians(angle)
-    c_x = pt_x - o_x
-    c_y = pt_y - o_y
-    cs = cos(angle)
-    sn = sin(angle)
-    return o_x + cs * c_x - sn * c_y, o_y + sn * c_x + cs * c_y
-
-
-def rotate(o_x, o_y, pts, angle):
-    """rotate srce and dest of wire about an origin"""
-    s = rotate_pt(o_x, o_y, pts[0], pts[1], angle)
-    d = rotate_pt(o_x, o_y, pts[2], pts[3], angle)
-    return [rnd(s[0]), rnd(s[1]), rnd(d[0]), rnd(d[1])]
-
-
-def scale(o_x, o_y, pts, src_scl, dst_scl):
-    """apply scale about an origin"""
-    s_x = (pts[0] - o_x) * src_scl + o_x
-    s_y = (pts[1] - o_y) * src_scl + o_y
-    d_x = (pts[2] - o_x) * dst_scl + o_x
-    d_y = (pts[3] - o_y) * dst_scl + o_y
-    return [s_x, s_y, d_x, d_y]
-
-
-def translate(o_x, o_y, pts, settings):
-    """move relative to an origin"""
-    t_x = settings['x'] - o_x
-    t_y = settings['y'] - o_y
-    return [rnd(pts[0] + t_x), rnd(pts[1] + t_y), rnd(pts[2] + t_x), rnd(pts[3] + t_y)]
-
-
-def sort_by_angle(nlst, qpi):
-    """Determine side of chip for each wire.
-    Adjust qpi value in radians to change quadrants based on wire-angles"""
-
-    #       \nw____ /ne
-    #   +    |     |
-    #  pi ---|     |--- 0
-    #   -    |_____|
-    #       /sw     \se
-    up = []
-    lf = []
-    dn = []
-    rt = []
-
-    ne = qpi
-    nw = pi - qpi
-    sw = -pi + qpi
-    se = -qpi
-
-    for lin in nlst:
-        srcx, srcy, desx, desy = lin
-        dx = desx - srcx
-        dy = desy - srcy
-        angle = atan2(dy, dx)
-
-        if ne <= angle < nw:
-            up.append(lin)
-        if angle >= nw or angle < sw:
-            lf.append(lin)
-        if sw <= angle < se:
-            dn.append(lin)
-        if se <= angle < ne:
-            rt.append(lin)
-    return up, lf, dn, rt
-
-
 def get_diffs(ranks):
     diffs = []
     for i in range(len(ranks)):
@@ -208,36 +141,7 @@ def chk_nested(w, strg):
         chk_list(w[i], strg + str(i) + ':')
 
 
-def refheader(ref, xy1, xy2, settings):
-    return f'''refpnt         {ref},         1,   {xy1['x']},    {xy1['y']}
-refpnt         {ref},         2,   {xy2['x']},    {xy2['y']}
-refuspower     {ref},         1,    {settings['usp']}
-refforce       {ref},         1,    {settings[ 'bf']}
-refustime      {ref},         1,    {settings['ust']}'''
-
-
-user_settings = {
-    'srce': {
-        'usp': '26.000',
-        'ust': '0.060',
-        'bf' : '20.000',
-        'scale': 1,
-        'no-split': False},
-    'dest': {
-        'usp': '24.000',
-        'ust': '0.060',
-        'bf' : '20.000',
-        'scale': 0.99975},
-    '715-table': {
-        'x' : -126,
-        'y' : -10},
-    '820-table': {
-        'x' : -196,
-        'y' : 10},
-    'rotation': 0,
-    'tolerance': 0.02, # in mm
-    'bonding': 'out'
-}
+# user settings shared with the other scripts, in cad4wires/settings.py
 
 tolerance = user_settings['tolerance'] # in mm
 bonding = user_settings['bonding']
@@ -245,28 +149,50 @@ bonding = user_settings['bonding']
 title = "C100mm.csv" # sys.argv[1]
 out_file = [x.strip() for x in [x.strip() for x in title.split('.')][0].split('\\')][-1]
 
+run = Run('cad')
 fin = open(title, 'rt') # comma delimited, or tab csv
 lines = fin.readlines()
 fin.close()
 
 nlines = []
+stats = RunningStats() # extents and centres, gathered while reading
 for line in lines:
 
     line = [float(xy.strip()) for xy in line.split(',')]
     nlines.append([line[1]-125000, line[2]-131000, line[4]-125000, line[5]-131000])# insert hack for origin discrepancy here!
+    stats.add(*nlines[-1])
 
 lines = None
 
+run.mark('read')
+
+integrity = Integrity(title)
+integrity.wires(nlines)
+integrity.stage('read', len(nlines))
+
 # Test for origin discrepancy in data
 # Origin must be corrected before sorting wires by angle!
 
-print(mid_value(list_n(nlines, 0)), 'srce-x')
-print(mid_value(list_n(nlines, 1)), 'srce-y')
-print(mid_value(list_n(nlines, 2)), 'dest-x')
-print(mid_value(list_n(nlines, 3)), 'dest-y')
+print(stats.mid('sx'), 'srce-x')
+print(stats.mid('sy'), 'srce-y')
+print(stats.mid('dx'), 'dest-x')
+print(stats.mid('dy'), 'dest-y')
 
 # - Find ranks of coords and build ranks per direction
-wireset = sort_by_angle(nlines, radians(45))
+# rank building below alternates y and x by side, so this script keeps the four sides
+sides = FOUR_SIDES
+if user_settings['tune-sectors']:
+    sides, qpi, cost = tuned_sides(nlines, first=0)
+    print('sides split at', qpi, 'degrees, row cost', cost)
+wireset = sort_by_sector(nlines, sides, first=0)
+run.mark('sides')
+for sector, wires in zip(sides, wireset):
+    side_stats = stats.side(sector[0])
+    for wire in wires:
+        side_stats.add(*wire)
+integrity.stats(stats)
+integrity.stage('sides', sum(len(side) for side in wireset))
+integrity.sides([len(side) for side in wireset], [sector[0] for sector in sides])
 
 srce_ranks = []
 dest_ranks = []
@@ -283,11 +209,10 @@ for i in range(len(wireset)):
         srce_dupes = get_dupes(list_n(wireset[i], 0), 0)
         dest_dupes = get_dupes(list_n(wireset[i], 2), 0)
 
-    if srce_dupes:
-        srce_ranks.append([])
-        #srce_rank_debug.append([])
-    if dest_dupes:
-        dest_ranks.append([])
+    # one list per side, empty for a side without wires, so ranks stay at the index of their side
+    srce_ranks.append([])
+    dest_ranks.append([])
+    #srce_rank_debug.append([])
 
     for key, value in srce_dupes.items():
         srce_ranks[i].append(key)
@@ -330,6 +255,8 @@ for i in range(len(srce_ranks)):
             if srce_val == srce_ranks[i][j]:
                 wires_by_srce[i][j].append(wire)
 
+integrity.stage('srce ranks', sum(len(rank) for side in wires_by_srce for rank in side))
+
 srce_rank_tol = 0.02 # mm
 #merge_by_diff(wires_by_srce, srce_rank_diffs, srce_rank_tol)
 
@@ -391,79 +318,35 @@ if one_to_one:
 
 #chk_nested(wires_by_dest, 'wires_by_dest')
 dbg_num_wires(wires_by_dest, 'wires_by_dest')
+assigned = [wire for side in wires_by_dest for rank in side for wire in rank]
+integrity.stage('dest ranks', len(assigned))
+integrity.unassigned('dest ranks', nlines, assigned)
+assigned = None
+for sector, srce_rows, dest_rows in zip(sides, wires_by_srce, wires_by_dest):
+    run.ranks(sector[0], len(srce_rows), len(dest_rows))
+run.mark('ranks')
+for line in integrity.summary_lines():
+    print(line)
 
 # Rotation, scale and translation of data - locate source centre for transforms
-cx = mid_value(list_n(nlines, 0))
-cy = mid_value(list_n(nlines, 1))
-rotation = user_settings['rotation']
-s_scale  = user_settings['srce']['scale']
-d_scale  = user_settings['dest']['scale']
-move_to  = user_settings['820-table']
-
-for i in range(len(wires_by_dest)):
-    for j in range(len(wires_by_dest[i])):
-        for k in range(len(wires_by_dest[i][j])):
-
-            wires_by_dest[i][j][k] = rotate(cx, cy, wires_by_dest[i][j][k], rotation)
-            wires_by_dest[i][j][k] = scale(cx, cy, wires_by_dest[i][j][k], s_scale, d_scale)
-            wires_by_dest[i][j][k] = translate(cx, cy, wires_by_dest[i][j][k], move_to)
-
-print(wire)
-# translation commented out while SVG output is required
+# Transforms are applied per machine target when the CAD files are written
+cx, cy = stats.centre()
 print("cx", cx, "cy", cy)
-cx = None # not translated
-cy = None # not translated
 
-# Dest ref points are in the first and last wire of the outer ranks... sometimes!
-# Ref pt pairs are in dest_list = [[ref1: horizontal], [ref2: vertical]]
-# Option to reverse order of bonding for better refpoints
-boool = []
-for i in range(len(wires_by_dest)):
-    boool.append(1 if wires_by_dest[i] else 0)
-dest_refs = []
-for i in range(len(wires_by_dest)):
-    # if not i % 2:
-    #     wires_by_dest[i].reverse()
-    dest_refs.append({
-        'x': rnd(wires_by_dest[i][-1][0][2]),
-        'y': rnd(wires_by_dest[i][-1][0][3])
-    } if wires_by_dest[i] else None)
-    dest_refs.append({
-        'x': rnd(wires_by_dest[i][-1][-1][2]),
-        'y': rnd(wires_by_dest[i][-1][-1][3])
-    } if wires_by_dest[i] else None)
-
-print(dest_refs)
-
-
-# assumes 4-sided bonding; try one of the following!
-# dest_list = [[dest_refs[2], dest_refs[6]], [ dest_refs[0], dest_refs[4]]]
-# test.txt
-#dest_list = [[dest_refs[3], dest_refs[6]], [ dest_refs[0], dest_refs[5]]]
-# PIMMS
-#dest_list = [[dest_refs[3], dest_refs[6]], [dest_refs[1], dest_refs[4]]]
-# C100
-dest_list = [[dest_refs[2], dest_refs[6]], [dest_refs[5], dest_refs[1]]]
-# unfinished range of options
-print("boool", boool)
-if boool[0] == 0:
-    dest_list[0] = [dest_refs[4], dest_refs[5]]
-if boool[1] == 0:
-    dest_list[1] = [dest_refs[6], dest_refs[7]]
-if boool[2] == 0:
-    dest_list[0] = [dest_refs[0], dest_refs[1]]
-if boool[3] == 0:
-    dest_list[1] = [dest_refs[3], dest_refs[3]]
-# print(dest_list)
-# [
-# 	[
-# 		{'x': -17.682, 'y': -12.727}, {'x': 17.682, 'y': -12.552}
-# 	],
-# 	[
-# 		{'x': -11.039, 'y': 17.982},{'x': -11.978, 'y': -17.782}
-# 	]
-# ]
-# Srce ref points are in the first and last wire of the rank!
+# Dest ref points: the two dest pads furthest apart, one on each of the two sides
+# bonded to the ref system, ref1 for the l r sides, ref2 for the u d sides
+dest_list = []
+for pair in ((1, 3), (0, 2)):
+    pads = [(wire[2], wire[3], i) for i in pair for rank in wires_by_dest[i] for wire in rank]
+    if not pads:
+        # neither side bonded, any dest pads will do
+        pads = [(wire[2], wire[3], i) for i in range(len(wires_by_dest)) for rank in wires_by_dest[i] for wire in rank]
+    px, py, side = zip(*pads)
+    first, last = farthest_pair(px, py, side)
+    dest_list.append([{'x': rnd(px[first]), 'y': rnd(py[first])}, {'x': rnd(px[last]), 'y': rnd(py[last])}])
+print(dest_list)
+
+# Srce ref points are the two srce pads of the rank furthest apart
 srce_list = create_rank_lists(wires_by_dest)# or dest_ranks if no merging has happened
 
 for i in range(len(wires_by_dest)):
@@ -474,33 +357,33 @@ for i in range(len(wires_by_dest)):
             rank = srce_list[i]
         if leni:
             rank = srce_list[i][j]
+        row = wires_by_dest[i][j]
+        first, last = farthest_pair(list_n(row, 0), list_n(row, 1))
         rank.append({
-            'x': rnd(wires_by_dest[i][j][0][0]),
-            'y': rnd(wires_by_dest[i][j][0][1])
+            'x': rnd(row[first][0]),
+            'y': rnd(row[first][1])
         })
         rank.append({
-            'x': rnd(wires_by_dest[i][j][-1][0]),
-            'y': rnd(wires_by_dest[i][j][-1][1])
+            'x': rnd(row[last][0]),
+            'y': rnd(row[last][1])
         })
 #
-# Build the CAD file!
+# Build the plan, then a CAD file per machine target!
 #
-s_params = user_settings['srce']
-d_params = user_settings['dest']
-fout = open(out_file + '.CAD', 'wt')
+ref_rows = []
+for ref, points in enumerate(dest_list, start=1):
+    ref_rows.append((ref, DEST, -1, points[0]['x'], points[0]['y'], points[1]['x'], points[1]['y']))
 
-print(refheader(1, dest_list[0][0], dest_list[0][1], d_params), file=fout)
-print(refheader(2, dest_list[1][0], dest_list[1][1], d_params), file=fout)
-
-wire_num = 1
 srce_ref = 3
-tb = ',    '
 for i in range(len(srce_list)):
     for points in srce_list[i]:
 
-        print(refheader(srce_ref, points[0], points[1], s_params), file=fout)
+        ref_rows.append((srce_ref, SRCE, i, points[0]['x'], points[0]['y'], points[1]['x'], points[1]['y']))
         srce_ref += 1
 
+# pin numbers are not read by this script
+wire_rows = []
+wire_num = 1
 srce_ref = 3
 for i in range(len(wires_by_dest)):
     for j in range(len(wires_by_dest[i])):
@@ -510,15 +393,25 @@ for i in range(len(wires_by_dest)):
             if not i%2:
                 dest_ref = 2
 
-            n = str(wire_num)
-            srce = str(wire[0]) + tb + str(wire[1])
-            dest = str(wire[2]) + tb + str(wire[3])
-            print('bondpnt '+n+',    1,    '+str(srce_ref)+tb+srce, file=fout)
-            print('bondpnt '+n+',    2,    '+str(dest_ref)+tb+dest, file=fout)
+            wire_rows.append((0, wire_num, i, j, srce_ref, dest_ref, *wire))
             wire_num += 1
         srce_ref += 1
 
 print(wire_num-1, 'wires allocated,', srce_ref-3, 'source ref-systems')
-
-print('CAD file created')
-fout.close()
+integrity.stage('CAD', wire_num-1)
+integrity.save(out_file + '_integrity.json')
+
+run.mark('refs')
+
+plan = Plan(wire_table(wire_rows), ref_table(ref_rows), user_settings)
+# plain CAD file, untransformed, as read by svg.py
+write_cad(out_file + '.CAD', plan, user_settings)
+print(out_file + '.CAD', 'CAD file created')
+for name in write_programs(plan, out_file, centre=(cx, cy)):
+    print(name, 'CAD file created')
+run.mark('CAD')
+run.integrity(integrity)
+run.wires(wire_num-1)
+if user_settings['metrics']:
+    run.finish(run.path(out_file))
+    print(run.path(out_file), 'file created')
@@ -11,14 +11,32 @@ Input data 5 columns .csv file
 4/ Destination x position
 5/ Destination y position
 
-TODO:
-Rotation
-Scale
+Rotation, scale and table offset are applied per machine target by emit.py,
+the plain .CAD and .plan keep the input coordinates.
+Sides are ranked and their ref systems numbered by cad4wires/planner.py.
 """
-from math import radians, pi, cos, sin, atan2
+import os
+import shutil
 import sys
+import time
 from pprint import pprint
 
+import numpy as np
+
+from plan import Plan, save_plan
+from emit import write_programs
+from cad4wires.planner import DieSide, References, plan_tables
+from cad4wires.settings import user_settings
+from integrity import Integrity
+from metrics import Run
+from progress import Bar, CancelToken, Progress
+from viewer import write_viewer
+from pipeline import Worker
+from svgpack import wire_path, segments_path, TextFile
+from placer import cross_boxes, label_points, label_wires
+from runstats import RunningStats
+from sectors import axes, sort_by_sector, tunable, tuned_sides
+
 
 
 # This part for Jupyter notebook only
@@ -58,12 +76,6 @@ def list_n(list_of_lists, n):
     return [lst[n] for lst in list_of_lists]
 
 
-def mid_value(num_list):
-    n = sorted(num_list)
-    m = rnd((n[0] + n[-1]) / 2)
-    return m
-
-
 def rnd(num):
     return round(num, 3)
 
@@ -74,212 +86,6 @@ def eqls(num, comp, band):
         return True
 
 
-def min_max(num_list):
-    """min and max of list"""
-    result = sorted(num_list)
-    return result[0], result[-1]
-
-
-def rotate_pt(o_x, o_y, pt_x, pt_y, angle):
-    """rotate around given origin"""
-    angle = radians(angle)
-    c_x = pt_x - o_x
-    c_y = pt_y - o_y
-    cs = cos(angle)
-    sn = sin(angle)
-    return o_x + cs * c_x - sn * c_y, o_y + sn * c_x + cs * c_y
-
-
-def rotate(o_x, o_y, pts, angle):
-    """rotate srce and dest of wire about an origin"""
-    s = rotate_pt(o_x, o_y, pts[0], pts[1], angle)
-    d = rotate_pt(o_x, o_y, pts[2], pts[3], angle)
-    return [rnd(s[0]), rnd(s[1]), rnd(d[0]), rnd(d[1])]
-
-
-def scale(o_x, o_y, pts, src_scl, dst_scl):
-    """apply scale about an origin"""
-    s_x = (pts[0] - o_x) * src_scl + o_x
-    s_y = (pts[1] - o_y) * src_scl + o_y
-    d_x = (pts[2] - o_x) * dst_scl + o_x
-    d_y = (pts[3] - o_y) * dst_scl + o_y
-    return [s_x, s_y, d_x, d_y]
-
-
-def translate(o_x, o_y, pts, settings):
-    """move relative to an origin"""
-    t_x = settings['x'] - o_x
-    t_y = settings['y'] - o_y
-    return [rnd(pts[0] + t_x), rnd(pts[1] + t_y), rnd(pts[2] + t_x), rnd(pts[3] + t_y)]
-
-
-def sort_by_angle(nlst, qpi):
-    """Determine side of Die for each wire.
-    Adjust qpi value in radians to change quadrant-angle to suit wire-angles
-          \nw____ /ne
-      +    |     |
-     pi ---|     |--- 0
-      -    |_____|
-          /sw     \se
-    """
-    up = []
-    lf = []
-    dn = []
-    rt = []
-
-    ne = qpi
-    nw = pi - qpi
-    sw = -pi + qpi
-    se = -qpi
-
-    for lin in nlst:
-        _, srcx, srcy, desx, desy = lin
-        dx = desx - srcx
-        dy = desy - srcy
-        angle = atan2(dy, dx)
-
-        if ne <= angle < nw:
-            up.append(lin)
-        if angle >= nw or angle < sw:
-            lf.append(lin)
-        if sw <= angle < se:
-            dn.append(lin)
-        if se <= angle < ne:
-            rt.append(lin)
-    return up, lf, dn, rt
-
-
-class DieSide:
-
-    def __init__(self, facing, wires):
-        self.facing = facing
-        self.wires = wires
-        srce_idx = 1 if self.facing in ['W', 'E'] else 2
-        dest_idx = 3 if self.facing in ['W', 'E'] else 4
-        # filter values to establish rank count
-        self.srce_dupes = self.get_dupes([wire[srce_idx] for wire in wires], 0)
-        self.dest_dupes = self.get_dupes([wire[dest_idx] for wire in wires], 0)
-        self.wires_by_srce = self.wires_to_ranks(index=srce_idx)
-        self.wires_by_dest = self.split_srce_ranks_by_dest(index=dest_idx)
-
-        # rank diffs only used to decide on merging neighbouring ranks
-        if len(self.srce_dupes) > 1:
-            self.srce_rank_diffs = self.get_diffs(self.srce_dupes)
-        if len(self.dest_dupes) > 1:
-            self.dest_rank_diffs = self.get_diffs(self.dest_dupes)
-
-    def get_dupes(self, lst, min_row):
-        """Assumes duplication of values constitutes separate rows of pads"""
-        d = {i:lst.count(i) for i in lst}
-        n = []
-        for key, val in d.items():
-            if val > min_row:
-                n.append([key, val])
-        return n
-
-    def get_diffs(self, ranks):
-        """Distances between rows of pads"""
-
-        diffs = []
-        for i in range(len(ranks)-1):
-            diffs.append(rnd(abs(ranks[i][0] - ranks[i+1][0])))
-        return diffs
-
-    def wires_to_ranks(self, index):
-        """ Sorts into ranks according to duplicated values """
-        wires_by_rank = []
-        for dupe in self.srce_dupes:
-            rank = self.dupe_to_rank(dupe, self.wires, index)
-            wires_by_rank.append(rank)
-        return wires_by_rank
-
-    def split_srce_ranks_by_dest(self, index):
-        """ Split source ranks according to destination duplicated values """
-        wires_by_rank = []
-        for srce_rank in self.wires_by_srce:
-            for dupe in self.dest_dupes:
-                rank = self.dupe_to_rank(dupe, srce_rank, index)
-                wires_by_rank.append(rank)
-        return wires_by_rank
-
-    def dupe_to_rank(self, dupe, wires, index) -> list:
-        """ Test given index value against duplicate value and return collection """
-        rank = []
-        for wire in wires:
-            if wire[index] == dupe[0]:
-                rank.append(wire)
-        return rank
-
-
-class References:
-    """
-    Builds the headers of the CAD file for each reference system
-    """
-    _ref_count = 0
-    _wire_count = 0
-    dest_strings = []
-    srce_strings = []
-    ref_sys_points = []
-    ref_headers = []
-
-    def __init__(self, wires_by_dest):
-        #order of ref systems, always one dest ref system, one or more srce ref systems
-        self.dest_ref_system = self.dest_refs(wires_by_dest)
-        References.ref_sys_points.append(self.dest_ref_system)
-        self.srce_ref_systems = []
-        self.cad_strings = []
-        for rank in wires_by_dest:
-            self.srce_refs(rank)
-            self.wires_to_strings(rank)
-        for srce in self.srce_ref_systems:
-            References.ref_sys_points.append(srce)
-
-    def srce_refs(self, rank) -> None:
-        """
-        Coordinate strings for ref points
-        :param rank:
-        :return: None
-        """
-        References._ref_count +=1
-        self.srce_strings.append(str(References._ref_count))
-        self.srce_ref_systems.append({
-            str(References._ref_count): {
-                "1": (str(rank[0][1]), str(rank[0][2])),
-                "2": (str(rank[-1][1]), str(rank[-1][2]))
-            }
-        })
-
-    def dest_refs(self, wires_by_dest) -> dict:
-        """
-        Coordinate strings for ref points
-        :param wires_by_dest:
-        :return: dict
-        """
-        References._ref_count += 1
-        rank = wires_by_dest[-1]
-        self.dest_strings.append(str(References._ref_count))
-        return {
-            str(References._ref_count): {
-                "1": (str(rank[0][3]), str(rank[0][4])),
-                "2": (str(rank[-1][3]), str(rank[-1][4]))
-            }
-        }
-
-    def wires_to_strings(self, rank) -> None:
-        """ Two lines to represent one wire in the CAD file """
-        gap = ',    '
-        dref = list(self.dest_ref_system.keys())[0]
-        nums = [d.keys() for d in self.srce_ref_systems]
-        sref = list(nums[-1])[0]
-        for wire in rank:
-            References._wire_count += 1
-            w_num = str(References._wire_count)
-            srce = str(wire[1]) + gap + str(wire[2])
-            dest = str(wire[3]) + gap + str(wire[4])
-            self.cad_strings.append('bondpnt '+w_num+',    1,    '+str(sref) + gap+srce)
-            self.cad_strings.append('bondpnt '+w_num+',    2,    '+str(dref) + gap+dest)
-
-
 def refheader(ref_sys: str, first_co: str, second_co: str, settings: dict) -> str:
     """This paragraph is required for each reference system at the top of the file"""
     return (
@@ -291,116 +97,22 @@ def refheader(ref_sys: str, first_co: str, second_co: str, settings: dict) -> st
     )
 
 
-def get_refheaders(srce_params, dest_params):
-    for refsystem in References.ref_sys_points:
-        for key, coords in refsystem.items():
-            header = "No header assigned: " + key
-            if key in References.dest_strings:
-                header = refheader(key, coords['1'], coords['2'], dest_params)
-            if key in References.srce_strings:
-                header = refheader(key, coords['1'], coords['2'], srce_params)
-            References.ref_headers.append(header)
+def side_refheaders(side_ref, srce_params, dest_params) -> list:
+    """Headers of the ref systems of one side, dest first, in the order of References.ref_sys_points"""
+    systems = [(side_ref.dest_ref_system, dest_params)]
+    systems += [(system, srce_params) for system in side_ref.srce_ref_systems]
+    return [refheader(key, coords['1'], coords['2'], params)
+            for system, params in systems for key, coords in system.items()]
 
-"""
-User settings
-"""
-user_settings = {
-    'srce': {
-        'usp': '26.000',
-        'ust': '0.060',
-        'bf' : '20.000',
-        'scale': 1,
-        'no-split': False},
-    'dest': {
-        'usp': '24.000',
-        'ust': '0.060',
-        'bf' : '20.000',
-        'scale': 0.99975},
-    '715-table': {
-        'x' : -126,
-        'y' : -10},
-    '820-table': {
-        'x' : -196,
-        'y' : 10},
-    'rotation': 0,
-    'tolerance': 0.02,  # in mm
-    'bonding': 'out'
-}
-tolerance = user_settings['tolerance'] # in mm
-bonding = user_settings['bonding']
 
-"""
- Input file name
-"""
+def write_plan(plan, name, centre, written) -> None:
+    """The binary plan, a CAD file per machine and the viewer, file names added to written"""
+    save_plan(name + '.plan', plan)
+    written.append(name + '.plan')
+    written.extend(write_programs(plan, name, centre=centre))
+    write_viewer(plan, name + '_view.html', name)
+    written.append(name + '_view.html')
 
-title = "C100mm.csv" 
-out_file = [x.strip() for x in [x.strip() for x in title.split('.')][0].split('\\')][-1]
-# print(out_file)
-
-"""
- Organize according to angle of wire, requires centres checking
-"""
-fin = open(title, 'rt')  # comma delimited, or tab csv
-lines = fin.readlines()
-fin.close()
-
-nlines = []
-for line in lines:
-    line = [float(xy.strip()) for xy in line.split(',')]
-    pin = int(line[0])
-    sx = line[1]
-    sy = line[2]
-    dx = line[4]
-    dy = line[5]
-    # insert hack for origin discrepancy here!
-    nlines.append((pin, sx-125000, sy-131000, dx-125000, dy-131000))
-    #nlines.append((pin, sx, sy, dx, dy))
-
-lines = None
-
-# Test for origin discrepancy in data
-# Origin must be corrected before sorting wires by angle!
-
-# print(mid_value(list_n(nlines, 0)), 'srce-x')
-# print(mid_value(list_n(nlines, 1)), 'srce-y')
-# print(mid_value(list_n(nlines, 2)), 'dest-x')
-# print(mid_value(list_n(nlines, 3)), 'dest-y')
-
-# Find ranks of coords and build ranks per direction
-up, lf, dn, rt = sort_by_angle(nlines, radians(45))
-
-nort = DieSide(facing='N', wires=up)
-west = DieSide(facing='W', wires=lf)
-sout = DieSide(facing='S', wires=dn)
-east = DieSide(facing='E', wires=rt)
-
-"""
-Establish the order of ref_systems (and pass on to svg)
-Always dest first, per side
-"""
-s_params = user_settings['srce']
-d_params = user_settings['dest']
-
-nort_refs = References(nort.wires_by_dest)
-west_refs = References(west.wires_by_dest)
-sout_refs = References(sout.wires_by_dest)
-east_refs = References(east.wires_by_dest)
-
-get_refheaders(s_params, d_params)
-
-"""
-# Build the CAD file!
-"""
-FOUT = open(out_file + '.CAD', 'wt')
-
-for head in References.ref_headers:
-    print(head, file=FOUT)
-print("", file=FOUT)
-for side in [nort_refs, west_refs, sout_refs, east_refs]:
-    for string in side.cad_strings:
-        print(string, file=FOUT)
-
-print(out_file+'.CAD file created')
 
 """
 # SVG output 
@@ -542,75 +254,312 @@ def inset_detail_corner(bg_size, viewbox, scale, tx, ty, px, py) -> str:
     )
 
 
+"""
+Writers of the CAD file and the drawing, fed a side at a time, see pipeline.py
+"""
 colors = ['red', 'purple']#, 'orange', 'brown', 'green', 'blue']
-wire_grps = []
+stroke_width = str(0.05)
+ref_id = 'ref' + str(1)
+
+
+class CadWriter:
+    """
+    The plain CAD file: bond lines go to a part file as each side is done, the ref headers,
+    which come first in the file, are put in front of them at close
+    Both files count as partial for the progress.Progress of the run until then
+    """
+
+    def __init__(self, path, srce_params, dest_params, progress):
+        self.path = progress.output(path)
+        self.srce_params = srce_params
+        self.dest_params = dest_params
+        self.progress = progress
+        self.headers = []
+        self.part = open(progress.output(path + '.part'), 'wt')
+
+    def side(self, side_ref) -> None:
+        self.headers += side_refheaders(side_ref, self.srce_params, self.dest_params)
+        for string in side_ref.cad_strings:
+            print(string, file=self.part)
+        self.progress.advance('CAD', len(side_ref.cad_strings) // 2)
+
+    def close(self) -> None:
+        self.part.close()
+        with open(self.path, 'wt') as fout:
+            for head in self.headers:
+                print(head, file=fout)
+            print("", file=fout)
+        with open(self.path, 'ab') as fout, open(self.path + '.part', 'rb') as part:
+            shutil.copyfileobj(part, fout)
+        os.remove(self.path + '.part')
+        self.progress.written(self.path + '.part')
+        self.progress.written(self.path)
+
+    def abort(self) -> None:
+        self.part.close()
+
+
+class SvgWriter:
+    """
+    The drawing, written as it is built: the head, the wire groups of each side as it is done,
+    then the labels and ref marks, which have to wait for every side
+    """
+
+    def __init__(self, path, head, progress, gz=False, compact=False, labels=True, precision=3):
+        self.progress = progress
+        self.fout = TextFile(progress.output(path), gz=gz)
+        self.compact = compact
+        self.labels = labels
+        self.precision = precision
+        self.groups = 0
+        self.full_bytes = 0 # wire paths at full precision, for the savings report
+        self.wire_bytes = 0
+        self.sizes = None
+        self.lines(head)
+
+    def lines(self, lines) -> None:
+        self.fout.write(''.join(line + '\n' for line in lines))
+
+    def side(self, side) -> None:
+        """One group of wire paths per dest rank"""
+        for row in side.wires_by_dest:
+            w_grp = []
+            for wire in row:
+                src = str(wire[1]) + ' ' + str(-wire[2])
+                dst = str(wire[3]) + ' ' + str(-wire[4])
+                wId = 'w' + str(wire[0])
+                path = '\t<path id="'+wId+'" d="M '+src+' L '+dst+' z"/>'
+                self.full_bytes += len(path) + 1
+                if self.compact:
+                    path = '\t<path id="'+wId+'" d="'+wire_path(*wire[1:], self.precision)+'"/>'
+                w_grp.append(path)
+            # no labels refer to the wires, so the group can be one path
+            if self.compact and not self.labels and row:
+                w_grp = ['\t<path d="'+segments_path(*list(zip(*row))[1:5], self.precision)+'"/>']
+            self.wire_bytes += sum(len(path) + 1 for path in w_grp)
+            col = colors[self.groups % len(colors)]
+            to_grp(w_grp, params='<g stroke-opacity="0.3" stroke="'+col+'" stroke-width="'+stroke_width+'" id="'+ref_id+'">')
+            self.groups += 1
+            self.lines(w_grp)
+            self.progress.advance('drawing', len(row))
+
+    def close(self) -> None:
+        self.sizes = self.fout.close()
+        self.progress.written(self.fout.path)
+        self.progress.finish('drawing')
+
+    def abort(self) -> None:
+        self.fout.close()
 
+
+"""
+User settings, shared with the other scripts, in cad4wires/settings.py
+"""
+tolerance = user_settings['tolerance'] # in mm
+bonding = user_settings['bonding']
+
+"""
+ Input file name
+"""
+
+title = "C100mm.csv" 
+out_file = [x.strip() for x in [x.strip() for x in title.split('.')][0].split('\\')][-1]
+# print(out_file)
+
+"""
+ Organize according to angle of wire, requires centres checking
+"""
+run = Run('cad2svg')
+fin = open(title, 'rt')  # comma delimited, or tab csv
+lines = fin.readlines()
+fin.close()
+
+token = CancelToken()
+token.on_interrupt()
+show = user_settings['progress'] and sys.stderr.isatty()
+progress = Progress(['read', 'sides', 'ranks', 'refs', 'labels', 'CAD', 'drawing'], len(lines),
+                    Bar() if show else None, token, exit=True)
+
+nlines = []
+stats = RunningStats() # extents and centres, gathered while reading
+for line in lines:
+    line = [float(xy.strip()) for xy in line.split(',')]
+    pin = int(line[0])
+    sx = line[1]
+    sy = line[2]
+    dx = line[4]
+    dy = line[5]
+    # insert hack for origin discrepancy here!
+    nlines.append((pin, sx-125000, sy-131000, dx-125000, dy-131000))
+    stats.add(*nlines[-1][1:])
+    #nlines.append((pin, sx, sy, dx, dy))
+    if not len(nlines) % 1000:
+        progress.advance('read', 1000)
+
+lines = None
+progress.finish('read')
+run.mark('read')
+
+integrity = Integrity(title)
+integrity.wires([line[1:] for line in nlines])
+integrity.stage('read', len(nlines))
+
+# Test for origin discrepancy in data
+# Origin must be corrected before sorting wires by angle!
+
+# print(stats.mid('sx'), 'srce-x')
+# print(stats.mid('sy'), 'srce-y')
+# print(stats.mid('dx'), 'dest-x')
+# print(stats.mid('dy'), 'dest-y')
+
+# Find ranks of coords and build ranks per direction
+# only the four default sides are tuned, a layout of other sectors is kept as given
+if user_settings['tune-sectors'] and tunable(user_settings['sectors']):
+    user_settings['sectors'], qpi, cost = tuned_sides(nlines)
+    print('sides split at', qpi, 'degrees, row cost', cost)
+elif user_settings['tune-sectors']:
+    print(len(user_settings['sectors']), 'sectors as given, not tuned')
+sectors = user_settings['sectors']
+sector_wires = sort_by_sector(nlines, sectors)
+progress.finish('sides')
+run.mark('sides')
+
+"""
+Plan each side and pass it on, with its ref systems, to the CAD and drawing writers,
+which write it in the background while the next side is planned
+"""
+s_params = user_settings['srce']
+d_params = user_settings['dest']
+svg_settings = user_settings['svg']
+precision = svg_settings['precision']
+compact = svg_settings['compact']
+labels = svg_settings['labels']
+svgz = svg_settings['svgz']
+
+# viewBox settings, from the extents gathered while reading
+X_MIN, Y_MIN, X_MAX, Y_MAX = stats.extents('d')
+BORDER = 0.2
+MAG = 20 # up to 60 for readable text on A3!
+
+X_SIZE = (X_MAX - X_MIN + 2 * BORDER)/1
+Y_SIZE = (Y_MAX - Y_MIN + 2 * BORDER)/1
+X_ABS = X_MIN - BORDER
+Y_ABS = -Y_MAX - BORDER # due to -y scaling conversion
+
+svg_head_lines = [html_head(out_file), svg_container()] if not svgz else []
+svg_head_lines += [svg_head(scale=MAG, x_size=X_SIZE, y_size=Y_SIZE, x_abs=X_ABS, y_abs=Y_ABS), svg_defs(),
+                   '<g id="everything">'] # detail script
+# '<g class="svg-pan-zoom_viewport">' # zoom script
+svg_name = out_file + ('.svgz' if svgz else '.html')
+
+started = time.perf_counter()
+pipelined = user_settings['pipeline']
+cad_worker = Worker('CAD', threaded=pipelined)
+svg_worker = Worker('SVG', threaded=pipelined)
+cad_out = CadWriter(out_file + '.CAD', s_params, d_params, progress)
+svg_out = SvgWriter(svg_name, svg_head_lines, progress, svgz, compact, labels, precision)
+# on cancel the writers stop first, then their files are closed and removed
+progress.on_cancel(cad_out.abort)
+progress.on_cancel(svg_out.abort)
+progress.on_cancel(cad_worker.abandon)
+progress.on_cancel(svg_worker.abandon)
+
+# Establish the order of ref_systems, always dest first, per side
+sides = []
+side_refs = []
+for sector, wires, axis in zip(sectors, sector_wires, axes(sectors)):
+    side = DieSide(facing=sector[0], wires=wires, axis=axis)
+    sides.append(side)
+    side_stats = stats.side(sector[0])
+    for wire in wires:
+        side_stats.add(*wire[1:])
+    run.ranks(side.facing, len(side.wires_by_srce), len(side.wires_by_dest))
+    progress.advance('ranks', len(wires))
+    # sectors with no wires have no ref systems
+    if side.wires:
+        side_refs.append(References(side.wires_by_dest))
+        progress.advance('refs', len(wires))
+        cad_worker.submit(cad_out.side, side_refs[-1])
+        svg_worker.submit(svg_out.side, side)
+planned = time.perf_counter() - started
+progress.finish('ranks')
+progress.finish('refs')
+run.mark('ranks and refs')
+integrity.stats(stats)
+
+integrity.stage('sides', sum(len(side.wires) for side in sides))
+integrity.sides([len(side.wires) for side in sides], [side.facing for side in sides])
+integrity.stage('srce ranks', sum(len(rank) for side in sides for rank in side.wires_by_srce))
+assigned = [wire for side in sides for rank in side.wires_by_dest for wire in rank]
+integrity.stage('dest ranks', len(assigned))
+integrity.unassigned('dest ranks', nlines, assigned)
+assigned = None
+for line in integrity.summary_lines():
+    print(line)
+sides = [side for side in sides if side.wires]
+
+plan_wires, plan_refs = plan_tables(sides, side_refs)
+plan = Plan(plan_wires, plan_refs, user_settings, [side.facing for side in sides])
+written = [out_file + '.CAD']
+cad_worker.submit(cad_out.close)
+cad_worker.submit(write_plan, plan, out_file, stats.centre(), written)
+
+"""
+The labels wait for every side, the wire paths are written meanwhile
+"""
 pins = []
 text_size = str(.15)
 wirenums = []
 wnum = 0
-index = 0
-dexes = ['2.6', '3', '3', '8.6', '2.5', '3', '2.2', '3'] # number alignment to wires
-
-for side in [nort, west, sout, east]:
-    for row in side.wires_by_dest:
-        dx = dexes[index]
-        w_grp = []
-        for wire in row:
-            wnum += 1
-            pin = str(wire[0])
-            src = str(wire[1]) + ' ' + str(-wire[2])
-            dst = str(wire[3]) + ' ' + str(-wire[4])
-            wId = 'w' + str(pin)
-            path = '\t<path id="'+wId+'" d="M '+src+' L '+dst+' z"/>'
-            w_grp.append(path)
-
-            pin_txt = svg_text(svg_text_path(wId, svg_tspan(text_size, pin, dx='0')))
-            pins.append(pin_txt)
-
-            wnum_txt = svg_text(svg_text_path(wId, svg_tspan(text_size, str(wnum), dx=dx)))
-            wirenums.append(wnum_txt)
-        index += 1
-        wire_grps.append(w_grp)
+
+if labels:
+    # pin and wire numbers slid along their wires, clear of pads and of each other
+    bonded = [wire for side in sides for row in side.wires_by_dest for wire in row]
+    sx, sy, ex, ey = (list(col) for col in list(zip(*bonded))[1:5]) if bonded else ([], [], [], [])
+    num_dx, pin_dx, label_boxes, crowded = label_wires(
+        sx, sy, ex, ey, range(1, len(bonded) + 1), [wire[0] for wire in bonded], float(text_size))
+    if crowded:
+        print(crowded, 'wire labels overlap, no free place along their wires')
+    for wire in bonded:
+        wnum += 1
+        pin = str(wire[0])
+        wId = 'w' + str(pin)
+        pin_txt = svg_text(svg_text_path(wId, svg_tspan(text_size, pin, dx=str(pin_dx[wnum - 1]))))
+        pins.append(pin_txt)
+
+        wnum_txt = svg_text(svg_text_path(wId, svg_tspan(text_size, str(wnum), dx=str(num_dx[wnum - 1]))))
+        wirenums.append(wnum_txt)
 
 # ref points
+ref_text_size = str(0.2)
 ref_marks = []
 ref_text = []
-offsets = [
-    ('-0.1', '0.15'),
-    ('0', '-0.02'),
-    ('-0.1', '-0.02'),
-    ('-0.3', '-0.02'),
-]
-for i, side in enumerate([nort_refs, west_refs, sout_refs, east_refs]):
-    label_offset = offsets[i]
-    offx = label_offset[0]
-    offy = label_offset[1]
+ref_points = []
+for side in side_refs:
     for ref_num, pts in side.dest_ref_system.items():
         for key, pt in pts.items():
-            px = pt[0]
-            py = str(-float(pt[1]))
-            ref_marks.append(svg_use('cross', px, py))
-            ref_label = ref_num + '.' + key
-            ref_text.append(svg_text(ref_label, x=px, y=py, dx=offx, dy=offy))
+            ref_points.append((ref_num + '.' + key, pt[0], pt[1]))
     for system in side.srce_ref_systems:
         for ref_num, pts in system.items():
             for key, pt in pts.items():
-                px = pt[0]
-                py = str(-float(pt[1]))
-                ref_marks.append(svg_use('cross', px, py))
-                ref_label = ref_num + '.' + key
-                ref_text.append(svg_text(ref_label, x=px, y=py, dx=offx, dy=offy))
+                ref_points.append((ref_num + '.' + key, pt[0], pt[1]))
+
+# ref labels beside their crosses, clear of the crosses, pads and wire labels
+ref_x = [float(pt[1]) for pt in ref_points]
+ref_y = [float(pt[2]) for pt in ref_points]
+obstacles = cross_boxes(ref_x, ref_y, 0.2)
+if labels:
+    obstacles = np.concatenate((label_boxes, obstacles))
+ref_dxy, crowded = label_points(ref_x, ref_y, [pt[0] for pt in ref_points], float(ref_text_size), obstacles, clear=0.08)
+if crowded:
+    print(crowded, 'ref labels overlap, no free place beside their crosses')
+for (ref_label, px, py), (offx, offy) in zip(ref_points, ref_dxy.tolist()):
+    py = str(-float(py))
+    ref_marks.append(svg_use('cross', px, py))
+    ref_text.append(svg_text(ref_label, x=px, y=py, dx=str(offx), dy=str(offy)))
 #print(ref_text)
-# wrap lists of shapes in styled 'g' elements, wire stroke, font-size
-MAG = 20 # up to 60 for readable text on A3!
-stroke_width = str(0.05)
-ref_text_size = str(0.2)
+# wrap lists of shapes in styled 'g' elements, font-size
 ref_stroke_width = str(0.02)
-ref_id = 'ref' + str(1)
-for i, grp in enumerate(wire_grps):
-    col = colors[i % len(colors)]
-    to_grp(grp, params='<g stroke-opacity="0.3" stroke="'+col+'" stroke-width="'+stroke_width+'" id="'+ref_id+'">')
 
 to_grp(pins, params='<g id="pins" fill="#a42">')
 to_grp(wirenums, '<g id="reftext" font-size="'+ref_text_size+'" fill="#089">') #  text-anchor="end"
@@ -618,56 +567,13 @@ to_grp(ref_text, '<g id="reftext" font-size="'+ref_text_size+'" fill="#089">') #
 to_grp(ref_marks, '<g id="refmarks" stroke="#089" stroke-width="'+ref_stroke_width+'">')
 
 
-# viewBox settings
-DEST_X_RANGE = min_max(list_n(nlines, 3))
-DEST_Y_RANGE = min_max(list_n(nlines, 4))
-X_MIN = DEST_X_RANGE[0]
-X_MAX = DEST_X_RANGE[1]
-Y_MIN = DEST_Y_RANGE[0]
-Y_MAX = DEST_Y_RANGE[1]
-BORDER = 0.2
-
-X_SIZE = (X_MAX - X_MIN + 2 * BORDER)/1
-Y_SIZE = (Y_MAX - Y_MIN + 2 * BORDER)/1
-X_ABS = X_MIN - BORDER
-Y_ABS = -Y_MAX - BORDER # due to -y scaling conversion
-
-
-FOUT = open(out_file + '.html', 'wt')
-print(html_head(out_file), file=FOUT)
-print(svg_container(), file=FOUT)
-print(svg_head(scale=MAG, x_size=X_SIZE, y_size=Y_SIZE, x_abs=X_ABS, y_abs=Y_ABS), file=FOUT)
-print(svg_defs(), file=FOUT)
-
-print('<g id="everything">', file=FOUT) # detail script
-# print('<g class="svg-pan-zoom_viewport">', file=FOUT) # zoom script  
-for grp in wire_grps:
-    for val in grp:
-        print(val, file=FOUT)
-
-for val in pins:
-    print(val, file=FOUT)
-
-for val in wirenums:
-    print(val, file=FOUT)
-
-for val in ref_marks:
-    print(val, file=FOUT)
-
-for val in ref_text:
-    print(val, file=FOUT)
-
-print('</g>', file=FOUT) # zoom or detail script
-
-
 detscale = 0.1 # defines scope of detail but changes scale
 bg_size = (X_SIZE*detscale, Y_SIZE*detscale)
 viewbox = "0 0 " + str(bg_size[0]) + " " + str(bg_size[1])
 
 # Inset version inserts corner detail into the main diagram, results may vary
 # comp_scale = detscale * 8
-# die_minx, die_maxx = min_max(list_n(nlines, 1))
-# die_miny, die_maxy = min_max(list_n(nlines, 2))
+# die_minx, die_miny, die_maxx, die_maxy = stats.extents('s')
 # tr_diffx = die_minx + X_SIZE/2
 # tr_diffy = die_maxy - Y_SIZE/2
 # tl = inset_detail_corner(bg_size, viewbox, comp_scale, tx=die_minx, ty=-die_maxy, px=-X_ABS, py=-Y_ABS)
@@ -683,20 +589,41 @@ tr = detail_corner(bg_size, viewbox, px=pict_x, py=-Y_ABS)
 bl = detail_corner(bg_size, viewbox, px=-X_ABS, py=pict_y)
 br = detail_corner(bg_size, viewbox, px=pict_x, py=pict_y)
 
-print(svg_close(), file=FOUT)
-print(svg_container_close(), file=FOUT)
-print('<h2>Top Left</h2>', file=FOUT)
-print(tl, file=FOUT)
-print('<h2>Top Right</h2>', file=FOUT)
-print(tr, file=FOUT)
-print('<h2>Bottom Left</h2>', file=FOUT)
-print(bl, file=FOUT)
-print('<h2>Bottom Right</h2>', file=FOUT)
-print(br, file=FOUT)
-
-print(html_close(), file=FOUT)
-FOUT.close()
-print(out_file+'.html file created')
+svg_tail = pins + wirenums + ref_marks + ref_text
+svg_tail.append('</g>') # zoom or detail script
+svg_tail.append(svg_close())
+if not svgz:
+    svg_tail += [svg_container_close(),
+                 '<h2>Top Left</h2>', tl, '<h2>Top Right</h2>', tr,
+                 '<h2>Bottom Left</h2>', bl, '<h2>Bottom Right</h2>', br,
+                 html_close()]
+progress.finish('labels')
+run.mark('labels')
+svg_worker.submit(svg_out.lines, svg_tail)
+svg_worker.submit(svg_out.close)
+
+cad_worker.close()
+for name in written:
+    print(name, 'file created')
+integrity.stage('CAD', References._wire_count)
+integrity.save(out_file + '_integrity.json')
+run.integrity(integrity)
+
+svg_worker.close()
+text_bytes, file_bytes = svg_out.sizes
+print(svg_name+' file created')
+print('wire paths', svg_out.full_bytes, 'bytes at full precision,', svg_out.wire_bytes, 'written;',
+      svg_name, text_bytes, 'bytes,', file_bytes, 'on disk')
+print('sides planned in', rnd(planned), 's, CAD and plan writer busy', rnd(cad_worker.busy), 's,',
+      'drawing writer', rnd(svg_worker.busy), 's;', rnd(time.perf_counter() - started), 's in all',
+      '(pipelined)' if pipelined else '(one after another)')
+run.mark('writers')
+run.took('CAD writer', cad_worker.busy)
+run.took('drawing writer', svg_worker.busy)
+run.wires(References._wire_count)
+if user_settings['metrics']:
+    run.finish(run.path(out_file))
+    print(run.path(out_file), 'file created')
 
 
 
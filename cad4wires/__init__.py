@@ -0,0 +1,14 @@
+"""
+cad4wires as one command, in place of running each script on fixed file names.
+
+    python -m cad4wires plan name.csv       .plan, .CAD and a CAD file per machine target
+    python -m cad4wires render name.plan    canvas viewer, or a PNG preview with --png
+    python -m cad4wires inspect name.CAD    wires, ref systems and extents of a program
+    python -m cad4wires bench               start-up time against a budget, and planning rate
+
+plan ranks and numbers the die as cad2svg.py does, through planner.py, which
+cad2svg.py imports too. The other modules stay at the top of the repository,
+so the package is run from there or with it on PYTHONPATH. Each sub-command
+imports the modules it needs when it runs, so numpy is only loaded by the
+sub-commands that use it; inspect reads a .CAD without it.
+"""
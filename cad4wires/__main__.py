@@ -0,0 +1,5 @@
+import sys
+
+from cad4wires.cli import main
+
+sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Benchmarks of the command: start-up time against a budget, and planning rate.
+
+Start-up is the median wall time of python -m cad4wires --help in a fresh
+interpreter, next to that of the bare interpreter. The sub-commands that do
+not need numpy are checked not to load it. A generated die is then planned,
+inspected and drawn in a temporary directory, each timed.
+"""
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from cad4wires.cli import main
+from cad4wires.planner import ORIGIN
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # start-ups run from the repository
+NUMPY_CHECK = """
+import sys
+from cad4wires.cli import main
+try:
+    main({argv!r})
+except SystemExit:
+    pass
+print('numpy' in sys.modules)
+"""
+
+
+def die_csv(path, wires) -> int:
+    """
+    Pin list of a square die, wires shared out over the four sides; returns the wire count
+    Die pads on a ring clear of the corners, each wired straight out from the die centre to
+    one of two staggered rows of substrate pads, so wires fan out as on a typical die
+    """
+    per_side = max(wires // 4, 1)
+    half = 5.0 * max(per_side / 250, 1.0)
+    pitch = 1.8 * half / per_side
+    pin = 1
+    with open(path, 'wt') as fout:
+        for k in range(per_side):
+            t = -0.9 * half + pitch * (k + 0.5)
+            fan = 1.3 + 0.05 * (k % 2)
+            for sx, sy in ((t, half), (-half, t), (t, -half), (half, t)):
+                fout.write(f'{pin},{sx + ORIGIN[0]:.3f},{sy + ORIGIN[1]:.3f},0,'
+                           f'{fan * sx + ORIGIN[0]:.3f},{fan * sy + ORIGIN[1]:.3f}\n')
+                pin += 1
+    return pin - 1
+
+
+def _median_ms(command, runs) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return 1000 * statistics.median(times)
+
+
+def loads_numpy(argv) -> bool:
+    """Whether a sub-command run in a fresh interpreter imports numpy"""
+    result = subprocess.run([sys.executable, '-c', NUMPY_CHECK.format(argv=argv)], cwd=ROOT,
+                            check=True, capture_output=True, text=True)
+    return result.stdout.strip().splitlines()[-1] == 'True'
+
+
+def _timed(argv) -> float:
+    """Seconds taken by a sub-command run here, its output dropped"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main(argv)
+    return time.perf_counter() - start
+
+
+def run_bench(runs=10, budget=150.0, wires=20_000) -> int:
+    """Prints the figures; 1 if start-up is over budget or numpy is loaded where it should not be"""
+    bare = _median_ms([sys.executable, '-c', 'pass'], runs)
+    startup = _median_ms([sys.executable, '-m', 'cad4wires', '--help'], runs)
+    over = startup > budget
+    print(f'start-up        {startup:8.1f} ms  (interpreter {bare:.1f} ms, budget {budget:.0f} ms)'
+          + ('  OVER BUDGET' if over else ''))
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv = os.path.join(folder, 'bench.csv')
+        count = die_csv(csv, wires)
+        name = os.path.join(folder, 'bench')
+        planned = _timed(['plan', csv])
+        print(f'plan            {planned:8.3f} s   {count / planned:,.0f} wires/s, {count} wires')
+        print(f"inspect .plan   {_timed(['inspect', name + '.plan']):8.3f} s")
+        print(f"inspect .CAD    {_timed(['inspect', name + '.CAD']):8.3f} s")
+        print(f"render          {_timed(['render', name + '.plan']):8.3f} s")
+
+        eager = [' '.join(argv[:1]) for argv in (['--help'], ['inspect', name + '.CAD']) if loads_numpy(argv)]
+    if eager:
+        print('numpy loaded by', ', '.join(eager))
+    else:
+        print('numpy not loaded by --help or inspect .CAD')
+    return 1 if over or eager else 0
@@ -0,0 +1,145 @@
+"""
+Sub-commands of python -m cad4wires.
+
+Only argparse is imported up front; each sub-command imports the modules it
+uses when it is run, so --help and inspect on a .CAD start without numpy.
+"""
+import argparse
+import json
+import os
+
+
+def _name(path) -> str:
+    return os.path.splitext(path)[0]
+
+
+def plan(args) -> int:
+    """Plan a pin list as cad2svg.py does, without the drawing"""
+    from cad4wires.planner import plan_die, read_pin_list
+    from cad4wires.settings import user_settings
+    from emit import srce_centre, write_cad, write_programs
+    from plan import save_plan
+
+    out = args.out or _name(args.csv)
+    program = plan_die(read_pin_list(args.csv, tuple(args.origin)), user_settings, tune=not args.no_tune)
+    save_plan(out + '.plan', program)
+    write_cad(out + '.CAD', program, program.settings)
+    written = [out + '.plan', out + '.CAD'] + write_programs(program, out, centre=srce_centre(program.wires))
+    for written_name in written:
+        print(written_name, 'file created')
+    return 0
+
+
+def render(args) -> int:
+    """Canvas viewer, or PNG preview, of a program"""
+    from plan import read_program
+
+    program = read_program(args.program)
+    if args.png:
+        from raster import render as render_png, write_png
+
+        out = args.out or _name(args.program) + '.png'
+        write_png(out, render_png(program, args.width))
+    else:
+        from viewer import write_viewer
+
+        out = args.out or _name(args.program) + '_view.html'
+        write_viewer(program, out, _name(args.program))
+    print(out, 'file created')
+    return 0
+
+
+def _plan_report(path) -> dict:
+    import numpy as np
+
+    from plan import DEST, load_plan
+    from runstats import RunningStats
+
+    program = load_plan(path)
+    wires = program.wires
+    stats = RunningStats()
+    stats.add_block(wires)
+    sides = {}
+    for s, name in enumerate(program.sides):
+        mine = wires[wires['side'] == s]
+        sides[name] = {'wires': len(mine), 'ranks': len(np.unique(mine['rank']))}
+    dest = program.refs['kind'] == DEST
+    return {'program': path, 'version': program.version, 'wires': len(wires),
+            'srce_refs': int((~dest).sum()), 'dest_refs': int(dest.sum()),
+            'sides': sides, 'settings': program.settings, 'statistics': stats.report()}
+
+
+def _cad_report(path) -> dict:
+    from cadfile import read_cad
+    from runstats import RunningStats
+
+    stats = RunningStats()
+    with open(path, 'rt') as fin:
+        cad = read_cad(fin, stats)
+    numbers = cad['wire']
+    return {'program': path, 'wires': len(numbers),
+            'wire_numbers': [min(numbers), max(numbers)] if numbers else [],
+            'srce_refs': len(set(cad['srce_ref'])), 'dest_refs': len(set(cad['dest_ref'])),
+            'ref_points': len(cad['refs']), 'statistics': stats.report()}
+
+
+def inspect(args) -> int:
+    """Summary of a .plan or .CAD program; a .CAD is read without numpy"""
+    report = _plan_report(args.program) if args.program.endswith('.plan') else _cad_report(args.program)
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return 0
+    print(report['program'])
+    print(f"  {report['wires']} wires, {report['srce_refs']} srce and {report['dest_refs']} dest ref systems")
+    for name, side in report.get('sides', {}).items():
+        print(f"  {name}: {side['wires']} wires, {side['ranks']} ranks")
+    for end in ('srce', 'dest'):
+        if end in report['statistics']:
+            figures = report['statistics'][end]
+            extents = [round(v, 3) for v in figures['extents']]
+            print(f"  {end} extents {extents}, centre {figures['centre']}")
+    return 0
+
+
+def bench(args) -> int:
+    from cad4wires.bench import run_bench
+
+    return run_bench(args.runs, args.budget, args.wires)
+
+
+def parser() -> argparse.ArgumentParser:
+    main_parser = argparse.ArgumentParser(prog='cad4wires', description='Wire-bond programs from pin lists')
+    commands = main_parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    sub = commands.add_parser('plan', help='plan a pin list into a .plan and CAD files')
+    sub.add_argument('csv', help='pin list, as read by cad2svg.py')
+    sub.add_argument('-o', '--out', help='name of the files written, without suffix')
+    sub.add_argument('--no-tune', action='store_true', help='split sides as in the settings, untuned')
+    sub.add_argument('--origin', type=float, nargs=2, default=(125000, 131000),
+                     help='origin hack subtracted from the pin list, as in cad2svg.py')
+    sub.set_defaults(run=plan)
+
+    sub = commands.add_parser('render', help='canvas viewer or PNG preview of a program')
+    sub.add_argument('program', help='.plan or .CAD file')
+    sub.add_argument('--png', action='store_true', help='PNG preview in place of the viewer')
+    sub.add_argument('--width', type=int, default=2000, help='PNG width in pixels')
+    sub.add_argument('-o', '--out', help='file name')
+    sub.set_defaults(run=render)
+
+    sub = commands.add_parser('inspect', help='wires, ref systems and extents of a program')
+    sub.add_argument('program', help='.plan or .CAD file')
+    sub.add_argument('--json', action='store_true', help='the summary as JSON')
+    sub.set_defaults(run=inspect)
+
+    sub = commands.add_parser('bench', help='start-up time against a budget, and planning rate')
+    sub.add_argument('--runs', type=int, default=10, help='start-ups timed')
+    sub.add_argument('--budget', type=float, default=150, help='start-up budget in ms, exit 1 if over')
+    sub.add_argument('--wires', type=int, default=20_000, help='wires in the die planned')
+    sub.set_defaults(run=bench)
+    return main_parser
+
+
+def main(argv=None) -> int:
+    args = parser().parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,223 @@
+"""
+Die planning of cad2svg.py, importable without running it.
+
+A pin list is split into die sides, each side into srce and dest ranks by
+DieSide, and its ref systems and wires numbered by References, in the order
+cad2svg.py writes them into the CAD file. cad2svg.py imports these; plan_die
+runs them on a whole pin list, for the plan command.
+"""
+from plan import DEST, SRCE, Plan, ref_table, wire_table
+from refpoints import farthest_pair
+from sectors import axes, sort_by_sector, tunable, tuned_sides
+
+ORIGIN = (125000, 131000)  # origin hack of the pin lists, as in cad2svg.py
+
+
+class DieSide:
+
+    def __init__(self, facing, wires, axis=None):
+        self.facing = facing
+        self.wires = wires
+        # pads of a rank share x on W and E sides, y on N and S
+        self.axis = axis or ('x' if self.facing in ['W', 'E'] else 'y')
+        srce_idx = 1 if self.axis == 'x' else 2
+        dest_idx = 3 if self.axis == 'x' else 4
+        # filter values to establish rank count
+        self.srce_dupes = self.get_dupes([wire[srce_idx] for wire in wires], 0)
+        self.dest_dupes = self.get_dupes([wire[dest_idx] for wire in wires], 0)
+        self.wires_by_srce = self.wires_to_ranks(index=srce_idx)
+        self.wires_by_dest = self.split_srce_ranks_by_dest(index=dest_idx)
+
+        # rank diffs only used to decide on merging neighbouring ranks
+        if len(self.srce_dupes) > 1:
+            self.srce_rank_diffs = self.get_diffs(self.srce_dupes)
+        if len(self.dest_dupes) > 1:
+            self.dest_rank_diffs = self.get_diffs(self.dest_dupes)
+
+    def get_dupes(self, lst, min_row):
+        """Assumes duplication of values constitutes separate rows of pads"""
+        # one pass, values in order of first appearance
+        d = {}
+        for i in lst:
+            d[i] = d.get(i, 0) + 1
+        n = []
+        for key, val in d.items():
+            if val > min_row:
+                n.append([key, val])
+        return n
+
+    def get_diffs(self, ranks):
+        """Distances between rows of pads"""
+
+        diffs = []
+        for i in range(len(ranks)-1):
+            diffs.append(round(abs(ranks[i][0] - ranks[i+1][0]), 3))
+        return diffs
+
+    def wires_to_ranks(self, index):
+        """ Sorts into ranks according to duplicated values """
+        wires_by_rank = []
+        for dupe in self.srce_dupes:
+            rank = self.dupe_to_rank(dupe, self.wires, index)
+            wires_by_rank.append(rank)
+        return wires_by_rank
+
+    def split_srce_ranks_by_dest(self, index):
+        """ Split source ranks according to destination duplicated values """
+        wires_by_rank = []
+        for srce_rank in self.wires_by_srce:
+            for dupe in self.dest_dupes:
+                rank = self.dupe_to_rank(dupe, srce_rank, index)
+                # not every srce rank reaches every dest rank, e.g. on a diagonal sector
+                if rank:
+                    wires_by_rank.append(rank)
+        return wires_by_rank
+
+    def dupe_to_rank(self, dupe, wires, index) -> list:
+        """ Test given index value against duplicate value and return collection """
+        rank = []
+        for wire in wires:
+            if wire[index] == dupe[0]:
+                rank.append(wire)
+        return rank
+
+
+def widest(wires, col) -> tuple:
+    """The two wires furthest apart at the pads in columns col, col + 1, in bonding order"""
+    i, j = farthest_pair([wire[col] for wire in wires], [wire[col + 1] for wire in wires])
+    return wires[i], wires[j]
+
+
+class References:
+    """
+    Builds the headers of the CAD file for each reference system
+    """
+    _ref_count = 0
+    _wire_count = 0
+    dest_strings = []
+    srce_strings = []
+    ref_sys_points = []
+
+    def __init__(self, wires_by_dest):
+        #order of ref systems, always one dest ref system, one or more srce ref systems
+        self.dest_ref_system = self.dest_refs(wires_by_dest)
+        References.ref_sys_points.append(self.dest_ref_system)
+        self.srce_ref_systems = []
+        self.cad_strings = []
+        for rank in wires_by_dest:
+            self.srce_refs(rank)
+            self.wires_to_strings(rank)
+        for srce in self.srce_ref_systems:
+            References.ref_sys_points.append(srce)
+
+    @classmethod
+    def reset(cls) -> None:
+        """Number ref systems and wires from 1 again, for the next die"""
+        cls._ref_count = 0
+        cls._wire_count = 0
+        cls.dest_strings = []
+        cls.srce_strings = []
+        cls.ref_sys_points = []
+
+    def srce_refs(self, rank) -> None:
+        """
+        Coordinate strings for ref points
+        :param rank:
+        :return: None
+        """
+        References._ref_count +=1
+        self.srce_strings.append(str(References._ref_count))
+        first, last = widest(rank, 1)
+        self.srce_ref_systems.append({
+            str(References._ref_count): {
+                "1": (str(first[1]), str(first[2])),
+                "2": (str(last[1]), str(last[2]))
+            }
+        })
+
+    def dest_refs(self, wires_by_dest) -> dict:
+        """
+        Coordinate strings for ref points
+        :param wires_by_dest:
+        :return: dict
+        """
+        References._ref_count += 1
+        first, last = widest([wire for rank in wires_by_dest for wire in rank], 3)
+        self.dest_strings.append(str(References._ref_count))
+        return {
+            str(References._ref_count): {
+                "1": (str(first[3]), str(first[4])),
+                "2": (str(last[3]), str(last[4]))
+            }
+        }
+
+    def wires_to_strings(self, rank) -> None:
+        """ Two lines to represent one wire in the CAD file """
+        gap = ',    '
+        dref = list(self.dest_ref_system.keys())[0]
+        nums = [d.keys() for d in self.srce_ref_systems]
+        sref = list(nums[-1])[0]
+        for wire in rank:
+            References._wire_count += 1
+            w_num = str(References._wire_count)
+            srce = str(wire[1]) + gap + str(wire[2])
+            dest = str(wire[3]) + gap + str(wire[4])
+            self.cad_strings.append('bondpnt '+w_num+',    1,    '+str(sref) + gap+srce)
+            self.cad_strings.append('bondpnt '+w_num+',    2,    '+str(dref) + gap+dest)
+
+
+def plan_tables(sides, side_refs):
+    """Wire and ref system records for the binary plan, numbered as in the CAD file"""
+    wires = []
+    refs = []
+    w_num = 0
+    for s, (side, side_ref) in enumerate(zip(sides, side_refs)):
+        ((dref, pts),) = side_ref.dest_ref_system.items()
+        refs.append((int(dref), DEST, s, *map(float, pts['1'] + pts['2'])))
+        for rank, (row, system) in enumerate(zip(side.wires_by_dest, side_ref.srce_ref_systems)):
+            ((sref, pts),) = system.items()
+            refs.append((int(sref), SRCE, s, *map(float, pts['1'] + pts['2'])))
+            for wire in row:
+                w_num += 1
+                wires.append((wire[0], w_num, s, rank, int(sref), int(dref), *wire[1:]))
+    refs.sort(key=lambda ref: ref[0])
+    return wire_table(wires), ref_table(refs)
+
+
+def read_pin_list(path, origin=ORIGIN) -> list:
+    """Wires of a pin list as cad2svg.py reads them: pin, srce x, y, dest x, y, less the origin hack"""
+    wires = []
+    with open(path, 'rt') as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            line = [float(xy.strip()) for xy in line.split(',')]
+            wires.append((int(line[0]), line[1] - origin[0], line[2] - origin[1],
+                          line[4] - origin[0], line[5] - origin[1]))
+    return wires
+
+
+def plan_sides(wires, sectors) -> tuple:
+    """Sides with wires, each ranked, and their ref systems, numbered from 1"""
+    References.reset()
+    sides = []
+    side_refs = []
+    for sector, side_wires, axis in zip(sectors, sort_by_sector(wires, sectors), axes(sectors)):
+        # sectors with no wires have no ref systems
+        if side_wires:
+            sides.append(DieSide(facing=sector[0], wires=side_wires, axis=axis))
+            side_refs.append(References(sides[-1].wires_by_dest))
+    return sides, side_refs
+
+
+def plan_die(wires, settings, tune=True):
+    """Plan of a pin list's wires, the four default sides split at the tuned angle unless tune is False"""
+    if tune and tunable(settings['sectors']):
+        sectors, qpi, cost = tuned_sides(wires)
+        print('sides split at', qpi, 'degrees, row cost', cost)
+        settings = {**settings, 'sectors': sectors}
+    sides, side_refs = plan_sides(wires, settings['sectors'])
+    for side in sides:
+        print(side.facing, len(side.wires), 'wires,', len(side.wires_by_dest), 'ranks')
+    plan_wires, plan_refs = plan_tables(sides, side_refs)
+    return Plan(plan_wires, plan_refs, settings, [side.facing for side in sides])
@@ -0,0 +1,55 @@
+"""
+User settings shared by the planning scripts and the cad4wires command.
+
+cad.py, cad2svg.py, outcore.py, parplan.py, multidie.py, conform.py,
+cadimport.py and the plan command all plan with these, so the bond
+parameters, table offsets, shrink and targets are set here once. Keys a
+script has no use for, e.g. 'svg' in cad.py, are left alone. A .plan keeps
+the settings it was planned with.
+"""
+from sectors import FOUR_SIDES
+
+user_settings = {
+    'srce': {
+        'usp': '26.000',
+        'ust': '0.060',
+        'bf' : '20.000',
+        'scale': 1,
+        'no-split': False},
+    'dest': {
+        'usp': '24.000',
+        'ust': '0.060',
+        'bf' : '20.000',
+        'scale': 0.99975},
+    '715-table': {
+        'x' : -126,
+        'y' : -10},
+    '820-table': {
+        'x' : -196,
+        'y' : 10},
+    'rotation': 0,
+    'tolerance': 0.02,  # in mm
+    'bonding': 'out',
+    # die sides as [name, start angle in degrees], counter-clockwise, see sectors.py
+    # cad.py always plans the four default sides
+    'sectors': FOUR_SIDES,
+    # split the four default sides at the angle keeping srce rows together, other layouts are kept
+    'tune-sectors': True,
+    # one CAD file per machine, see emit.py for per-target overrides
+    'targets': {
+        '820': {'table': '820-table'},
+        '715': {'table': '715-table'}},
+    # drawing of cad2svg.py; compact: relative paths at the given decimals, one path per ref group if no labels
+    # svgz: gzipped main drawing in place of the html
+    'svg': {
+        'precision': 3,
+        'compact': False,
+        'labels': True,
+        'svgz': False},
+    # write the CAD file and the drawing in the background, a side at a time, see pipeline.py
+    'pipeline': True,
+    # run metrics written to <name>_<script>_metrics.prom, e.g. C100mm_cad2svg_metrics.prom, see metrics.py
+    'metrics': True,
+    # progress bar on a terminal; Ctrl-C cancels and removes partial files, see progress.py
+    'progress': True
+}
@@ -0,0 +1,57 @@
+"""
+Reader for Hesse BJ820 / 715 CAD files, as exported by the machines or written by cad.py.
+Only refpnt and bondpnt lines are read, other parameters are skipped.
+"""
+import re
+
+refpnt = re.compile('refpnt ')
+bondpnt = re.compile('bondpnt ')
+
+
+def read_cad(lines, stats=None) -> dict:
+    """
+    CAD file lines into lists per column of data
+    refs holds [ref system, point 1 or 2, x, y] for each refpnt line,
+    the other lists hold one entry per wire, in file order
+    stats, a runstats.RunningStats, is updated with every bond point read
+    """
+    cad = {'refs': [], 'wire': [], 'srce_ref': [], 'sx': [], 'sy': [],
+           'dest_ref': [], 'dx': [], 'dy': []}
+
+    for line in lines:
+
+        if refpnt.match(line):
+
+            line = [x.strip() for x in line.split(',')]
+            line[0] = [x.strip() for x in line[0].split(' ')][-1]
+            cad['refs'].append([int(line[0]), int(line[1]), float(line[2]), float(line[3])])
+
+        elif bondpnt.match(line):
+
+            line = [x.strip() for x in line.split(',')]
+            line[0] = int([x.strip() for x in line[0].split(' ')][-1])
+            line[2] = int(line[2])
+            line[3] = float(line[3])
+            line[4] = float(line[4])
+
+            if line[1] == '1':
+                cad['wire'].append(line[0])
+                cad['srce_ref'].append(line[2])
+                cad['sx'].append(line[3])
+                cad['sy'].append(line[4])
+                if stats is not None:
+                    stats.add_point('s', line[3], line[4])
+
+            if line[1] == '2':
+                cad['dest_ref'].append(line[2])
+                cad['dx'].append(line[3])
+                cad['dy'].append(line[4])
+                if stats is not None:
+                    stats.add_point('d', line[3], line[4])
+    return cad
+
+
+def load_cad(title) -> dict:
+    """Read a CAD file by name"""
+    with open(title, 'rt') as fin:
+        return read_cad(fin)
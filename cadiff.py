@@ -0,0 +1,273 @@
+"""
+Compare two CAD programs, e.g. a regenerated program against the one qualified on the machine.
+
+Bonds are joined in three passes, each pass only sees bonds left over from the last:
+1/ by wire number, where both pads are still within tolerance
+2/ by position, through a spatial hash of srce pads on a grid of tolerance sized cells
+3/ by wire number again, for bonds that moved
+Reported against the tolerance, in mm:
+    moved       same wire number, srce or dest pad moved
+    renumbered  same srce and dest pads, different wire number
+    reref       same bond, different srce or dest ref system
+    added, removed
+    ref points moved, added or removed
+
+Usage:
+    python cadiff.py old.CAD new.CAD [--tol 0.005] [--html overlay.html]
+Either file may also be a .plan from cad2svg.py.
+"""
+import argparse
+from math import floor, hypot
+
+import numpy as np
+
+from plan import read_program
+
+
+def _index(nums):
+    """Direct-address table from wire or ref number to table row"""
+    size = int(nums.max()) + 1 if len(nums) else 0
+    table = np.full(size, -1, dtype=np.int64)
+    table[nums] = np.arange(len(nums))
+    return table
+
+
+def _lookup(table, nums):
+    """Rows of nums in an index table, -1 where absent"""
+    rows = np.full(len(nums), -1, dtype=np.int64)
+    ok = (nums >= 0) & (nums < len(table))
+    rows[ok] = table[nums[ok]]
+    return rows
+
+
+def _shifts(old, new):
+    """Srce and dest pad displacement of paired bonds"""
+    return (np.hypot(new['sx'] - old['sx'], new['sy'] - old['sy']),
+            np.hypot(new['dx'] - old['dx'], new['dy'] - old['dy']))
+
+
+def spatial_join(old, new, tol):
+    """
+    Pair bonds with both pads within tol, nearest first, each bond used once
+    Returns rows of old and rows of new
+    """
+    grid = {}
+    for i, (x, y) in enumerate(zip(old['sx'].tolist(), old['sy'].tolist())):
+        grid.setdefault((floor(x / tol), floor(y / tol)), []).append(i)
+
+    pads = list(zip(old['sx'].tolist(), old['sy'].tolist(), old['dx'].tolist(), old['dy'].tolist()))
+    taken = [False] * len(pads)
+    old_rows = []
+    new_rows = []
+    for j, (sx, sy, dx, dy) in enumerate(zip(new['sx'].tolist(), new['sy'].tolist(),
+                                             new['dx'].tolist(), new['dy'].tolist())):
+        cx = floor(sx / tol)
+        cy = floor(sy / tol)
+        best = -1
+        best_d = tol
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for i in grid.get((gx, gy), ()):
+                    if taken[i]:
+                        continue
+                    osx, osy, odx, ody = pads[i]
+                    d = max(hypot(sx - osx, sy - osy), hypot(dx - odx, dy - ody))
+                    if d <= best_d:
+                        best = i
+                        best_d = d
+        if best >= 0:
+            taken[best] = True
+            old_rows.append(best)
+            new_rows.append(j)
+    return np.array(old_rows, dtype=np.int64), np.array(new_rows, dtype=np.int64)
+
+
+def diff_programs(old, new, tol=0.005) -> dict:
+    """Table rows of old and new plans for each kind of difference"""
+    if not tol > 0:
+        raise ValueError(f'tolerance must be above 0, not {tol}')
+    ow = old.wires
+    nw = new.wires
+
+    # 1/ wire number, pads in place
+    rows = _lookup(_index(ow['wire']), nw['wire'])
+    found = np.flatnonzero(rows >= 0)
+    ds, dd = _shifts(ow[rows[found]], nw[found])
+    kept = found[(ds <= tol) & (dd <= tol)]
+    same_old = rows[kept]
+    same_new = kept
+
+    old_left = np.ones(len(ow), dtype=bool)
+    old_left[same_old] = False
+    new_left = np.ones(len(nw), dtype=bool)
+    new_left[same_new] = False
+
+    # 2/ position, renumbered bonds
+    old_idx = np.flatnonzero(old_left)
+    new_idx = np.flatnonzero(new_left)
+    o, n = spatial_join(ow[old_idx], nw[new_idx], tol)
+    ren_old = old_idx[o]
+    ren_new = new_idx[n]
+    old_left[ren_old] = False
+    new_left[ren_new] = False
+
+    # 3/ wire number, moved bonds
+    old_idx = np.flatnonzero(old_left)
+    new_idx = np.flatnonzero(new_left)
+    rows = _lookup(_index(ow['wire'][old_idx]), nw['wire'][new_idx])
+    hit = rows >= 0
+    mov_old = old_idx[rows[hit]]
+    mov_new = new_idx[hit]
+    old_left[mov_old] = False
+    new_left[mov_new] = False
+
+    # ref systems of bonds still in place
+    pair_old = np.concatenate((same_old, ren_old))
+    pair_new = np.concatenate((same_new, ren_new))
+    reref = ((ow['srce_ref'][pair_old] != nw['srce_ref'][pair_new])
+             | (ow['dest_ref'][pair_old] != nw['dest_ref'][pair_new]))
+
+    # ref points by ref number
+    orf = old.refs
+    nrf = new.refs
+    rows = _lookup(_index(orf['ref']), nrf['ref'])
+    found = np.flatnonzero(rows >= 0)
+    a = orf[rows[found]]
+    b = nrf[found]
+    shift = np.maximum(np.hypot(b['x1'] - a['x1'], b['y1'] - a['y1']),
+                       np.hypot(b['x2'] - a['x2'], b['y2'] - a['y2']))
+    ref_moved = shift > tol
+    ref_removed = np.ones(len(orf), dtype=bool)
+    ref_removed[rows[found]] = False
+
+    return {
+        'tolerance': tol,
+        'unchanged': len(same_new),
+        'moved': (mov_old, mov_new),
+        'renumbered': (ren_old, ren_new),
+        'reref': (pair_old[reref], pair_new[reref]),
+        'added': np.flatnonzero(new_left),
+        'removed': np.flatnonzero(old_left),
+        'refs_moved': (rows[found][ref_moved], found[ref_moved]),
+        'refs_added': np.flatnonzero(rows < 0),
+        'refs_removed': np.flatnonzero(ref_removed),
+    }
+
+
+def report_lines(old, new, diff) -> list:
+    """Human readable summary, one line per difference"""
+    ow = old.wires
+    nw = new.wires
+    lines = [
+        f"tolerance {diff['tolerance']} mm, {diff['unchanged']} bonds unchanged",
+        f"{len(diff['moved'][0])} moved, {len(diff['renumbered'][0])} renumbered, "
+        f"{len(diff['reref'][0])} changed ref system, "
+        f"{len(diff['added'])} added, {len(diff['removed'])} removed",
+        f"{len(diff['refs_moved'][0])} ref systems moved, "
+        f"{len(diff['refs_added'])} added, {len(diff['refs_removed'])} removed",
+    ]
+    o, n = diff['moved']
+    ds, dd = _shifts(ow[o], nw[n])
+    for w, s, d in zip(nw['wire'][n].tolist(), ds.tolist(), dd.tolist()):
+        lines.append(f'moved       wire {w}: srce {s:.3f}, dest {d:.3f}')
+    o, n = diff['renumbered']
+    for a, b in zip(ow['wire'][o].tolist(), nw['wire'][n].tolist()):
+        lines.append(f'renumbered  wire {a} -> {b}')
+    o, n = diff['reref']
+    for w, a, b, c, d in zip(nw['wire'][n].tolist(), ow['srce_ref'][o].tolist(), nw['srce_ref'][n].tolist(),
+                             ow['dest_ref'][o].tolist(), nw['dest_ref'][n].tolist()):
+        lines.append(f'reref       wire {w}: srce ref {a} -> {b}, dest ref {c} -> {d}')
+    for w in nw['wire'][diff['added']].tolist():
+        lines.append(f'added       wire {w}')
+    for w in ow['wire'][diff['removed']].tolist():
+        lines.append(f'removed     wire {w}')
+    o, n = diff['refs_moved']
+    for r in new.refs['ref'][n].tolist():
+        lines.append(f'ref moved   {r}')
+    for r in new.refs['ref'][diff['refs_added']].tolist():
+        lines.append(f'ref added   {r}')
+    for r in old.refs['ref'][diff['refs_removed']].tolist():
+        lines.append(f'ref removed {r}')
+    return lines
+
+
+def _paths(wires, rows) -> list:
+    """SVG path per wire, y inverted as in svg.py"""
+    return [f'\t<path d="M{sx} {-sy}L{dx} {-dy}"/>' for sx, sy, dx, dy in
+            zip(wires['sx'][rows].tolist(), wires['sy'][rows].tolist(),
+                wires['dx'][rows].tolist(), wires['dy'][rows].tolist())]
+
+
+def _crosses(refs, rows) -> list:
+    """Cross for both points of a ref system"""
+    marks = []
+    for x1, y1, x2, y2 in zip(refs['x1'][rows].tolist(), refs['y1'][rows].tolist(),
+                              refs['x2'][rows].tolist(), refs['y2'][rows].tolist()):
+        marks.append(f'\t<use xlink:href="#cross" x="{x1}" y="{-y1}" />')
+        marks.append(f'\t<use xlink:href="#cross" x="{x2}" y="{-y2}" />')
+    return marks
+
+
+def write_overlay(old, new, diff, out_file, scale=20) -> None:
+    """HTML with an SVG of only the differences, old in grey, new in colour"""
+    ow = old.wires
+    nw = new.wires
+    xs = np.concatenate((ow['sx'], ow['dx'], nw['sx'], nw['dx']))
+    ys = np.concatenate((ow['sy'], ow['dy'], nw['sy'], nw['dy']))
+    border = 0.2
+    x_min = float(xs.min()) - border if len(xs) else 0
+    y_min = float(-ys.max()) - border if len(ys) else 0
+    x_size = float(xs.max() - xs.min()) + 2 * border if len(xs) else 1
+    y_size = float(ys.max() - ys.min()) + 2 * border if len(ys) else 1
+    stroke = str(1 / scale)
+
+    groups = [
+        ('removed', f'stroke="red" stroke-width="{stroke}"', _paths(ow, diff['removed'])),
+        ('added', f'stroke="green" stroke-width="{stroke}"', _paths(nw, diff['added'])),
+        ('moved-old', f'stroke="#aaa" stroke-width="{stroke}"', _paths(ow, diff['moved'][0])),
+        ('moved', f'stroke="orange" stroke-width="{stroke}"', _paths(nw, diff['moved'][1])),
+        ('renumbered', f'stroke="blue" stroke-width="{stroke}"', _paths(nw, diff['renumbered'][1])),
+        ('reref', f'stroke="purple" stroke-width="{stroke}"', _paths(nw, diff['reref'][1])),
+        ('refs-old', f'stroke="#aaa" stroke-width="{stroke}"',
+         _crosses(old.refs, np.concatenate((diff['refs_moved'][0], diff['refs_removed'])))),
+        ('refs-new', f'stroke="#089" stroke-width="{stroke}"',
+         _crosses(new.refs, np.concatenate((diff['refs_moved'][1], diff['refs_added'])))),
+    ]
+    labels = [f'\t<text x="{sx}" y="{-sy}">{a}&gt;{b}</text>' for a, b, sx, sy in
+              zip(ow['wire'][diff['renumbered'][0]].tolist(), nw['wire'][diff['renumbered'][1]].tolist(),
+                  nw['sx'][diff['renumbered'][1]].tolist(), nw['sy'][diff['renumbered'][1]].tolist())]
+    groups.append(('labels', f'font-size="{13 / scale}" fill="blue"', labels))
+
+    with open(out_file, 'wt') as fout:
+        print('<!DOCTYPE html>\n<html lang="en">\n<head>\n<title>CAD diff</title>\n'
+              '<meta charset="utf-8">\n</head>\n<body>\n<div class="svgcont">', file=fout)
+        print(f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+              f'xmlns:xlink="http://www.w3.org/1999/xlink" '
+              f'width="{round(x_size * scale, 3)}" height="{round(y_size * scale, 3)}" '
+              f'viewBox="{round(x_min, 3)} {round(y_min, 3)} {round(x_size, 3)} {round(y_size, 3)}">', file=fout)
+        print('<defs>\n\t<path id="cross" d="M-0.2 0L0.2 0 M0 -0.2L0 0.2"/>\n</defs>', file=fout)
+        for name, style, elements in groups:
+            if elements:
+                print(f'<g id="{name}" {style}>', file=fout)
+                print('\n'.join(elements), file=fout)
+                print('</g>', file=fout)
+        print('</svg></div></body></html>', file=fout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two CAD programs bond by bond')
+    parser.add_argument('old', help='qualified program, .CAD or .plan')
+    parser.add_argument('new', help='regenerated program, .CAD or .plan')
+    parser.add_argument('--tol', type=float, default=0.005, help='position tolerance in mm')
+    parser.add_argument('--html', help='write an overlay of the differences to this file')
+    args = parser.parse_args()
+    if not args.tol > 0:
+        parser.error('--tol must be above 0')
+
+    old_prog = read_program(args.old)
+    new_prog = read_program(args.new)
+    result = diff_programs(old_prog, new_prog, args.tol)
+    print('\n'.join(report_lines(old_prog, new_prog, result)))
+    if args.html:
+        write_overlay(old_prog, new_prog, result, args.html)
+        print(args.html, 'file created')
@@ -0,0 +1,209 @@
+"""
+Legacy CAD programs imported back into the planner, to be planned again.
+
+import_cad turns a BJ820 / 715 .CAD, its ref systems and bondpnt pairs, into
+the wire table cad2svg.py builds from a pin list. Legacy programs have no pin
+numbers, so each wire's old wire number is taken as its pin, and the new
+program can be traced back to the old one wire by wire.
+Where the machine target is known, from --target or the _820 / _715 ending
+of the file name, its table offset, rotation and shrink in the user settings
+are undone, leaving the srce centre at 0, 0; otherwise the srce centre is
+simply moved there.
+
+Each program is written as a pin list, <name>.csv, with the origin hack put
+back so cad2svg.py, outcore.py and parplan.py read it as they read any other.
+With --plan it is also planned again at once, the sides split at the tuned
+angle, ranked and numbered as parplan.py does, then checked as cad2svg.py
+checks a run: <name>.plan, the CAD files and <name>_integrity.json.
+
+An archive is imported in worker processes, one program each. Imported wire
+tables are cached as .npy files, keyed by the file's path, size and
+modification time and the target undone, so importing the archive again only
+reads the programs that changed.
+
+Usage:
+    python cadimport.py archive/ [more.CAD ...] [-o imported/] [--target 820] [--plan] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cad4wires.settings import user_settings
+from cadfile import load_cad
+from emit import srce_centre, target_profile, untransform
+from integrity import Integrity
+from outcore import write_plan_files
+from parplan import plan_parallel
+from plan import cad_plan
+from sectors import four_sides, tunable, tune_qpi
+
+ORIGIN = (125000, 131000)  # origin hack of the pin lists, as in cad2svg.py
+CACHE = '.import_cache'
+
+
+def known_target(path, settings, target=None):
+    """The target given, or the one the file name ends with, e.g. C100mm_820.CAD; None if neither"""
+    if target:
+        return target
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in settings.get('targets', {}):
+        if stem.endswith('_' + name):
+            return name
+    return None
+
+
+def import_cad(path, settings, target=None):
+    """
+    Wire table of a CAD file, in pin list coordinates with the srce centre at 0, 0
+    Table offset, rotation and shrink of the target are undone if it is known
+    """
+    wires = np.array(cad_plan(load_cad(path)).wires)
+    wires['pin'] = wires['wire']
+    if not len(wires):
+        return wires
+    if target is None:
+        cx, cy = srce_centre(wires)
+        for x, y in (('sx', 'sy'), ('dx', 'dy')):
+            wires[x] -= cx
+            wires[y] -= cy
+        return wires
+    profile = target_profile(settings, target)
+    for x, y, end in (('sx', 'sy', 'srce'), ('dx', 'dy', 'dest')):
+        wires[x], wires[y] = untransform(wires[x], wires[y], (0, 0), profile, profile[end]['scale'])
+    return wires
+
+
+def cache_key(path, settings, target) -> str:
+    """File version and the profile undone"""
+    info = os.stat(path)
+    profile = target_profile(settings, target) if target else None
+    text = json.dumps([os.path.abspath(path), info.st_size, info.st_mtime_ns, target, profile], sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def cached_import(path, settings, target=None, cache=None):
+    """import_cad, read from the cache folder if this version was imported before; the table and whether cached"""
+    if cache is None:
+        return import_cad(path, settings, target), False
+    name = os.path.join(cache, cache_key(path, settings, target) + '.npy')
+    if os.path.exists(name):
+        return np.load(name), True
+    wires = import_cad(path, settings, target)
+    os.makedirs(cache, exist_ok=True)
+    part = name + f'.{os.getpid()}.part'
+    with open(part, 'wb') as fout:
+        np.save(fout, wires)
+    os.replace(part, name)  # another worker may import the same file, either copy will do
+    return wires, False
+
+
+def write_pin_list(path, wires, origin=ORIGIN) -> None:
+    """Pin list as cad2svg.py reads it: pin, srce x y, unused, dest x y, origin hack added"""
+    cols = np.column_stack((wires['pin'], wires['sx'] + origin[0], wires['sy'] + origin[1],
+                            np.zeros(len(wires)), wires['dx'] + origin[0], wires['dy'] + origin[1]))
+    np.savetxt(path, cols, fmt='%d,%.4f,%.4f,%d,%.4f,%.4f')
+
+
+def _pads(wires):
+    return np.column_stack((wires['sx'], wires['sy'], wires['dx'], wires['dy']))
+
+
+def replan(wires, settings, out_file, tune=True) -> tuple:
+    """Plan an imported table again and check it; the files written and the integrity report"""
+    if tune and tunable(settings['sectors']):
+        qpi, _ = tune_qpi(wires['sx'], wires['sy'], wires['dx'], wires['dy'])
+        settings = {**settings, 'sectors': four_sides(qpi)}
+    integrity = Integrity(out_file)
+    integrity.stage('import', len(wires))
+    integrity.wires(_pads(wires))
+    plan = plan_parallel(wires, settings, workers=1)
+    integrity.stage('plan', len(plan.wires))
+    integrity.unassigned('plan', _pads(wires), _pads(plan.wires))
+    written = write_plan_files(plan, out_file, srce_centre(plan.wires))
+    integrity.save(out_file + '_integrity.json')
+    return written + [out_file + '_integrity.json'], integrity
+
+
+def import_one(task) -> dict:
+    """Worker: import one program, write its pin list and, if asked, plan it again"""
+    path, out_file, settings, target, cache, plan_again, tune = task
+    target = known_target(path, settings, target)
+    wires, cached = cached_import(path, settings, target, cache)
+    os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
+    write_pin_list(out_file + '.csv', wires)
+    result = {'program': path, 'wires': len(wires), 'offset': target or 'centred', 'cached': cached,
+              'files': [out_file + '.csv']}
+    if plan_again and len(wires):
+        written, integrity = replan(wires, settings, out_file, tune)
+        result['files'] += written
+        result['ok'] = integrity.ok
+        result['problems'] = integrity.summary_lines()
+    return result
+
+
+def programs(paths, skip=()) -> list:
+    """
+    CAD files given, and those found under folders given, each with its name below the folder
+    Folders in skip, e.g. the output and cache folders, are not searched
+    """
+    skip = {os.path.abspath(folder) for folder in skip if folder}
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append((path, os.path.basename(path)))
+            continue
+        for folder, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(folder, d)) not in skip)
+            for name in sorted(names):
+                if name.lower().endswith('.cad'):
+                    full = os.path.join(folder, name)
+                    found.append((full, os.path.relpath(full, path)))
+    return found
+
+
+def import_archive(paths, out, settings, target=None, workers=None, cache=None, plan_again=False,
+                   tune=True) -> list:
+    """Import every program found, in worker processes; a result per program, in the order found"""
+    tasks = [(path, os.path.join(out, os.path.splitext(name)[0]), settings, target, cache, plan_again, tune)
+             for path, name in programs(paths, skip=(out, cache))]
+    for path, out_file, *_ in tasks:
+        if os.path.abspath(out_file + '.CAD') == os.path.abspath(path):
+            raise ValueError(f'{path} would be written over, import into another folder')
+    if workers == 1 or len(tasks) < 2:
+        return [import_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks))) as pool:
+        return list(pool.map(import_one, tasks))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import legacy CAD programs into the planner')
+    parser.add_argument('paths', nargs='+', help='.CAD files, or folders searched for them')
+    parser.add_argument('-o', '--out', default='imported', help='folder the pin lists are written to')
+    parser.add_argument('--target', help='machine target of every program, in place of the name ending')
+    parser.add_argument('--plan', action='store_true', help='plan each program again and check it')
+    parser.add_argument('--no-tune', action='store_true', help='split sides as in the settings, untuned')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--cache', help=f'folder of imported tables, defaults to {CACHE} in the output folder')
+    parser.add_argument('--no-cache', action='store_true', help='import every program again')
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else args.cache or os.path.join(args.out, CACHE)
+    try:
+        results = import_archive(args.paths, args.out, user_settings, args.target, args.workers, cache,
+                                 args.plan, not args.no_tune)
+    except ValueError as err:
+        parser.error(str(err))
+    for result in results:
+        status = '' if result.get('ok', True) else ', ' + '; '.join(result['problems'])
+        print(f"{result['program']}: {result['wires']} wires, offset {result['offset']}"
+              f"{', cached' if result['cached'] else ''}{status}")
+    summary = os.path.join(args.out, 'import_summary.json')
+    os.makedirs(args.out, exist_ok=True)
+    with open(summary, 'wt') as fout:
+        json.dump(results, fout, indent=1)
+    print(len(results), 'programs imported,', sum(r['cached'] for r in results), 'from the cache')
+    print(summary, 'file created')
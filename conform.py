@@ -0,0 +1,132 @@
+"""
+Netlist conformance: check that a CAD program, generated or hand-edited,
+bonds every pin of its source pin list to the right pad.
+
+The table offset, rotation and shrink of the machine target are undone first
+(the inverse of rotate, scale and translate in cad.py), then the srce and dest
+pads of each bond are matched to the nearest pin list pads through a grid index.
+Reported:
+    missing     pins with no correct bond, e.g. wires cad.py dropped outside every dest rank
+    duplicate   pins bonded more than once
+    mismatched  bonds from the srce pad of one pin to the dest pad of another, or to no pad
+    stray       bonds whose srce pad is on no pin
+
+Usage:
+    python conform.py pins.csv program.CAD [--plan name.plan --target 820] [--origin X Y] [--tol 0.005]
+Without a target the program is taken as untransformed, e.g. the plain .CAD of cad2svg.py.
+The targets are read from the plan, or from the program if it is a .plan; with neither,
+e.g. for the CAD files of cad.py, the default user settings of the scripts are used.
+Exits with status 1 if the program does not conform.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from cad4wires.settings import user_settings
+from emit import end_profile, target_profile, untransform
+from pinlist import read_pins
+from plan import load_plan, read_program
+from spatial import PointGrid
+
+
+def pin_centre(pins):
+    """Mid point of the srce extents, as cad.py locates the source centre"""
+    return (round((pins['sx'].min() + pins['sx'].max()) / 2, 3),
+            round((pins['sy'].min() + pins['sy'].max()) / 2, 3))
+
+
+def untransform_wires(wires, profile, centre):
+    """Copy of a wire table moved off the machine table"""
+    wires = np.array(wires)
+    wires['sx'], wires['sy'] = untransform(wires['sx'], wires['sy'], centre, end_profile(profile, 'srce'),
+                                           profile['srce']['scale'])
+    wires['dx'], wires['dy'] = untransform(wires['dx'], wires['dy'], centre, end_profile(profile, 'dest'),
+                                           profile['dest']['scale'])
+    return wires
+
+
+def check_program(pins, wires, tol=0.005) -> dict:
+    """Match bonds to pins and collect every way they disagree"""
+    s_row, _ = PointGrid(pins['sx'], pins['sy'], tol).nearest(wires['sx'], wires['sy'])
+    d_row, _ = PointGrid(pins['dx'], pins['dy'], tol).nearest(wires['dx'], wires['dy'])
+
+    # pins may share a pad at one end, so try the pin found at either end
+    s_ok = s_row >= 0
+    d_ok = d_row >= 0
+    s_fits = np.zeros(len(wires), dtype=bool)
+    s_fits[s_ok] = np.hypot(pins['dx'][s_row[s_ok]] - wires['dx'][s_ok],
+                            pins['dy'][s_row[s_ok]] - wires['dy'][s_ok]) <= tol
+    d_fits = np.zeros(len(wires), dtype=bool)
+    d_fits[d_ok] = np.hypot(pins['sx'][d_row[d_ok]] - wires['sx'][d_ok],
+                            pins['sy'][d_row[d_ok]] - wires['sy'][d_ok]) <= tol
+    row = np.where(s_fits, s_row, np.where(d_fits, d_row, -1))
+
+    good = row >= 0
+    stray = ~good & ~s_ok
+    mismatched = ~good & s_ok
+    counts = np.bincount(row[good], minlength=len(pins))
+
+    dupes = np.flatnonzero(counts > 1)
+    dupe_wires = [wires['wire'][row == r].tolist() for r in dupes]
+    return {
+        'pins': len(pins),
+        'bonds': len(wires),
+        'matched': int(good.sum()),
+        'missing': pins['pin'][counts == 0],
+        'duplicate': list(zip(pins['pin'][dupes].tolist(), dupe_wires)),
+        'mismatched': list(zip(wires['wire'][mismatched].tolist(),
+                               pins['pin'][s_row[mismatched]].tolist(),
+                               np.where(d_ok, pins['pin'][d_row], -1)[mismatched].tolist())),
+        'stray': wires['wire'][stray],
+    }
+
+
+def conforms(result) -> bool:
+    return not (len(result['missing']) or result['duplicate'] or result['mismatched'] or len(result['stray']))
+
+
+def report_lines(result) -> list:
+    """Human readable summary, one line per problem"""
+    lines = [
+        f"{result['pins']} pins, {result['bonds']} bonds, {result['matched']} matched",
+        f"{len(result['missing'])} missing, {len(result['duplicate'])} duplicate, "
+        f"{len(result['mismatched'])} mismatched, {len(result['stray'])} stray",
+    ]
+    for pin in result['missing'].tolist():
+        lines.append(f'missing     pin {pin}')
+    for pin, w_nums in result['duplicate']:
+        lines.append(f'duplicate   pin {pin}: wires {w_nums}')
+    for w_num, s_pin, d_pin in result['mismatched']:
+        dest = f'pin {d_pin}' if d_pin >= 0 else 'no pad'
+        lines.append(f'mismatched  wire {w_num}: srce pin {s_pin}, dest {dest}')
+    for w_num in result['stray'].tolist():
+        lines.append(f'stray       wire {w_num}')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a CAD program against its source pin list')
+    parser.add_argument('pins', help='source pin list .csv')
+    parser.add_argument('program', help='program to check, .CAD or .plan')
+    parser.add_argument('--plan', help='plan holding the machine targets, defaults to the program if a .plan, '
+                                       'else the default user settings')
+    parser.add_argument('--target', help='machine target the program was written for, e.g. 820')
+    parser.add_argument('--origin', type=float, nargs=2, default=(125000, 131000),
+                        help='origin hack subtracted from the pin list, as in cad.py')
+    parser.add_argument('--tol', type=float, default=0.005, help='pad tolerance in mm')
+    args = parser.parse_args()
+
+    pin_list = read_pins(args.pins, args.origin)
+    program = read_program(args.program)
+    bonds = program.wires
+    if args.target:
+        if args.plan or args.program.endswith('.plan'):
+            settings = load_plan(args.plan or args.program).settings
+        else:
+            settings = user_settings
+        bonds = untransform_wires(bonds, target_profile(settings, args.target), pin_centre(pin_list))
+
+    outcome = check_program(pin_list, bonds, args.tol)
+    print('\n'.join(report_lines(outcome)))
+    sys.exit(0 if conforms(outcome) else 1)
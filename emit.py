@@ -0,0 +1,185 @@
+"""
+Multi-target output stage: one computed plan, one CAD program per machine.
+
+Each entry of user_settings['targets'] names the table offset of a machine and
+may override the rotation, shrink scale and bond parameters of the plan:
+    'targets': {
+        '820': {'table': '820-table'},
+        '715': {'table': '715-table', 'rotation': 90, 'dest': {'scale': 0.9998}},
+    }
+Transforms are applied to whole plan tables at once, about the srce centre,
+in the order cad.py has always used: rotate, scale, translate to the table.
+The srce and dest overrides may also hold their own 'rotation' and a 'shift'
+from the table, as fitted to measured ref points by fiducials.py.
+
+Usage:
+    python emit.py name.plan [target ...]
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from plan import SRCE, load_plan
+
+DEFAULT_TARGETS = {'820': {'table': '820-table'}}
+BLOCK = 100_000  # wires transformed and written at a time
+
+
+def target_profile(settings, target) -> dict:
+    """Plan settings with the overrides of one target applied"""
+    over = settings.get('targets', DEFAULT_TARGETS)[target]
+    table = over.get('table', target + '-table')
+    return {
+        'table': settings[table] if isinstance(table, str) else table,
+        'rotation': over.get('rotation', settings.get('rotation', 0)),
+        'srce': {**settings['srce'], **over.get('srce', {})},
+        'dest': {**settings['dest'], **over.get('dest', {})},
+    }
+
+
+def srce_centre(wires):
+    """Mid point of the srce extents, origin for rotation and scale"""
+    return (round((wires['sx'].min() + wires['sx'].max()) / 2, 3),
+            round((wires['sy'].min() + wires['sy'].max()) / 2, 3))
+
+
+def transform(x, y, centre, profile, scl):
+    """Rotate and scale arrays of points about centre, then move centre to the table"""
+    angle = np.radians(profile['rotation'])
+    cs = np.cos(angle)
+    sn = np.sin(angle)
+    c_x = x - centre[0]
+    c_y = y - centre[1]
+    t_x = profile['table']['x']
+    t_y = profile['table']['y']
+    return (np.round((cs * c_x - sn * c_y) * scl + t_x, 3),
+            np.round((sn * c_x + cs * c_y) * scl + t_y, 3))
+
+
+def untransform(x, y, centre, profile, scl):
+    """Inverse of transform: points on the machine table back to input coordinates"""
+    angle = np.radians(profile['rotation'])
+    cs = np.cos(angle)
+    sn = np.sin(angle)
+    t_x = (x - profile['table']['x']) / scl
+    t_y = (y - profile['table']['y']) / scl
+    return (cs * t_x + sn * t_y + centre[0],
+            -sn * t_x + cs * t_y + centre[1])
+
+
+def end_profile(profile, end) -> dict:
+    """
+    Profile of the pads of one end, 'srce' or 'dest': the rotation and the shift
+    from the table given for that end, as fitted by fiducials.py, if any
+    """
+    params = profile[end]
+    if 'rotation' not in params and 'shift' not in params:
+        return profile
+    shift_x, shift_y = params.get('shift', (0, 0))
+    return {**profile, 'rotation': params.get('rotation', profile['rotation']),
+            'table': {'x': profile['table']['x'] + shift_x, 'y': profile['table']['y'] + shift_y}}
+
+
+def transform_wires(wires, profile, centre):
+    """Copy of a wire table, moved to the machine table of a profile"""
+    wires = np.array(wires)
+    srce = end_profile(profile, 'srce')
+    dest = end_profile(profile, 'dest')
+    wires['sx'], wires['sy'] = transform(wires['sx'], wires['sy'], centre, srce, profile['srce']['scale'])
+    wires['dx'], wires['dy'] = transform(wires['dx'], wires['dy'], centre, dest, profile['dest']['scale'])
+    return wires
+
+
+def transform_refs(refs, profile, centre):
+    """Copy of a ref table, moved to the machine table of a profile"""
+    refs = np.array(refs)
+    is_srce = refs['kind'] == SRCE
+    srce = end_profile(profile, 'srce')
+    dest = end_profile(profile, 'dest')
+    for x, y in (('x1', 'y1'), ('x2', 'y2')):
+        sx, sy = transform(refs[x], refs[y], centre, srce, profile['srce']['scale'])
+        dx, dy = transform(refs[x], refs[y], centre, dest, profile['dest']['scale'])
+        refs[x] = np.where(is_srce, sx, dx)
+        refs[y] = np.where(is_srce, sy, dy)
+    return refs
+
+
+def transform_plan(plan, profile, centre):
+    """Copies of the plan tables, moved to the machine table of a profile"""
+    return transform_wires(plan.wires, profile, centre), transform_refs(plan.refs, profile, centre)
+
+
+def refheader(ref, x1, y1, x2, y2, settings) -> str:
+    """This paragraph is required for each reference system at the top of the file"""
+    return f'''refpnt         {ref},         1,   {x1},    {y1}
+refpnt         {ref},         2,   {x2},    {y2}
+refuspower     {ref},         1,    {settings['usp']}
+refforce       {ref},         1,    {settings[ 'bf']}
+refustime      {ref},         1,    {settings['ust']}'''
+
+
+def header_lines(refs, profile) -> list:
+    """One header paragraph per ref system"""
+    lines = []
+    for ref, kind, _, x1, y1, x2, y2 in refs.tolist():
+        params = profile['srce'] if kind == SRCE else profile['dest']
+        lines.append(refheader(ref, x1, y1, x2, y2, params))
+    return lines
+
+
+def bond_lines(wires) -> list:
+    """Two bondpnt lines per wire"""
+    lines = []
+    tb = ',    '
+    for _, w_num, _, _, sref, dref, sx, sy, dx, dy in wires.tolist():
+        lines.append('bondpnt ' + str(w_num) + ',    1,    ' + str(sref) + tb + str(sx) + tb + str(sy))
+        lines.append('bondpnt ' + str(w_num) + ',    2,    ' + str(dref) + tb + str(dx) + tb + str(dy))
+    return lines
+
+
+def cad_lines(wires, refs, profile) -> list:
+    """Ref system headers, then two bondpnt lines per wire"""
+    return header_lines(refs, profile) + bond_lines(wires)
+
+
+def write_cad(path, plan, profile, centre=None) -> None:
+    """
+    CAD file of a plan, moved to the machine table of profile if a centre is given
+    Wires are transformed and written BLOCK at a time, so a memory-mapped plan stays on disk
+    """
+    refs = plan.refs if centre is None else transform_refs(plan.refs, profile, centre)
+    with open(path, 'wt') as fout:
+        for line in header_lines(refs, profile):
+            fout.write(line + '\n')
+        for lo in range(0, len(plan.wires), BLOCK):
+            wires = plan.wires[lo:lo + BLOCK]
+            if centre is not None:
+                wires = transform_wires(wires, profile, centre)
+            fout.write('\n'.join(bond_lines(wires)) + '\n')
+
+
+def write_program(plan, out_file, centre, target) -> str:
+    """Transform the plan for one target and write its CAD file"""
+    name = out_file + '_' + target + '.CAD'
+    write_cad(name, plan, target_profile(plan.settings, target), centre)
+    return name
+
+
+def write_programs(plan, out_file, targets=None, centre=None) -> list:
+    """One CAD file per target, written concurrently from the same plan"""
+    if targets is None:
+        targets = list(plan.settings.get('targets', DEFAULT_TARGETS))
+    if centre is None:
+        centre = srce_centre(plan.wires)
+    emit = partial(write_program, plan, out_file, centre)
+    with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as pool:
+        return list(pool.map(emit, targets))
+
+
+if __name__ == '__main__':
+    title = sys.argv[1]
+    out_file = title[:-len('.plan')] if title.endswith('.plan') else title
+    for name in write_programs(load_plan(title), out_file, sys.argv[2:] or None):
+        print(name, 'file created')
@@ -0,0 +1,198 @@
+"""
+Substrate shrink and rotation fitted to ref points measured on the machine.
+
+The machine reports where it finds each ref point of a program bonded on the
+table of one target. For each end, srce and dest, the similarity that takes
+the planned ref points there is solved by least squares over all its points
+at once, in the form emit.py transforms them:
+    measured = scale * R(rotation) * (planned - centre) + table + shift
+An affine fit is reported beside it, with its two scales and shear: a lot that
+needs more than a similarity shows as unequal scales and residuals well above
+those of the affine fit.
+Residuals are reported per ref system. The fitted rotation, scale and shift go
+into the srce and dest overrides of the target, which emit.py applies in place
+of the hand-entered 'scale' and 'rotation'.
+
+Measured CSV, one ref point per line, as the refpnt lines of a CAD file:
+    ref system, point (1 or 2), x, y
+Lines that do not start with a number, e.g. a header, are skipped.
+
+Usage:
+    python fiducials.py name.plan measured.csv [--target 820] [--emit]
+Writes <name>_<target>_fit.json. With --emit the fitted settings are saved in the .plan,
+so conform.py undoes them, and <name>_<target>.CAD is written again from them.
+"""
+import argparse
+import copy
+import csv
+import json
+
+import numpy as np
+
+from emit import DEFAULT_TARGETS, srce_centre, target_profile, write_program
+from plan import DEST, SRCE, Plan, load_plan, save_plan
+
+ENDS = (('srce', SRCE), ('dest', DEST))
+
+
+def read_measured(path) -> dict:
+    """Measured x, y of each (ref system, point)"""
+    measured = {}
+    with open(path, 'rt', newline='') as fin:
+        for row in csv.reader(fin):
+            if not row or not row[0].strip().lstrip('-').isdigit():
+                continue
+            measured[int(row[0]), int(row[1])] = (float(row[2]), float(row[3]))
+    return measured
+
+
+def planned_points(refs) -> dict:
+    """Columns ref, point, kind, x, y of every ref point of a ref table"""
+    refs = np.asarray(refs)
+    return {
+        'ref': np.repeat(refs['ref'], 2),
+        'point': np.tile([1, 2], len(refs)),
+        'kind': np.repeat(refs['kind'], 2),
+        'x': np.column_stack((refs['x1'], refs['x2'])).ravel(),
+        'y': np.column_stack((refs['y1'], refs['y2'])).ravel(),
+    }
+
+
+def similarity(q, m):
+    """
+    Least-squares a, b, tx, ty of m = [[a, -b], [b, a]] q + t, and the residuals
+    q and m are n by 2 arrays of points; needs two or more points
+    """
+    n = len(q)
+    design = np.zeros((2 * n, 4))
+    design[0::2] = np.column_stack((q[:, 0], -q[:, 1], np.ones(n), np.zeros(n)))
+    design[1::2] = np.column_stack((q[:, 1], q[:, 0], np.zeros(n), np.ones(n)))
+    params = np.linalg.lstsq(design, m.ravel(), rcond=None)[0]
+    return params, m - (design @ params).reshape(n, 2)
+
+
+def affine(q, m):
+    """Least-squares 2 by 3 matrix of m = A [q, 1], and the residuals; needs three or more points"""
+    design = np.column_stack((q, np.ones(len(q))))
+    matrix = np.linalg.lstsq(design, m, rcond=None)[0].T
+    return matrix, m - design @ matrix.T
+
+
+def _spread(residuals) -> dict:
+    dist = np.hypot(residuals[:, 0], residuals[:, 1])
+    return {'rms': round(float(np.sqrt(np.mean(dist ** 2))), 5), 'max': round(float(dist.max()), 5)}
+
+
+def fit_end(q, m, refs, table) -> dict:
+    """
+    Similarity and affine fits of one end; q planned points less the centre, m measured points
+    refs is the ref system of each point, table the target's table offset
+    """
+    (a, b, tx, ty), residuals = similarity(q, m)
+    fit = {
+        'points': len(q),
+        'scale': round(float(np.hypot(a, b)), 8),
+        'rotation': round(float(np.degrees(np.arctan2(b, a))), 6),
+        'shift': [round(float(tx - table['x']), 5), round(float(ty - table['y']), 5)],
+        **_spread(residuals),
+    }
+    numbers, group = np.unique(refs, return_inverse=True)
+    dist2 = (residuals ** 2).sum(axis=1)
+    counts = np.bincount(group)
+    rms = np.sqrt(np.bincount(group, dist2) / counts)
+    worst = np.zeros(len(numbers))
+    np.maximum.at(worst, group, np.sqrt(dist2))
+    fit['refs'] = {int(ref): {'points': int(n), 'rms': round(float(r), 5), 'max': round(float(w), 5)}
+                   for ref, n, r, w in zip(numbers.tolist(), counts, rms, worst)}
+
+    if len(q) >= 3 and np.linalg.matrix_rank(np.column_stack((q, np.ones(len(q))))) == 3:
+        matrix, residuals = affine(q, m)
+        linear = matrix[:, :2]
+        scale_x = np.hypot(*linear[:, 0])
+        shear = float(linear[:, 0] @ linear[:, 1]) / scale_x ** 2
+        scale_y = float(np.linalg.det(linear)) / scale_x
+        fit['affine'] = {'matrix': np.round(matrix, 8).tolist(),
+                         'scales': [round(float(scale_x), 8), round(scale_y, 8)],
+                         'shear': round(shear, 8), **_spread(residuals)}
+    return fit
+
+
+def fit(plan, measured, target, centre=None) -> dict:
+    """
+    Fits of the srce and dest ends of a plan to the ref points measured on a target's table
+    Ref points that were not measured are left out; measured points the plan lacks are listed
+    """
+    if centre is None:
+        centre = srce_centre(plan.wires)
+    profile = target_profile(plan.settings, target)
+    points = planned_points(plan.refs)
+    keys = list(zip(points['ref'].tolist(), points['point'].tolist()))
+    found = np.array([key in measured for key in keys], dtype=bool)
+    report = {'target': target, 'centre': list(centre),
+              'unknown': sorted(set(measured) - set(keys))}
+    for end, kind in ENDS:
+        rows = np.flatnonzero(found & (points['kind'] == kind))
+        if len(rows) < 2:
+            raise ValueError(f'{end}: {len(rows)} ref points measured, at least 2 are needed')
+        q = np.column_stack((points['x'][rows] - centre[0], points['y'][rows] - centre[1]))
+        m = np.array([measured[keys[row]] for row in rows.tolist()])
+        report[end] = fit_end(q, m, points['ref'][rows], profile['table'])
+    return report
+
+
+def fitted_settings(settings, report) -> dict:
+    """Copy of plan settings, the fitted scale, rotation and shift in the target's srce and dest overrides"""
+    settings = copy.deepcopy(settings)
+    targets = settings.setdefault('targets', copy.deepcopy(DEFAULT_TARGETS))
+    over = targets[report['target']]
+    for end, _ in ENDS:
+        over[end] = {**over.get(end, {}),
+                     **{key: report[end][key] for key in ('scale', 'rotation', 'shift')}}
+    return settings
+
+
+def report_lines(report, tolerance=None) -> list:
+    lines = []
+    for end, _ in ENDS:
+        f = report[end]
+        lines.append(f"{end}: scale {f['scale']:.8f}, rotation {f['rotation']:.5f} deg, "
+                     f"shift {f['shift'][0]:.4f} {f['shift'][1]:.4f} mm, "
+                     f"residual rms {f['rms']:.4f} max {f['max']:.4f} mm over {f['points']} points")
+        if 'affine' in f:
+            a = f['affine']
+            lines.append(f"  affine: scales {a['scales'][0]:.8f} {a['scales'][1]:.8f}, shear {a['shear']:.6f}, "
+                         f"residual rms {a['rms']:.4f} max {a['max']:.4f} mm")
+        for ref, r in f['refs'].items():
+            flag = '  over tolerance' if tolerance is not None and r['max'] > tolerance else ''
+            lines.append(f"  ref {ref}: rms {r['rms']:.4f} max {r['max']:.4f} mm{flag}")
+    if report['unknown']:
+        lines.append(f"measured points not in the plan: {report['unknown']}")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit shrink and rotation to measured ref points')
+    parser.add_argument('plan', help='.plan file the program was written from')
+    parser.add_argument('measured', help='csv of ref system, point, x, y as measured on the machine')
+    parser.add_argument('--target', default=None, help='machine target the points were measured on')
+    parser.add_argument('--emit', action='store_true',
+                        help="save the fitted settings in the plan and write the target's CAD file again")
+    args = parser.parse_args()
+
+    plan = load_plan(args.plan, mmap=not args.emit)  # read in full to be saved again
+    target = args.target or next(iter(plan.settings.get('targets', DEFAULT_TARGETS)))
+    report = fit(plan, read_measured(args.measured), target)
+    report['settings'] = fitted_settings(plan.settings, report)['targets'][target]
+    for line in report_lines(report, plan.settings.get('tolerance')):
+        print(line)
+
+    out_file = args.plan[:-len('.plan')] if args.plan.endswith('.plan') else args.plan
+    name = f'{out_file}_{target}_fit.json'
+    with open(name, 'wt') as fout:
+        json.dump(report, fout, indent=1)
+    print(name, 'file created')
+    if args.emit:
+        fitted = Plan(plan.wires, plan.refs, fitted_settings(plan.settings, report), plan.sides)
+        save_plan(args.plan, fitted)
+        print(args.plan, 'file created')
+        print(write_program(fitted, out_file, report['centre'], target), 'file created')
@@ -0,0 +1,111 @@
+"""
+Integrity checks over the whole wire table, run alongside planning.
+
+Each check is a few array operations over all wires, cheap enough to leave on.
+Checks are collected in an Integrity report:
+    wires       duplicate srce pads, duplicate dest pads, zero-length wires
+    stage       wire count conservation from the first stage to each later one
+    unassigned  wires of the input table missing from a later stage, e.g. outside every dest rank
+    sides       sides with no wires
+Errors are wires lost or unusable; warnings are worth a look, e.g. pads shared by two pins.
+"""
+import json
+
+import numpy as np
+
+ERROR = 'error'
+WARNING = 'warning'
+MAX_ROWS = 20  # rows listed per check, counts are always complete
+
+
+def _row_keys(table):
+    """One opaque key per row of a 2D float table"""
+    table = np.ascontiguousarray(table, dtype=np.float64)
+    return table.view(np.dtype((np.void, table.dtype.itemsize * table.shape[1]))).ravel()
+
+
+def duplicates(x, y, tol):
+    """Rows whose pad shares a tol sized cell with another pad"""
+    cells = np.column_stack((np.round(np.asarray(x) / tol), np.round(np.asarray(y) / tol))).astype(np.int64)
+    if not len(cells):
+        return np.zeros(0, dtype=np.int64)
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    return np.flatnonzero(counts[inverse.ravel()] > 1)
+
+
+class Integrity:
+    """
+    Collects checks and stage counts of one planning run
+    """
+
+    def __init__(self, title=''):
+        self.title = title
+        self.stages = []
+        self.checks = []
+        self.statistics = {}
+
+    def _add(self, name, level, rows, count=None, detail=''):
+        rows = np.asarray(rows)
+        self.checks.append({
+            'check': name,
+            'level': level,
+            'ok': not (len(rows) if count is None else count),
+            'count': int(len(rows) if count is None else count),
+            'rows': rows[:MAX_ROWS].tolist(),
+            'detail': detail,
+        })
+
+    def wires(self, table, tol=0.001) -> None:
+        """Checks on an input table of (sx, sy, dx, dy) columns"""
+        table = np.asarray(table, dtype=np.float64).reshape(-1, 4)
+        sx, sy, dx, dy = table.T
+        self._add('duplicate srce pads', WARNING, duplicates(sx, sy, tol))
+        self._add('duplicate dest pads', WARNING, duplicates(dx, dy, tol))
+        self._add('zero-length wires', ERROR, np.flatnonzero(np.hypot(dx - sx, dy - sy) < tol))
+
+    def stage(self, name, count) -> None:
+        """Wire count after a stage, which must match the first stage"""
+        self.stages.append({'stage': name, 'wires': int(count)})
+        first = self.stages[0]
+        if len(self.stages) > 1:
+            lost = first['wires'] - int(count)
+            self._add(f"wires conserved to {name}", ERROR, [], count=abs(lost),
+                      detail=f"{count} of {first['wires']} from {first['stage']}")
+
+    def unassigned(self, name, table, assigned) -> None:
+        """Rows of the input table with no copy among the assigned wires"""
+        table = np.asarray(table, dtype=np.float64)
+        assigned = np.asarray(assigned, dtype=np.float64).reshape(-1, table.shape[1])
+        missing = np.flatnonzero(~np.isin(_row_keys(table), _row_keys(assigned)))
+        self._add(f'unassigned wires at {name}', ERROR, missing)
+
+    def sides(self, counts, names) -> None:
+        """Sides left with no wires; the CAD ref systems assume every side is bonded"""
+        counts = np.asarray(counts)
+        empty = np.flatnonzero(counts == 0)
+        self._add('empty sides', ERROR, empty, detail=' '.join(names[i] for i in empty))
+
+    def stats(self, stats) -> None:
+        """Extents and centres gathered while reading, kept with the report"""
+        self.statistics = stats.report()
+
+    @property
+    def ok(self) -> bool:
+        return all(chk['ok'] for chk in self.checks if chk['level'] == ERROR)
+
+    def report(self) -> dict:
+        return {'title': self.title, 'ok': self.ok, 'stages': self.stages, 'checks': self.checks,
+                'statistics': self.statistics}
+
+    def summary_lines(self) -> list:
+        """One line per failed check"""
+        lines = []
+        for chk in self.checks:
+            if not chk['ok']:
+                detail = f" ({chk['detail']})" if chk['detail'] else ''
+                lines.append(f"{chk['level']}: {chk['check']}: {chk['count']}{detail}")
+        return lines
+
+    def save(self, path) -> None:
+        with open(path, 'wt') as fout:
+            json.dump(self.report(), fout, indent=1)
@@ -0,0 +1,248 @@
+"""
+Metrics of planning runs, in the OpenMetrics text format that Prometheus reads.
+
+A Registry holds counters, gauges and histograms, each with labels. The scripts
+update them once per stage or per side, never per wire, so keeping them costs
+nothing next to the planning. At the end of a run the registry is written to a
+text file, e.g. for node_exporter's textfile collector; a long running process,
+such as query.py reading queries, can serve it at http://localhost:PORT/metrics.
+Pure Python, so svg.py keeps working without numpy.
+
+A Run records the metrics every script shares, labelled by script:
+    cad4wires_wires_total               wires planned or drawn
+    cad4wires_wires_per_second          wires over the wall time of the last run
+    cad4wires_stage_seconds             histogram of the time taken by each stage
+    cad4wires_ranks                     srce ranks and dest rows of each side
+    cad4wires_problems_total            wires flagged by each integrity check
+    cad4wires_errors_total              errors met, e.g. queries that could not be read, by kind
+    cad4wires_cache_hits_total          and cad4wires_cache_misses_total, by cache
+"""
+import contextlib
+import http.server
+import math
+import threading
+import time
+
+PREFIX = 'cad4wires_'
+BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0, 600.0)  # seconds
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _num(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    One metric family: a value, or a histogram, per set of label values
+    """
+
+    def __init__(self, name, kind, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, not {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def inc(self, amount=1, **labels) -> None:
+        """Add to a counter or gauge"""
+        if self.kind == 'counter' and amount < 0:
+            raise ValueError(f'counter {self.name} can only go up')
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels) -> None:
+        """Set a gauge"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, value, **labels) -> None:
+        """Count a value into a histogram"""
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels))
+
+    def lines(self) -> list:
+        """Exposition lines of the family, series in label order"""
+        out = [f'# TYPE {self.name} {self.kind}', f'# HELP {self.name} {_escape(self.help)}']
+        with self.lock:
+            series = sorted(self.values.items())
+        for key, value in series:
+            if self.kind == 'counter':
+                out.append(f'{self.name}_total{_labels(self.labels, key)} {_num(value)}')
+            elif self.kind == 'gauge':
+                out.append(f'{self.name}{_labels(self.labels, key)} {_num(value)}')
+            else:
+                counts, total = value
+                for bound, count in zip(self.buckets, counts):
+                    out.append(f'{self.name}_bucket{_labels(self.labels, key, [("le", _num(bound))])} {count}')
+                out.append(f'{self.name}_count{_labels(self.labels, key)} {counts[-1]}')
+                out.append(f'{self.name}_sum{_labels(self.labels, key)} {_num(total)}')
+        return out
+
+
+class Registry:
+    """
+    Metric families by name, made on first use
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _metric(self, name, kind, help_text, labels, **kw) -> Metric:
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Metric(name, kind, help_text, labels, **kw)
+            metric = self.metrics[name]
+        if metric.kind != kind:
+            raise ValueError(f'{name} is a {metric.kind}, not a {kind}')
+        return metric
+
+    def counter(self, name, help_text, labels=()) -> Metric:
+        return self._metric(PREFIX + name, 'counter', help_text, labels)
+
+    def gauge(self, name, help_text, labels=()) -> Metric:
+        return self._metric(PREFIX + name, 'gauge', help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=BUCKETS) -> Metric:
+        return self._metric(PREFIX + name, 'histogram', help_text, labels, buckets=buckets)
+
+    def exposition(self) -> str:
+        """The whole registry as OpenMetrics text"""
+        lines = []
+        for name in sorted(self.metrics):
+            lines += self.metrics[name].lines()
+        return '\n'.join(lines + ['# EOF']) + '\n'
+
+    def write(self, path) -> None:
+        with open(path, 'wt') as fout:
+            fout.write(self.exposition())
+
+    def serve(self, port, host='127.0.0.1') -> http.server.HTTPServer:
+        """Serve /metrics on a background thread until the process ends or the server is shut down"""
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+
+REGISTRY = Registry()
+
+
+class Run:
+    """
+    Metrics shared by the scripts, for one run of one script
+    """
+
+    def __init__(self, script, registry=REGISTRY):
+        self.script = script
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.count = 0
+        self.wires_total = registry.counter('wires', 'Wires planned or drawn', ['script'])
+        self.rate = registry.gauge('wires_per_second', 'Wires over the wall time of the last run', ['script'])
+        self.seconds = registry.histogram('stage_seconds', 'Time taken by each stage', ['script', 'stage'])
+        self.rank_count = registry.gauge('ranks', 'Srce ranks and dest rows of each side', ['script', 'side', 'end'])
+        self.problems = registry.counter('problems', 'Wires flagged by each integrity check',
+                                         ['script', 'level', 'check'])
+        self.error_count = registry.counter('errors', 'Errors met, by kind', ['script', 'kind'])
+        self.hits = registry.counter('cache_hits', 'Lookups answered from a cache', ['script', 'cache'])
+        self.misses = registry.counter('cache_misses', 'Lookups that had to fill a cache', ['script', 'cache'])
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the block as one stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds.observe(time.perf_counter() - start, script=self.script, stage=name)
+
+    def mark(self, name) -> None:
+        """End a stage that began at the last mark, or at the start of the run"""
+        now = time.perf_counter()
+        self.seconds.observe(now - self.last, script=self.script, stage=name)
+        self.last = now
+
+    def took(self, name, seconds) -> None:
+        """A stage timed elsewhere, e.g. the busy time of a background writer"""
+        self.seconds.observe(seconds, script=self.script, stage=name)
+
+    def wires(self, count) -> None:
+        self.count += count
+        self.wires_total.inc(count, script=self.script)
+
+    def ranks(self, side, srce, dest) -> None:
+        """Srce ranks and dest rows of one side"""
+        self.rank_count.set(srce, script=self.script, side=side, end='srce')
+        self.rank_count.set(dest, script=self.script, side=side, end='dest')
+
+    def integrity(self, integrity) -> None:
+        """Wires flagged by each check of an integrity.Integrity report, 0 where it passed"""
+        for chk in integrity.checks:
+            self.problems.inc(chk['count'], script=self.script, level=chk['level'], check=chk['check'])
+
+    def error(self, kind) -> None:
+        self.error_count.inc(script=self.script, kind=kind)
+
+    def cache(self, name, hits, misses) -> None:
+        """Hits and misses since the last call, e.g. from functools cache_info()"""
+        self.hits.inc(hits, script=self.script, cache=name)
+        self.misses.inc(misses, script=self.script, cache=name)
+
+    def path(self, name) -> str:
+        """Metrics file of this script for a die name, so scripts run on one die keep their own"""
+        return f'{name}_{self.script}_metrics.prom'
+
+    def finish(self, path=None) -> None:
+        """Wires per second over the run so far, if any, and the registry written to path if given"""
+        elapsed = time.perf_counter() - self.started
+        if self.count and elapsed > 0:
+            self.rate.set(round(self.count / elapsed, 1), script=self.script)
+        if path:
+            self.registry.write(path)
@@ -0,0 +1,156 @@
+"""
+Multi-die planning: one pin list of a module carrying several chips, planned die by die.
+
+The srce pads are grouped into dies by spatial.clusters, so the pin list is read
+without the origin hack and needs no splitting by hand. Each die is planned on its
+own in a worker process, as parplan.py plans one die: side split angle tuned for
+that die, sides classified and ranked. Dies are numbered in reading order, top to
+bottom and left to right along a row. The merge then numbers wires and ref systems on from die to die, giving
+one program with the sides of every die in turn, named N1, W1, ..., N2, ...
+The centre and sectors of each die are kept in the plan settings under 'dies'.
+
+Usage:
+    python multidie.py name.csv [--gap 1.0] [--workers N] [--origin X Y] [--no-tune]
+"""
+import argparse
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cad4wires.settings import user_settings
+from outcore import read_chunks, rank_side, ref_points, number_side, write_plan_files
+from parplan import _shared
+from plan import WIRE_DTYPE, Plan, ref_table
+from runstats import RunningStats
+from sectors import axes, classify, four_sides, tunable, tune_qpi, wire_angles
+from spatial import clusters
+
+GAP = 1.0  # mm between the pad rings of neighbouring dies
+
+
+def die_order(wires, label):
+    """Die of each wire, renumbered top to bottom and left to right at equal y, and the die centres"""
+    count = int(label.max()) + 1 if len(label) else 0
+    x0 = np.full(count, np.inf)
+    y0 = np.full(count, np.inf)
+    x1 = np.full(count, -np.inf)
+    y1 = np.full(count, -np.inf)
+    np.minimum.at(x0, label, wires['sx'])
+    np.minimum.at(y0, label, wires['sy'])
+    np.maximum.at(x1, label, wires['sx'])
+    np.maximum.at(y1, label, wires['sy'])
+    # mid point of the srce extents, as emit.srce_centre
+    centres = np.column_stack((np.round((x0 + x1) / 2, 3), np.round((y0 + y1) / 2, 3)))
+    order = np.lexsort((centres[:, 0], -centres[:, 1]))
+    rename = np.empty(count, dtype=np.int64)
+    rename[order] = np.arange(count)
+    return rename[label], centres[order]
+
+
+def plan_die_shared(task):
+    """
+    Worker: plan the die in rows lo:hi of the shared row array
+    Its rows are put in bonding order in place; returns the sectors used and,
+    per side with wires, the side name, wire count, rank starts and ref points
+    """
+    table_name, rows_name, count, lo, hi, layout, tune = task
+    table_block, table = _shared(table_name, WIRE_DTYPE, count)
+    rows_block, rows = _shared(rows_name, np.int64, count)
+    try:
+        die_rows = rows[lo:hi].copy()
+        wires = table[die_rows]
+        if tune:
+            qpi, _ = tune_qpi(wires['sx'], wires['sy'], wires['dx'], wires['dy'])
+            layout = four_sides(qpi)
+        sector = classify(wire_angles(wires['sx'], wires['sy'], wires['dx'], wires['dy']), layout)
+        grouped = np.argsort(sector, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(sector, minlength=len(layout)))]
+
+        sides = []
+        for s, axis in enumerate(axes(layout)):
+            side_rows = grouped[bounds[s]:bounds[s + 1]]
+            # sectors with no wires have no ref systems, as in cad2svg.py
+            if not len(side_rows):
+                continue
+            order, starts = rank_side(wires[side_rows], axis)
+            side_rows = side_rows[order]
+            rows[lo + bounds[s]:lo + bounds[s + 1]] = die_rows[side_rows]
+            sides.append((layout[s][0], len(side_rows), starts, ref_points(wires[side_rows], starts)))
+        return layout, sides
+    finally:
+        del table, rows
+        table_block.close()
+        rows_block.close()
+
+
+def plan_dies(wires, settings, gap=GAP, workers=None, tune=True) -> Plan:
+    """Plan every die of a wire table, concurrently, as one program"""
+    die, centres = die_order(wires, clusters(wires['sx'], wires['sy'], gap))
+    counts = np.bincount(die, minlength=len(centres))
+    bounds = np.r_[0, np.cumsum(counts)]
+    count = len(wires)
+
+    table_block = shared_memory.SharedMemory(create=True, size=max(wires.nbytes, 1))
+    rows_block = shared_memory.SharedMemory(create=True, size=max(count * 8, 1))
+    try:
+        table = np.ndarray((count,), dtype=WIRE_DTYPE, buffer=table_block.buf)
+        rows = np.ndarray((count,), dtype=np.int64, buffer=rows_block.buf)
+        # field by field, so padding bytes stay zero as in parplan.py
+        for field in WIRE_DTYPE.names:
+            table[field] = wires[field]
+        rows[:] = np.argsort(die, kind='stable')
+
+        tasks = [(table_block.name, rows_block.name, count, int(bounds[d]), int(bounds[d + 1]),
+                  settings['sectors'], tune and tunable(settings['sectors'])) for d in range(len(centres))]
+        if workers == 1 or len(tasks) < 2:
+            results = [plan_die_shared(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks))) as pool:
+                results = list(pool.map(plan_die_shared, tasks))
+
+        # numbers run on from side to side and die to die, so the merge is sequential
+        ranked = table[rows]
+        refs = []
+        names = []
+        dies = []
+        at = 0
+        for d, (layout, sides) in enumerate(results):
+            dies.append({'centre': centres[d].tolist(), 'wires': int(counts[d]), 'sectors': layout})
+            for name, side_count, starts, points in sides:
+                names.append(name + str(d + 1))
+                side_wires = ranked[at:at + side_count]
+                refs.extend(number_side(side_wires, starts, len(names) - 1, len(refs), at, points))
+                at += side_count
+        del table, rows
+    finally:
+        table_block.close()
+        table_block.unlink()
+        rows_block.close()
+        rows_block.unlink()
+    settings = copy.deepcopy(settings)
+    settings['dies'] = dies
+    return Plan(ranked, ref_table(refs), settings, names)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan a pin list of several dies as one program')
+    parser.add_argument('csv', help='pin list, as read by cad2svg.py')
+    parser.add_argument('--gap', type=float, default=GAP, help='mm between the pad rings of neighbouring dies')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--origin', type=float, nargs=2, default=(0, 0),
+                        help='subtracted from the pin list, no longer needed to centre a die')
+    parser.add_argument('--no-tune', action='store_true', help='split sides as in the settings, untuned')
+    args = parser.parse_args()
+
+    stats = RunningStats()
+    chunks = list(read_chunks(args.csv, origin=tuple(args.origin), stats=stats))
+    table = np.concatenate(chunks) if chunks else np.zeros(0, dtype=WIRE_DTYPE)
+    plan = plan_dies(table, user_settings, args.gap, args.workers, not args.no_tune)
+    for die_num, info in enumerate(plan.settings['dies'], start=1):
+        print('die', die_num, 'centre', info['centre'], info['wires'], 'wires')
+    out = os.path.splitext(args.csv)[0]
+    for name in write_plan_files(plan, out, stats.centre() if len(stats) else (0, 0)):
+        print(name, 'file created')
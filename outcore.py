@@ -0,0 +1,189 @@
+"""
+Out-of-core planning, for pin lists too big to hold as lists of wires.
+
+The .csv is read once, in chunks. Each chunk is split into sides (sectors.py) and
+appended to a raw WIRE_DTYPE file per side in a temporary directory. The sides are
+then taken one at a time from their memory maps: ranked as DieSide in cad4wires/planner.py
+ranks them, numbered, and appended to the wire table of the plan on disk.
+Memory in use follows the chunk size and the largest side, not the whole table.
+
+Writes the .plan, the plain .CAD and one CAD file per machine target, numbered as
+cad2svg.py numbers them. The sectors are taken from the settings as given, tuning
+needs all wires at once and is left to cad2svg.py.
+
+Usage:
+    python outcore.py name.csv [--chunk 100000] [--origin X Y]
+"""
+import argparse
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from cad4wires.settings import user_settings
+from emit import write_cad, write_programs
+from plan import DEST, SRCE, WIRE_DTYPE, Plan, ref_table, save_plan
+from refpoints import farthest_pair
+from runstats import RunningStats
+from sectors import axes, classify, wire_angles
+
+CHUNK = 100_000  # csv lines parsed at a time
+
+
+def read_chunks(title, chunk=CHUNK, origin=(125000, 131000), stats=None):
+    """
+    Wire records of the csv, chunk lines at a time; pin, srce x y, dest x y in columns 1, 2, 3, 5, 6
+    stats, a RunningStats, is updated with every chunk read
+    """
+    with open(title, 'rt') as fin:
+        while True:
+            lines = [line for line in itertools.islice(fin, chunk) if line.strip()]
+            if not lines:
+                return
+            cols = np.loadtxt(lines, delimiter=',', usecols=(0, 1, 2, 4, 5), ndmin=2)
+            wires = np.zeros(len(cols), dtype=WIRE_DTYPE)
+            wires['pin'] = cols[:, 0]
+            wires['sx'] = cols[:, 1] - origin[0]
+            wires['sy'] = cols[:, 2] - origin[1]
+            wires['dx'] = cols[:, 3] - origin[0]
+            wires['dy'] = cols[:, 4] - origin[1]
+            if stats is not None:
+                stats.add_block(wires)
+            yield wires
+
+
+def partition(title, layout, folder, chunk=CHUNK, origin=(125000, 131000)):
+    """
+    Append the wires of each sector to its own file in folder
+    Returns the file names, wire counts per sector and the statistics of all wires and each side
+    """
+    names = [os.path.join(folder, f'side{s}.bin') for s in range(len(layout))]
+    counts = np.zeros(len(layout), dtype=np.int64)
+    stats = RunningStats()
+    files = [open(name, 'wb') for name in names]
+    try:
+        for wires in read_chunks(title, chunk, origin, stats):
+            sector = classify(wire_angles(wires['sx'], wires['sy'], wires['dx'], wires['dy']), layout)
+            wires['side'] = sector
+            for s in np.unique(sector).tolist():
+                part = wires[sector == s]
+                part.tofile(files[s])
+                counts[s] += len(part)
+                stats.side(layout[s][0]).add_block(part)
+    finally:
+        for fout in files:
+            fout.close()
+    return names, counts, stats
+
+
+def first_seen(values):
+    """Number of each distinct value in order of first appearance, per element"""
+    _, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    seen = np.empty(len(first), dtype=np.int64)
+    seen[np.argsort(first)] = np.arange(len(first))
+    return seen[inverse.ravel()]
+
+
+def rank_side(wires, axis):
+    """
+    Bonding order of one side and where each rank starts in it, as DieSide:
+    srce rows in order of first appearance, each split by dest rows, input order kept within
+    """
+    s_key, d_key = ('sx', 'dx') if axis == 'x' else ('sy', 'dy')
+    s_row = first_seen(wires[s_key])
+    d_row = first_seen(wires[d_key])
+    order = np.lexsort((d_row, s_row))
+    pair = s_row[order] * (int(d_row.max()) + 1) + d_row[order]
+    starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+    return order, starts
+
+
+def ref_points(ranked, starts):
+    """
+    Ref points of a ranked side as x1, y1, x2, y2, as References picks them:
+    the dest ref system from the two dest pads of the side furthest apart,
+    a srce ref system per rank from the two srce pads of the rank furthest apart
+    """
+    ends = np.r_[starts[1:], len(ranked)]
+    i, j = farthest_pair(ranked['dx'], ranked['dy'])
+    dest = [float(ranked['dx'][i]), float(ranked['dy'][i]), float(ranked['dx'][j]), float(ranked['dy'][j])]
+    srce = np.empty((len(starts), 4))
+    for k, (lo, hi) in enumerate(zip(starts.tolist(), ends.tolist())):
+        i, j = farthest_pair(ranked['sx'][lo:hi], ranked['sy'][lo:hi])
+        srce[k] = ranked['sx'][lo + i], ranked['sy'][lo + i], ranked['sx'][lo + j], ranked['sy'][lo + j]
+    return dest, srce
+
+
+def number_side(ranked, starts, side, ref_count, wire_count, points=None):
+    """
+    Wire and ref numbers of a ranked side, set in place, and its ref systems:
+    one dest ref system then a srce ref system per rank, as References numbers them
+    """
+    dest, srce = points if points is not None else ref_points(ranked, starts)
+    ends = np.r_[starts[1:], len(ranked)]
+    rank = np.repeat(np.arange(len(starts)), ends - starts)
+    dref = ref_count + 1
+    srefs = dref + 1 + np.arange(len(starts))
+    ranked['side'] = side
+    ranked['rank'] = rank
+    ranked['srce_ref'] = srefs[rank]
+    ranked['dest_ref'] = dref
+    ranked['wire'] = wire_count + 1 + np.arange(len(ranked))
+
+    refs = [(dref, DEST, side, *dest)]
+    refs.extend((sref, SRCE, side, *pts) for sref, pts in zip(srefs.tolist(), np.asarray(srce).tolist()))
+    return refs
+
+
+def write_plan_files(plan, out_file, centre) -> list:
+    """The .plan, the plain .CAD and a CAD file per machine target"""
+    save_plan(out_file + '.plan', plan)
+    write_cad(out_file + '.CAD', plan, plan.settings)
+    return [out_file + '.plan', out_file + '.CAD'] + write_programs(plan, out_file, centre=centre)
+
+
+def plan_out_of_core(title, out_file, settings, chunk=CHUNK, origin=(125000, 131000)) -> list:
+    """Plan a csv with bounded memory; returns the names of the files written"""
+    layout = settings['sectors']
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_file))) as folder:
+        names, counts, stats = partition(title, layout, folder, chunk, origin)
+        table = os.path.join(folder, 'wires.bin')
+        refs = []
+        sides = []
+        wire_count = 0
+        with open(table, 'wb') as fout:
+            for name, count, sector, axis in zip(names, counts.tolist(), layout, axes(layout)):
+                # sectors with no wires have no ref systems, as in cad2svg.py
+                if not count:
+                    continue
+                wires = np.memmap(name, dtype=WIRE_DTYPE, mode='r', shape=(count,))
+                order, starts = rank_side(wires, axis)
+                ranked = wires[order]
+                refs.extend(number_side(ranked, starts, len(sides), len(refs), wire_count))
+                ranked.tofile(fout)
+                sides.append(sector[0])
+                wire_count += count
+                print(sector[0], count, 'wires,', len(starts), 'ranks')
+                del wires, ranked
+
+        wires = np.memmap(table, dtype=WIRE_DTYPE, mode='r', shape=(wire_count,)) if wire_count \
+            else np.zeros(0, dtype=WIRE_DTYPE)
+        plan = Plan(wires, ref_table(refs), settings, sides)
+        # srce centre from the statistics gathered while partitioning
+        written = write_plan_files(plan, out_file, stats.centre())
+        del plan, wires
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan a large pin list with bounded memory')
+    parser.add_argument('csv', help='pin list, as read by cad2svg.py')
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='csv lines read at a time')
+    parser.add_argument('--origin', type=float, nargs=2, default=(125000, 131000),
+                        help='origin hack subtracted from the pin list, as in cad2svg.py')
+    args = parser.parse_args()
+
+    out = os.path.splitext(args.csv)[0]
+    for written_name in plan_out_of_core(args.csv, out, user_settings, args.chunk, tuple(args.origin)):
+        print(written_name, 'file created')
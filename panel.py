@@ -0,0 +1,149 @@
+"""
+Step-and-repeat panels: a die planned once, bonded at every site of an M x N grid.
+
+The site in row r, column c (from 1) is the planned die moved by
+((c - 1) * pitch x, -(r - 1) * pitch y), so rows run down the panel, and sites are
+bonded in reading order. A skip map leaves sites out, e.g. sites known to be bad;
+a site shrink scales one site about its srce centre.
+Wire numbers run on from site to site and ref systems are renumbered per site:
+site k (from 0) adds k times the highest ref number of the die.
+
+The ref headers of all sites are written first; then each site's wires are moved
+as whole arrays and written to the .plan, the plain .CAD and the CAD file of every
+machine target in the same pass, so only one site is held in memory at a time.
+
+Usage:
+    python panel.py die.plan --grid M N --pitch PX PY [--skip R C ...] [--shrink R C SCALE ...] [-o name]
+"""
+import argparse
+import copy
+
+import numpy as np
+
+from emit import (DEFAULT_TARGETS, bond_lines, header_lines, srce_centre, target_profile,
+                  transform_refs, transform_wires)
+from plan import PlanWriter, load_plan
+
+SITE_DTYPE = np.dtype([
+    ('row', '<i4'),
+    ('col', '<i4'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('scale', '<f8'),
+])
+
+
+def panel_sites(grid, pitch, skip=(), shrink=None) -> np.ndarray:
+    """
+    Sites of the panel in bonding order, less those in skip
+    grid is (rows, columns), skip a list of (row, col), shrink a {(row, col): scale} dict
+    """
+    rows, cols = grid
+    row, col = np.divmod(np.arange(rows * cols), cols)
+    sites = np.zeros(rows * cols, dtype=SITE_DTYPE)
+    sites['row'] = row + 1
+    sites['col'] = col + 1
+    sites['x'] = col * pitch[0]
+    sites['y'] = -row * pitch[1]
+    sites['scale'] = 1
+    for (r, c), scale in (shrink or {}).items():
+        sites['scale'][(sites['row'] == r) & (sites['col'] == c)] = scale
+    keep = np.ones(len(sites), dtype=bool)
+    for r, c in skip:
+        keep &= ~((sites['row'] == r) & (sites['col'] == c))
+    return sites[keep]
+
+
+def _move(x, y, centre, site):
+    """Scale about the srce centre, then step to the site, rounded as the CAD file keeps it"""
+    return (np.round((x - centre[0]) * site['scale'] + centre[0] + site['x'], 3),
+            np.round((y - centre[1]) * site['scale'] + centre[1] + site['y'], 3))
+
+
+def site_wires(wires, centre, site, k, ref_step):
+    """Copy of the die wire table at site k"""
+    wires = np.array(wires)
+    wires['sx'], wires['sy'] = _move(wires['sx'], wires['sy'], centre, site)
+    wires['dx'], wires['dy'] = _move(wires['dx'], wires['dy'], centre, site)
+    wires['wire'] += k * len(wires)
+    wires['srce_ref'] += k * ref_step
+    wires['dest_ref'] += k * ref_step
+    return wires
+
+
+def site_refs(refs, centre, site, k, ref_step):
+    """Copy of the die ref table at site k"""
+    refs = np.array(refs)
+    refs['x1'], refs['y1'] = _move(refs['x1'], refs['y1'], centre, site)
+    refs['x2'], refs['y2'] = _move(refs['x2'], refs['y2'], centre, site)
+    refs['ref'] += k * ref_step
+    return refs
+
+
+def panel_centre(wires, centre, sites):
+    """Mid point of the srce extents of the whole panel, as emit.srce_centre"""
+    corners = []
+    for x, y in ((wires['sx'].min(), wires['sy'].min()), (wires['sx'].max(), wires['sy'].max())):
+        corners.append(_move(x, y, centre, sites))
+    xs = np.concatenate([corner[0] for corner in corners])
+    ys = np.concatenate([corner[1] for corner in corners])
+    return round((xs.min() + xs.max()) / 2, 3), round((ys.min() + ys.max()) / 2, 3)
+
+
+def write_panel(plan, out_file, sites, targets=None) -> list:
+    """Plan, plain CAD and target CAD files of the panel, written in one pass over the sites"""
+    wires = np.asarray(plan.wires)
+    ref_step = int(plan.refs['ref'].max()) if len(plan.refs) else 0
+    if ref_step * len(sites) > np.iinfo(np.int16).max:
+        raise ValueError(f'{ref_step * len(sites)} ref systems are more than a plan can number')
+    centre = srce_centre(wires)
+    settings = copy.deepcopy(plan.settings)
+    settings['panel'] = {'sites': sites.tolist(), 'centre': list(centre)}
+    if targets is None:
+        targets = list(settings.get('targets', DEFAULT_TARGETS))
+    profiles = [target_profile(settings, target) for target in targets]
+    table_centre = panel_centre(wires, centre, sites)
+
+    refs = np.concatenate([site_refs(plan.refs, centre, site, k, ref_step) for k, site in enumerate(sites)])
+    names = [out_file + '.plan', out_file + '.CAD'] + [out_file + '_' + target + '.CAD' for target in targets]
+    cads = [open(name, 'wt') for name in names[1:]]
+    try:
+        with PlanWriter(names[0], len(wires) * len(sites), refs, settings, plan.sides) as out:
+            for line in header_lines(refs, settings):
+                cads[0].write(line + '\n')
+            for fout, profile in zip(cads[1:], profiles):
+                for line in header_lines(transform_refs(refs, profile, table_centre), profile):
+                    fout.write(line + '\n')
+
+            for k, site in enumerate(sites):
+                moved = site_wires(wires, centre, site, k, ref_step)
+                out.write(moved)
+                cads[0].write('\n'.join(bond_lines(moved)) + '\n')
+                for fout, profile in zip(cads[1:], profiles):
+                    fout.write('\n'.join(bond_lines(transform_wires(moved, profile, table_centre))) + '\n')
+    finally:
+        for fout in cads:
+            fout.close()
+    return names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Step-and-repeat program of a planned die')
+    parser.add_argument('plan', help='.plan of one die')
+    parser.add_argument('--grid', type=int, nargs=2, required=True, metavar=('ROWS', 'COLS'))
+    parser.add_argument('--pitch', type=float, nargs=2, required=True, metavar=('PX', 'PY'),
+                        help='site pitch in mm along a row and down a column')
+    parser.add_argument('--skip', type=int, nargs=2, action='append', default=[], metavar=('ROW', 'COL'),
+                        help='site left out, may be repeated')
+    parser.add_argument('--shrink', nargs=3, action='append', default=[], metavar=('ROW', 'COL', 'SCALE'),
+                        help='scale of one site about its srce centre, may be repeated')
+    parser.add_argument('-o', '--out', help='output name, defaults to the plan name with _panel')
+    args = parser.parse_args()
+
+    die = load_plan(args.plan)
+    site_shrink = {(int(r), int(c)): float(scale) for r, c, scale in args.shrink}
+    panel = panel_sites(args.grid, args.pitch, [tuple(site) for site in args.skip], site_shrink)
+    out = args.out or args.plan[:-len('.plan')] + '_panel'
+    for name in write_panel(die, out, panel):
+        print(name, 'file created')
+    print(len(panel), 'sites,', len(panel) * len(die), 'wires')
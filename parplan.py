@@ -0,0 +1,112 @@
+"""
+Parallel per-side planning: the sides of a die are ranked in worker processes.
+
+The wire table is read whole and placed in shared memory (multiprocessing.shared_memory),
+with a second shared array holding the rows of the table grouped by side. Each worker
+attaches to both by name, ranks its side as DieSide in cad4wires/planner.py does, writes the bonding
+order back into its slice of the row array and returns only the rank starts and ref points.
+No wire data is pickled between processes.
+Wire and ref numbers depend on the sides before, so they are assigned afterwards in one
+sequential merge; the files written match outcore.py and cad2svg.py exactly.
+
+Usage:
+    python parplan.py name.csv [--workers N] [--origin X Y]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cad4wires.settings import user_settings
+from outcore import read_chunks, rank_side, ref_points, number_side, write_plan_files
+from plan import WIRE_DTYPE, Plan, ref_table
+from runstats import RunningStats
+from sectors import axes, classify, wire_angles
+
+
+def _shared(name, dtype, count):
+    """Attach to a shared block by name, as an array"""
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray((count,), dtype=dtype, buffer=block.buf)
+
+
+def rank_shared(task):
+    """
+    Worker: rank the rows lo:hi of the shared row array, one side of the shared table
+    Returns the rank starts and ref points of the side
+    """
+    table_name, rows_name, count, lo, hi, axis = task
+    table_block, table = _shared(table_name, WIRE_DTYPE, count)
+    rows_block, rows = _shared(rows_name, np.int64, count)
+    try:
+        side_rows = rows[lo:hi].copy()
+        wires = table[side_rows]
+        order, starts = rank_side(wires, axis)
+        rows[lo:hi] = side_rows[order]
+        return starts, ref_points(wires[order], starts)
+    finally:
+        del table, rows
+        table_block.close()
+        rows_block.close()
+
+
+def plan_parallel(wires, settings, workers=None) -> Plan:
+    """Plan a wire table with the sides ranked in parallel, numbered as cad2svg.py numbers them"""
+    layout = settings['sectors']
+    sector = classify(wire_angles(wires['sx'], wires['sy'], wires['dx'], wires['dy']), layout)
+    counts = np.bincount(sector, minlength=len(layout))
+    bounds = np.r_[0, np.cumsum(counts)]
+    count = len(wires)
+
+    table_block = shared_memory.SharedMemory(create=True, size=max(wires.nbytes, 1))
+    rows_block = shared_memory.SharedMemory(create=True, size=max(count * 8, 1))
+    try:
+        table = np.ndarray((count,), dtype=WIRE_DTYPE, buffer=table_block.buf)
+        rows = np.ndarray((count,), dtype=np.int64, buffer=rows_block.buf)
+        # field by field, so padding bytes stay zero and plan files are byte for byte repeatable
+        for field in WIRE_DTYPE.names:
+            table[field] = wires[field]
+        rows[:] = np.argsort(sector, kind='stable')
+
+        # sectors with no wires have no ref systems, as in cad2svg.py
+        sides = [s for s in range(len(layout)) if counts[s]]
+        tasks = [(table_block.name, rows_block.name, count, int(bounds[s]), int(bounds[s + 1]), axes(layout)[s])
+                 for s in sides]
+        if workers == 1 or len(tasks) < 2:
+            results = [rank_shared(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks))) as pool:
+                results = list(pool.map(rank_shared, tasks))
+
+        # numbers run on from side to side, so the merge is sequential
+        ranked = table[rows]
+        refs = []
+        for s, (side, (starts, points)) in enumerate(zip(sides, results)):
+            side_wires = ranked[bounds[side]:bounds[side + 1]]
+            refs.extend(number_side(side_wires, starts, s, len(refs), int(bounds[side]), points))
+        del table, rows
+    finally:
+        table_block.close()
+        table_block.unlink()
+        rows_block.close()
+        rows_block.unlink()
+    return Plan(ranked, ref_table(refs), settings, [layout[s][0] for s in sides])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan a pin list with the sides ranked in parallel')
+    parser.add_argument('csv', help='pin list, as read by cad2svg.py')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--origin', type=float, nargs=2, default=(125000, 131000),
+                        help='origin hack subtracted from the pin list, as in cad2svg.py')
+    args = parser.parse_args()
+
+    stats = RunningStats()
+    chunks = list(read_chunks(args.csv, origin=tuple(args.origin), stats=stats))
+    table = np.concatenate(chunks) if chunks else np.zeros(0, dtype=WIRE_DTYPE)
+    plan = plan_parallel(table, user_settings, args.workers)
+    out = os.path.splitext(args.csv)[0]
+    for name in write_plan_files(plan, out, stats.centre() if len(stats) else (0, 0)):
+        print(name, 'file created')
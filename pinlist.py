@@ -0,0 +1,28 @@
+"""
+Source pin list reader, comma or tab separated, 6 columns:
+    pin | srceX | srceY | user | destX | destY
+Column 4 is free for the user and is not read.
+"""
+import numpy as np
+
+PIN_DTYPE = np.dtype([
+    ('pin', '<i4'),
+    ('sx', '<f8'),
+    ('sy', '<f8'),
+    ('dx', '<f8'),
+    ('dy', '<f8'),
+], align=True)
+
+
+def parse_pin(line, origin=(0, 0)) -> tuple:
+    """One pin list line to (pin, sx, sy, dx, dy), moved by the origin hack"""
+    line = [float(xy.strip()) for xy in line.replace('\t', ',').split(',')]
+    return (int(line[0]), line[1] - origin[0], line[2] - origin[1],
+            line[4] - origin[0], line[5] - origin[1])
+
+
+def read_pins(title, origin=(0, 0)) -> np.ndarray:
+    """Whole pin list as records; blank lines are skipped"""
+    with open(title, 'rt') as fin:
+        rows = [parse_pin(line, origin) for line in fin if line.strip()]
+    return np.array(rows, dtype=PIN_DTYPE)
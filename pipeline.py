@@ -0,0 +1,81 @@
+"""
+Ordered background work for cad2svg.py: output is written while the next side is planned.
+
+A Worker runs the calls given to it one at a time, in the order given, on a
+thread of its own. Its queue is bounded, so a planner that gets ahead waits
+for the writer rather than holding every side in memory. An error raised on
+the thread comes back on the next submit, or at close; calls after it are
+dropped, as are those still queued at abandon. With threaded off the calls
+run at once, the same calls in the same order, so both modes write the
+same files.
+
+Each worker keeps the seconds its calls took, to compare the stages with the
+wall time: overlapped, the run takes about as long as its slowest stage.
+"""
+import queue
+import threading
+import time
+
+DEPTH = 2  # calls waiting per worker, about two sides
+_DONE = object()
+
+
+class Worker:
+    """
+    Calls fn(*args) in submit order, on one background thread
+    """
+
+    def __init__(self, name, depth=DEPTH, threaded=True):
+        self.name = name
+        self.busy = 0.0
+        self.error = None
+        self.dropped = False
+        self.threaded = threaded
+        if threaded:
+            self.calls = queue.Queue(maxsize=depth)
+            self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self.thread.start()
+
+    def _call(self, fn, args) -> None:
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        finally:
+            self.busy += time.perf_counter() - start
+
+    def _run(self) -> None:
+        while True:
+            item = self.calls.get()
+            if item is _DONE:
+                return
+            if self.error is None and not self.dropped:
+                try:
+                    self._call(*item)
+                except BaseException as err:
+                    self.error = err
+
+    def submit(self, fn, *args) -> None:
+        """Queue a call, waiting while the queue is full"""
+        if self.error is not None:
+            raise self.error
+        if self.dropped:
+            return
+        if self.threaded:
+            self.calls.put((fn, args))
+        else:
+            self._call(fn, args)
+
+    def abandon(self) -> None:
+        """Drop the calls still queued and stop, once the call running now is done"""
+        self.dropped = True
+        if self.threaded and self.thread.is_alive():
+            self.calls.put(_DONE)
+            self.thread.join()
+
+    def close(self) -> None:
+        """Wait for the calls queued so far, raising the error of any that failed"""
+        if self.threaded:
+            self.calls.put(_DONE)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
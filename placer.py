@@ -0,0 +1,202 @@
+"""
+Automatic label placement for the drawings of cad2svg.py and svg.py.
+
+Each label is a box: pin and wire numbers run along their wire, as textPath
+sets them, ref labels sit beside their cross. A label has a few candidate
+positions, tried in order of preference; it takes the first one whose box
+overlaps no pad and no label already placed. All labels try their next
+candidate together, in rounds, and overlaps are found through a spatial.PointGrid
+of box centres, so a round costs a sort rather than a comparison of every pair.
+Where two labels of the same round overlap the later one waits for its next
+candidate. A label with no free candidate keeps its first, and is counted.
+
+Sizes are in mm and y is up, as in the CAD file; text is assumed 0.6 of the
+font size wide per character and 0.7 of it high above the baseline.
+"""
+import numpy as np
+
+from spatial import PointGrid
+
+BOX_DTYPE = np.dtype([
+    ('x', '<f8'),   # centre
+    ('y', '<f8'),
+    ('ux', '<f8'),  # unit vector along the text
+    ('uy', '<f8'),
+    ('hw', '<f8'),  # half width, along the text
+    ('hh', '<f8'),  # half height, across it
+])
+CANDIDATES = 8
+GAP = 0.01  # clearance kept around every box
+CHAR_WIDTH = 0.6
+CAP_HEIGHT = 0.7
+
+
+def pad_boxes(x, y, size) -> np.ndarray:
+    """Square pads of one size as boxes"""
+    boxes = np.zeros(len(x), dtype=BOX_DTYPE)
+    boxes['x'] = x
+    boxes['y'] = y
+    boxes['ux'] = 1
+    boxes['hw'] = boxes['hh'] = size / 2
+    return boxes
+
+
+def cross_boxes(x, y, size, stroke=0.02) -> np.ndarray:
+    """Ref crosses, arms reaching size from the centre, as a thin box per arm"""
+    arms = np.zeros((len(x), 2), dtype=BOX_DTYPE)
+    arms['x'] = np.asarray(x, dtype=np.float64)[:, None]
+    arms['y'] = np.asarray(y, dtype=np.float64)[:, None]
+    arms['ux'] = [1, 0]
+    arms['uy'] = [0, 1]
+    arms['hw'] = size
+    arms['hh'] = stroke / 2
+    return arms.ravel()
+
+
+def overlap(a, b) -> np.ndarray:
+    """Whether boxes a and b overlap, element by element, by separating axes"""
+    ddx = b['x'] - a['x']
+    ddy = b['y'] - a['y']
+    hit = np.ones(len(a), dtype=bool)
+    for lx, ly in ((a['ux'], a['uy']), (-a['uy'], a['ux']), (b['ux'], b['uy']), (-b['uy'], b['ux'])):
+        reach = (a['hw'] * np.abs(a['ux'] * lx + a['uy'] * ly) + a['hh'] * np.abs(a['ux'] * ly - a['uy'] * lx)
+                 + b['hw'] * np.abs(b['ux'] * lx + b['uy'] * ly) + b['hh'] * np.abs(b['ux'] * ly - b['uy'] * lx))
+        hit &= np.abs(ddx * lx + ddy * ly) <= reach + GAP
+    return hit
+
+
+def _reach(*boxes) -> float:
+    """Largest centre distance at which boxes of these tables can still overlap"""
+    half = [np.hypot(box['hw'], box['hh']).max() for box in boxes if box.size]
+    return 2 * max(half, default=0) + GAP
+
+
+def place(candidates, obstacles=None) -> np.ndarray:
+    """
+    Candidate taken by each label, candidates an (n labels, k) BOX_DTYPE array in order of preference
+    -1 where no candidate was free of the obstacles and the labels placed before
+    """
+    count, k = candidates.shape
+    chosen = np.full(count, -1, dtype=np.int64)
+    placed = [obstacles if obstacles is not None else np.zeros(0, dtype=BOX_DTYPE)]
+    radius = _reach(candidates, placed[0])
+    for c in range(k):
+        todo = np.flatnonzero(chosen < 0)
+        if not len(todo):
+            break
+        boxes = candidates[todo, c]
+        free = np.ones(len(todo), dtype=bool)
+
+        fixed = np.concatenate(placed)
+        if len(fixed):
+            q, r = PointGrid(fixed['x'], fixed['y'], radius).pairs_within(boxes['x'], boxes['y'], radius)
+            free[q[overlap(boxes[q], fixed[r])]] = False
+
+        # within the round, the earlier label keeps its place
+        live = np.flatnonzero(free)
+        q, r = PointGrid(boxes['x'][live], boxes['y'][live], radius).pairs_within(
+            boxes['x'][live], boxes['y'][live], radius)
+        later = q < r
+        q, r = q[later], r[later]
+        free[live[r[overlap(boxes[live[q]], boxes[live[r]])]]] = False
+
+        chosen[todo[free]] = c
+        placed.append(boxes[free])
+    return chosen
+
+
+def along_wires(sx, sy, dx, dy, chars, size, prefer, clear=0.0, k=CANDIDATES):
+    """
+    Candidate boxes of labels along wires, text running from srce to dest as textPath sets it
+    chars is the label length in characters; prefer is 'srce' or 'dest', the end the label
+    is tried nearest first; clear is kept free at both wire ends for the pads
+    Returns the (n, k) boxes and the (n, k) offsets along the wire, for the text dx
+    """
+    sx, sy, dx, dy = (np.asarray(v, dtype=np.float64) for v in (sx, sy, dx, dy))
+    length = np.hypot(dx - sx, dy - sy)
+    ux = np.divide(dx - sx, length, out=np.ones_like(length), where=length > 0)
+    uy = np.divide(dy - sy, length, out=np.zeros_like(length), where=length > 0)
+    width = np.asarray(chars, dtype=np.float64) * CHAR_WIDTH * size
+
+    # evenly spaced starts between the cleared ends, nearest the preferred end first
+    room = np.maximum(length - width - 2 * clear, 0)
+    steps = np.linspace(0, 1, k) if prefer == 'srce' else np.linspace(1, 0, k)
+    offsets = clear + room[:, None] * steps[None, :]
+    along = offsets + width[:, None] / 2
+    across = CAP_HEIGHT * size / 2
+
+    boxes = np.zeros((len(length), k), dtype=BOX_DTYPE)
+    # text stands on the left of the wire, looking from srce to dest
+    boxes['x'] = sx[:, None] + ux[:, None] * along - uy[:, None] * across
+    boxes['y'] = sy[:, None] + uy[:, None] * along + ux[:, None] * across
+    boxes['ux'] = ux[:, None]
+    boxes['uy'] = uy[:, None]
+    boxes['hw'] = width[:, None] / 2
+    boxes['hh'] = across
+    return boxes, offsets
+
+
+def around_points(x, y, chars, size, clear=0.0, rings=3):
+    """
+    Candidate boxes of horizontal labels beside points: above right first, then round the point,
+    then round again one text height further out for each ring
+    Returns the (n, 8 rings) boxes and the (n, 8 rings, 2) text dx, dy in SVG units, y down
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    width = np.asarray(chars, dtype=np.float64) * CHAR_WIDTH * size
+    height = CAP_HEIGHT * size
+    # left edge and baseline of the text, as multiples of its width and height, beside the point
+    at = np.array([(0, 0), (-1, 0), (0, -1), (-1, -1), (-0.5, 0), (-0.5, -1), (0, -0.5), (-1, -0.5)] * rings)
+    away = clear + np.repeat(np.arange(rings), 8)[:, None] * height
+    side = np.sign(at + 0.5) * away
+    left = at[None, :, 0] * width[:, None] + side[None, :, 0]
+    base = np.broadcast_to(at[None, :, 1] * height + side[None, :, 1], left.shape)
+
+    boxes = np.zeros((len(x), len(at)), dtype=BOX_DTYPE)
+    boxes['x'] = x[:, None] + left + width[:, None] / 2
+    boxes['y'] = y[:, None] + base + height / 2
+    boxes['ux'] = 1
+    boxes['hw'] = width[:, None] / 2
+    boxes['hh'] = height / 2
+    return boxes, np.stack((left, -base), axis=-1)
+
+
+def pick(values, chosen) -> np.ndarray:
+    """Value of the candidate taken by each label, the first where none was free"""
+    return values[np.arange(len(chosen)), np.maximum(chosen, 0)]
+
+
+def label_wires(sx, sy, dx, dy, nums, pins=None, size=0.15, pads=(0.08, 0.15)):
+    """
+    Offsets along each wire of its wire number, tried nearest dest, and of its pin label, tried nearest srce
+    Pads of the given srce and dest sizes are kept clear. Returns the number offsets, the pin
+    offsets (None without pins), every box taken with the pads, for placing more labels around
+    them, and how many labels found no free place
+    """
+    obstacles = np.concatenate((pad_boxes(sx, sy, pads[0]), pad_boxes(dx, dy, pads[1])))
+    clear = max(pads) / 2
+    chars = [len(str(num)) for num in nums]
+    boxes, offsets = along_wires(sx, sy, dx, dy, chars, size, 'dest', clear)
+    if pins is not None:
+        pin_boxes, pin_offsets = along_wires(sx, sy, dx, dy, [len(str(pin)) for pin in pins], size, 'srce', clear)
+        boxes = np.concatenate((pin_boxes, boxes))
+        offsets = np.concatenate((pin_offsets, offsets))
+    chosen = place(boxes, obstacles)
+    taken = pick(boxes, chosen)
+    offsets = np.round(pick(offsets, chosen), 3)
+    if pins is not None:
+        pin_offsets, offsets = offsets[:len(pins)], offsets[len(pins):]
+    else:
+        pin_offsets = None
+    return offsets, pin_offsets, np.concatenate((obstacles, taken)), int((chosen < 0).sum())
+
+
+def label_points(x, y, texts, size, obstacles=None, clear=GAP):
+    """
+    Text dx, dy of a label beside each point, at least clear from it, clear of the obstacles and each other
+    Returns the (n, 2) offsets, in SVG units, and how many labels found no free place
+    """
+    boxes, offsets = around_points(x, y, [len(str(text)) for text in texts], size, clear)
+    chosen = place(boxes, obstacles)
+    return np.round(pick(offsets, chosen), 3), int((chosen < 0).sum())
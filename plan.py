@@ -0,0 +1,210 @@
+"""
+Binary plan file, the hand-off between planning (cad2svg.py) and the renderers.
+
+Unlike the .CAD text, a plan keeps the die pin numbers, the side and rank of
+every wire and the user settings the plan was made with.
+Tables are flat numpy records so a plan can be memory-mapped and used in place.
+
+File layout, little-endian:
+    magic       8 bytes, PLAN_MAGIC
+    version     uint32
+    head_len    uint32, length of the JSON header that follows
+    header      JSON: settings, side names, table offsets and counts
+    padding     up to the next ALIGN boundary
+    wires       WIRE_DTYPE records, one per wire, in bonding order
+    refs        REF_DTYPE records, one per reference system, in CAD order
+"""
+import json
+import struct
+
+import numpy as np
+
+from cadfile import load_cad
+
+PLAN_MAGIC = b'C4WPLAN\x00'
+PLAN_VERSION = 1
+ALIGN = 64
+
+SIDES = ['N', 'W', 'S', 'E']
+
+# kind of a reference system follows the CAD bondpnt field: 1 srce, 2 dest
+SRCE = 1
+DEST = 2
+
+WIRE_DTYPE = np.dtype([
+    ('pin', '<i4'),
+    ('wire', '<i4'),
+    ('side', '<i2'),
+    ('rank', '<i2'),
+    ('srce_ref', '<i2'),
+    ('dest_ref', '<i2'),
+    ('sx', '<f8'),
+    ('sy', '<f8'),
+    ('dx', '<f8'),
+    ('dy', '<f8'),
+], align=True)
+
+REF_DTYPE = np.dtype([
+    ('ref', '<i2'),
+    ('kind', '<i2'),
+    ('side', '<i2'),
+    ('x1', '<f8'),
+    ('y1', '<f8'),
+    ('x2', '<f8'),
+    ('y2', '<f8'),
+], align=True)
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+class Plan:
+    """
+    Wire and reference tables of a planned program, plus the settings used
+    """
+
+    def __init__(self, wires, refs, settings=None, sides=None, version=PLAN_VERSION):
+        self.wires = wires
+        self.refs = refs
+        self.settings = settings or {}
+        self.sides = sides or list(SIDES)
+        self.version = version
+
+    def __len__(self):
+        return len(self.wires)
+
+    def srce_refs(self):
+        return self.refs[self.refs['kind'] == SRCE]
+
+    def dest_refs(self):
+        return self.refs[self.refs['kind'] == DEST]
+
+
+def _records(rows, dtype) -> np.ndarray:
+    """Tuples to records, padding bytes zeroed so plan files are byte for byte repeatable"""
+    rows = [tuple(row) for row in rows]
+    table = np.zeros(len(rows), dtype=dtype)
+    table[:] = rows
+    return table
+
+
+def wire_table(rows) -> np.ndarray:
+    """(pin, wire, side, rank, srce_ref, dest_ref, sx, sy, dx, dy) tuples to records"""
+    return _records(rows, WIRE_DTYPE)
+
+
+def ref_table(rows) -> np.ndarray:
+    """(ref, kind, side, x1, y1, x2, y2) tuples to records"""
+    return _records(rows, REF_DTYPE)
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+class PlanWriter:
+    """
+    Plan file written as it goes: the header up front from the wire count,
+    then wire tables in blocks, then the refs on close
+    """
+
+    def __init__(self, path, wire_count, refs, settings=None, sides=None):
+        self.refs = np.ascontiguousarray(refs, dtype=REF_DTYPE)
+        self.count = wire_count
+        self.written = 0
+
+        # offsets depend on header length, which depends on offsets; repeat until settled
+        header = {'settings': settings or {}, 'sides': sides or list(SIDES),
+                  'wires': [0, wire_count], 'refs': [0, len(self.refs)]}
+        while True:
+            head = json.dumps(header).encode('utf-8')
+            wire_at = _aligned(_PREAMBLE.size + len(head))
+            ref_at = _aligned(wire_at + wire_count * WIRE_DTYPE.itemsize)
+            if header['wires'][0] == wire_at and header['refs'][0] == ref_at:
+                break
+            header['wires'][0] = wire_at
+            header['refs'][0] = ref_at
+        self.ref_at = ref_at
+
+        self.fout = open(path, 'wb')
+        self.fout.write(_PREAMBLE.pack(PLAN_MAGIC, PLAN_VERSION, len(head)))
+        self.fout.write(head)
+        self.fout.write(b'\x00' * (wire_at - self.fout.tell()))
+
+    def write(self, wires) -> None:
+        wires = np.ascontiguousarray(wires, dtype=WIRE_DTYPE)
+        wires.tofile(self.fout)  # straight from a memory map too, without a copy in memory
+        self.written += len(wires)
+
+    def close(self) -> None:
+        try:
+            if self.written != self.count:
+                raise ValueError(f'{self.written} wires written to a plan of {self.count}')
+            self.fout.write(b'\x00' * (self.ref_at - self.fout.tell()))
+            self.refs.tofile(self.fout)
+        finally:
+            self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fout.close()
+
+
+def save_plan(path, plan) -> None:
+    """Write plan tables after a JSON header, each table aligned for mapping"""
+    with PlanWriter(path, len(plan.wires), plan.refs, plan.settings, plan.sides) as out:
+        out.write(plan.wires)
+
+
+def load_plan(path, mmap=True) -> Plan:
+    """Read a plan file; tables are read-only memory maps unless mmap is False"""
+    with open(path, 'rb') as fin:
+        magic, version, head_len = _PREAMBLE.unpack(fin.read(_PREAMBLE.size))
+        if magic != PLAN_MAGIC:
+            raise ValueError(f'{path} is not a plan file')
+        if version > PLAN_VERSION:
+            raise ValueError(f'{path} is plan version {version}, newer than {PLAN_VERSION}')
+        header = json.loads(fin.read(head_len).decode('utf-8'))
+
+    tables = []
+    for key, dtype in (('wires', WIRE_DTYPE), ('refs', REF_DTYPE)):
+        offset, count = header[key]
+        if not count:
+            tables.append(np.zeros(0, dtype=dtype))
+        elif mmap:
+            tables.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,)))
+        else:
+            tables.append(np.fromfile(path, dtype=dtype, count=count, offset=offset))
+    return Plan(tables[0], tables[1], header['settings'], header['sides'], version)
+
+
+def cad_plan(cad) -> Plan:
+    """
+    Plan tables from a CAD file read by cadfile.read_cad
+    Pin numbers, sides and ranks are not in CAD files and are left at -1
+    """
+    n = min(len(cad['wire']), len(cad['dest_ref']))
+    wires = np.zeros(n, dtype=WIRE_DTYPE)
+    wires['pin'] = -1
+    wires['side'] = -1
+    wires['rank'] = -1
+    for key in ('wire', 'srce_ref', 'sx', 'sy', 'dest_ref', 'dx', 'dy'):
+        wires[key] = cad[key][:n]
+
+    points = {}
+    for ref, pt, x, y in cad['refs']:
+        points.setdefault(ref, [0.0, 0.0, 0.0, 0.0])[2 * pt - 2: 2 * pt] = [x, y]
+    dest = set(cad['dest_ref'])
+    rows = [(ref, DEST if ref in dest else SRCE, -1, *pts) for ref, pts in sorted(points.items())]
+    return Plan(wires, ref_table(rows))
+
+
+def read_program(title) -> Plan:
+    """A plan file, or a CAD file converted to plan tables"""
+    if title.endswith('.plan'):
+        return load_plan(title)
+    return cad_plan(load_cad(title))
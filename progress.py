@@ -0,0 +1,150 @@
+"""
+Progress reports and cooperative cancellation for long planning runs.
+
+A Progress counts the wires each stage of a run has done, out of the wires
+in the run times its stages, and passes the stage, wires done and seconds
+left to a callback, at most every interval seconds. Bar is a callback that
+draws a terminal progress bar on stderr.
+
+A CancelToken is set from anywhere, another thread, a callback, or Ctrl-C
+once on_interrupt is on. The run checks it as it reports progress, on the
+main thread only; once it is set the next check frees what was registered
+with on_cancel, e.g. stops background writers, removes the files still being
+written, then raises Cancelled, or exits with a message when exit is set.
+Files written in full are kept.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """
+    Set once to cancel a run
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.reason = ''
+
+    def cancel(self, reason='cancelled') -> None:
+        self.reason = self.reason or reason
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def on_interrupt(self) -> None:
+        """First Ctrl-C cancels at the next check, a second stops at once as usual"""
+        def interrupted(signum, frame):
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            self.cancel('interrupted')
+        signal.signal(signal.SIGINT, interrupted)
+
+
+class Progress:
+    """
+    Wires done per stage of one run
+    """
+
+    def __init__(self, stages, wires, callback=None, token=None, interval=0.2, exit=False):
+        self.stages = list(stages)
+        self.wires = wires
+        self.callback = callback
+        self.token = token or CancelToken()
+        self.interval = interval
+        self.exit = exit
+        self.done = dict.fromkeys(self.stages, 0)
+        self.started = time.perf_counter()
+        self.reported = 0.0
+        self.partial = []
+        self.cleanups = []
+        self.lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return self.wires * len(self.stages)
+
+    def fraction(self) -> float:
+        return sum(self.done.values()) / self.total if self.total else 1.0
+
+    def eta(self) -> float:
+        """Seconds left at the rate so far, None until something is done"""
+        fraction = self.fraction()
+        if not fraction:
+            return None
+        return (time.perf_counter() - self.started) * (1 - fraction) / fraction
+
+    def advance(self, stage, wires) -> None:
+        """wires more done by stage, reported if the interval is up; checks for cancel on the main thread"""
+        with self.lock:
+            self.done[stage] = min(self.done[stage] + wires, self.wires)
+            now = time.perf_counter()
+            due = wires > 0 and (now - self.reported >= self.interval or self.done[stage] == self.wires)
+            if due:
+                self.reported = now
+        if due and self.callback:
+            self.callback(stage, self.done[stage], self.wires, self.fraction(), self.eta())
+        self.check()
+
+    def finish(self, stage) -> None:
+        """The rest of stage done"""
+        self.advance(stage, self.wires - self.done[stage])
+
+    def output(self, path) -> str:
+        """A file being written, removed if the run is cancelled before written is called"""
+        with self.lock:
+            self.partial.append(path)
+        return path
+
+    def written(self, path) -> None:
+        with self.lock:
+            if path in self.partial:
+                self.partial.remove(path)
+
+    def on_cancel(self, cleanup) -> None:
+        """cleanup() is called on cancel, last registered first"""
+        self.cleanups.append(cleanup)
+
+    def check(self) -> None:
+        if not self.token.cancelled or threading.current_thread() is not threading.main_thread():
+            return
+        for cleanup in reversed(self.cleanups):
+            cleanup()
+        self.cleanups = []
+        removed = [path for path in self.partial if os.path.exists(path)]
+        for path in removed:
+            os.remove(path)
+        self.partial = []
+        message = f"{self.token.reason}, {len(removed)} partial files removed"
+        if self.exit:
+            sys.exit(message)
+        raise Cancelled(message)
+
+
+class Bar:
+    """
+    Callback drawing a progress bar on a terminal line
+    """
+
+    def __init__(self, width=30, stream=None):
+        self.width = width
+        self.stream = stream or sys.stderr
+        self.ended = False
+
+    def __call__(self, stage, done, wires, fraction, eta) -> None:
+        filled = int(round(fraction * self.width))
+        left = '' if eta is None else f', {eta:.0f} s left'
+        line = f"\r[{'#' * filled}{'.' * (self.width - filled)}] {fraction:4.0%} {stage} {done}/{wires} wires{left}"
+        self.stream.write(line.ljust(80))
+        if fraction >= 1 and not self.ended:
+            self.stream.write('\n')
+            self.ended = True
+        self.stream.flush()
@@ -0,0 +1,205 @@
+"""
+Bond lookups during machine setup: which wire is this die pin, what is bonded near this XY.
+
+A BondIndex over a .plan or legacy .CAD program holds three indexes:
+    pin and wire    hash indexes (dicts) of wire table rows by number
+    srce and dest   spatial.PointGrid of the pads, for nearest-k and rectangle queries
+Each query answers in well under a millisecond once the index is built.
+Indexes are cached per file, keyed by its size and modification time, so repeated
+queries in one session, or through load_index, read and index the file only once.
+Legacy .CAD programs have no pin numbers, so pin queries find nothing there.
+
+Usage:
+    python query.py name.plan pin 17
+    python query.py name.plan wire 42
+    python query.py name.plan near X Y [-k 5] [--end dest]
+    python query.py name.plan rect X0 Y0 X1 Y1 [--end dest]
+    python query.py name.plan                   queries typed one per line, blank line to end
+    python query.py name.plan --metrics-port 9400   the same, with metrics at localhost:9400/metrics
+"""
+import argparse
+import functools
+import os
+
+import numpy as np
+
+from metrics import Run
+from plan import read_program
+from spatial import PointGrid
+
+COLUMNS = ['wire', 'pin', 'side', 'rank', 'srce_ref', 'dest_ref', 'sx', 'sy', 'dx', 'dy']
+QUERIES = 'queries are: pin P, wire W, near X Y [K], rect X0 Y0 X1 Y1; P, W and K whole numbers'
+
+
+def _by_number(values) -> dict:
+    """Rows of each number, in table order"""
+    index = {}
+    for row, value in enumerate(values.tolist()):
+        index.setdefault(value, []).append(row)
+    return index
+
+
+def _cell(x, y) -> float:
+    """Grid cell of about one pad, from the extents and pad count"""
+    if len(x) < 2:
+        return 1.0
+    span = max(float(x.max() - x.min()), float(y.max() - y.min()))
+    return span / np.sqrt(len(x)) or 1.0
+
+
+class BondIndex:
+    """
+    Pin, wire and pad position indexes of one program
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.wires = np.asarray(plan.wires)
+        self.pins = _by_number(self.wires['pin'])
+        self.numbers = _by_number(self.wires['wire'])
+        self.grids = {}
+        for end in ('s', 'd'):
+            x = self.wires[end + 'x']
+            y = self.wires[end + 'y']
+            self.grids[end] = PointGrid(x, y, _cell(x, y))
+
+    def __len__(self):
+        return len(self.wires)
+
+    def pin(self, pin) -> np.ndarray:
+        """Rows of the wires of a die pin"""
+        return np.array(self.pins.get(int(pin), []), dtype=np.int64)
+
+    def wire(self, number) -> np.ndarray:
+        """Row of a wire number, empty if there is none"""
+        return np.array(self.numbers.get(int(number), []), dtype=np.int64)
+
+    def nearest(self, x, y, k=1, end='s'):
+        """Rows of the k wires with srce ('s') or dest ('d') pads nearest to x, y, and their distances"""
+        return self.grids[end].nearest_k(x, y, k)
+
+    def rect(self, x0, y0, x1, y1, end='s') -> np.ndarray:
+        """Rows of the wires with srce ('s') or dest ('d') pads inside a rectangle, corners in any order"""
+        return self.grids[end].within(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+    def records(self, rows, distances=None) -> list:
+        """Rows as dicts of the wire table columns, side by name, distance if given"""
+        names = self.plan.sides
+        found = []
+        for i, wire in enumerate(self.wires[rows].tolist()):
+            record = dict(zip(self.wires.dtype.names, wire))
+            side = record['side']
+            record['side'] = names[side] if 0 <= side < len(names) else '-'
+            if distances is not None:
+                record['distance'] = round(float(distances[i]), 4)
+            found.append(record)
+        return found
+
+
+@functools.lru_cache(maxsize=8)
+def _cached(path, size, mtime):
+    return BondIndex(read_program(path))
+
+
+def load_index(path) -> BondIndex:
+    """Index of a program, built once per version of the file"""
+    path = os.path.abspath(path)
+    info = os.stat(path)
+    return _cached(path, info.st_size, info.st_mtime_ns)
+
+
+def _args(words, types) -> list:
+    """Query arguments as the types given, int for pin, wire and k, float for coordinates"""
+    if len(words) != len(types):
+        raise ValueError(QUERIES)
+    try:
+        return [kind(word) for kind, word in zip(types, words)]
+    except ValueError:
+        raise ValueError(QUERIES) from None
+
+
+def run(index, words, k=1, end='s') -> list:
+    """Records answering one query, e.g. ['pin', '17'] or ['near', '1.5', '-2']"""
+    kind = words[0]
+    if kind == 'pin':
+        return index.records(index.pin(*_args(words[1:], [int])))
+    if kind == 'wire':
+        return index.records(index.wire(*_args(words[1:], [int])))
+    if kind == 'near':
+        x, y, *count = _args(words[1:], [float, float, int][:max(len(words) - 1, 2)])
+        rows, d = index.nearest(x, y, count[0] if count else k, end)
+        return index.records(rows, d)
+    if kind == 'rect':
+        return index.records(index.rect(*_args(words[1:], [float] * 4), end=end))
+    raise ValueError(QUERIES)
+
+
+def counted_index(metrics, path) -> BondIndex:
+    """load_index, its cache hits and misses counted in a metrics.Run"""
+    before = _cached.cache_info()
+    index = load_index(path)
+    after = _cached.cache_info()
+    metrics.cache('index', after.hits - before.hits, after.misses - before.misses)
+    return index
+
+
+def answer(metrics, path, words, k=1, end='s') -> list:
+    """run() on the current index of path, timed and counted in a metrics.Run"""
+    index = counted_index(metrics, path)
+    kind = words[0] if words[0] in ('pin', 'wire', 'near', 'rect') else 'other'
+    with metrics.stage(kind):
+        try:
+            records = run(index, words, k, end)
+        except ValueError:
+            metrics.error('query')
+            raise
+    return records
+
+
+def print_records(records) -> None:
+    """One aligned line per wire"""
+    if not records:
+        print('no wires found')
+        return
+    keys = COLUMNS + (['distance'] if 'distance' in records[0] else [])
+    print(' '.join(f'{key:>9}' for key in keys))
+    for record in records:
+        print(' '.join(f'{record[key]:>9.3f}' if isinstance(record[key], float) else f'{record[key]:>9}'
+                       for key in keys))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look up wires by pin, wire number or pad position')
+    parser.add_argument('program', help='.plan or .CAD file')
+    parser.add_argument('query', nargs='*', help='pin P | wire W | near X Y | rect X0 Y0 X1 Y1')
+    parser.add_argument('-k', type=int, default=1, help='wires found by near')
+    parser.add_argument('--end', choices=['srce', 'dest'], default='srce', help='pads searched by near and rect')
+    parser.add_argument('--metrics', metavar='FILE', help='write query metrics to FILE at the end')
+    parser.add_argument('--metrics-port', type=int, help='serve query metrics on this local port')
+    args = parser.parse_args()
+
+    metrics = Run('query')
+    if args.metrics_port:
+        metrics.registry.serve(args.metrics_port)
+    pads = args.end[0]
+    if args.query:
+        try:
+            print_records(answer(metrics, args.program, args.query, args.k, pads))
+        except ValueError as err:
+            parser.error(str(err))
+    else:
+        # the index is looked up again for each query, so a program written meanwhile is read again
+        print(len(counted_index(metrics, args.program)), 'wires indexed')
+        metrics.mark('index')
+        while True:
+            try:
+                line = input('> ').split()
+            except EOFError:
+                break
+            if not line:
+                break
+            try:
+                print_records(answer(metrics, args.program, line, args.k, pads))
+            except ValueError as err:
+                print(err)
+    metrics.finish(args.metrics)
@@ -0,0 +1,224 @@
+"""
+Raster preview of a program as PNG, for layouts too big to open as SVG in a browser.
+
+Draws what svg.py draws: the srce area, dest ref areas, wires coloured by srce ref
+system, chip and pcb pads and ref crosses, into a numpy image buffer.
+Lines are rasterised for all wires at once, so the cost follows the image size
+more than the wire count. The PNG is written with zlib from the standard library.
+
+Usage:
+    python raster.py name.plan [--width 2000] [--crop X0 Y0 X1 Y1] [-o name.png]
+A .CAD file can be given in place of the .plan. Crop window in mm.
+"""
+import argparse
+import struct
+import zlib
+
+import numpy as np
+
+from plan import DEST, read_program
+
+# as in svg.py
+WIRE_COLORS = ['red', 'purple', 'orange', 'brown', 'green', 'blue']
+RGB = {
+    'red': (255, 0, 0),
+    'purple': (128, 0, 128),
+    'orange': (255, 165, 0),
+    'brown': (165, 42, 42),
+    'green': (0, 128, 0),
+    'blue': (0, 0, 255),
+    'chip': (0xdd, 0xdd, 0xdd),
+    'pcb': (0xff, 0xdd, 0xaa),
+    'ref': (0x00, 0x88, 0x99),
+    'srce_area': (0xdd, 0xee, 0xff),
+    'dest_area': (0x00, 0x88, 0x66),
+}
+PALETTE = np.array([(255, 255, 255)] + list(RGB.values()), dtype=np.uint8)
+INK = {name: code for code, name in enumerate(RGB, start=1)}
+BORDER = 0.2
+
+
+class Canvas:
+    """
+    Image over a window of the layout in mm, y upwards as in the CAD file
+    Areas are painted in RGB, lines and pads as palette codes on an ink layer above,
+    which keeps the per-pixel writes to one byte
+    """
+
+    def __init__(self, window, width):
+        self.x0, self.y0, self.x1, self.y1 = window
+        self.scale = width / (self.x1 - self.x0)
+        height = max(int(np.ceil((self.y1 - self.y0) * self.scale)), 1)
+        self.img = np.full((height, int(width), 3), 255, dtype=np.uint8)
+        self.ink = np.zeros((height, int(width)), dtype=np.uint8)
+
+    def to_px(self, x, y):
+        """column and row of layout points, as floats"""
+        return (np.asarray(x) - self.x0) * self.scale, (self.y1 - np.asarray(y)) * self.scale
+
+    def image(self) -> np.ndarray:
+        """Ink layer over the painted areas"""
+        inked = self.ink > 0
+        img = self.img.copy()
+        img[inked] = PALETTE[self.ink[inked]]
+        return img
+
+    def lines(self, x0, y0, x1, y1, ink) -> None:
+        """
+        All segments at once, one sample per pixel step along the longer axis
+        Segments are sorted longest first, so step k only touches the leading
+        segments still that long, and each step is one vectorized write
+        """
+        h, w = self.ink.shape
+        c0, r0 = self.to_px(x0, y0)
+        c1, r1 = self.to_px(x1, y1)
+        c0, r0, c1, r1, keep = clip(c0, r0, c1, r1, w, h)
+        if not len(keep):
+            return
+        ink = np.broadcast_to(np.asarray(ink, dtype=np.uint8), (len(np.atleast_1d(x0)),))[keep]
+
+        steps = np.maximum(np.abs(c1 - c0), np.abs(r1 - r0)).astype(np.int64) + 1
+        order = np.argsort(-steps, kind='stable')
+        steps = steps[order]
+        ink = ink[order]
+        c0 = c0[order] + 0.5
+        r0 = r0[order] + 0.5
+        dc = (c1[order] + 0.5 - c0) / np.maximum(steps - 1, 1)
+        dr = (r1[order] + 0.5 - r0) / np.maximum(steps - 1, 1)
+        live = len(steps) - np.searchsorted(steps[::-1], np.arange(steps[0]), side='right')
+
+        flat = self.ink.ravel()
+        for k, n in enumerate(live.tolist()):
+            col = (c0[:n] + dc[:n] * k).astype(np.int64)
+            row = (r0[:n] + dr[:n] * k).astype(np.int64)
+            flat[row * w + col] = ink[:n]
+
+    def squares(self, x, y, size, ink) -> None:
+        """
+        Filled squares of size mm centred on each point, at least one pixel
+        Centres are marked, then grown to squares with running sums over the whole image
+        """
+        h, w = self.ink.shape
+        col, row = self.to_px(x, y)
+        col = np.rint(col).astype(np.int64)
+        row = np.rint(row).astype(np.int64)
+        inside = (col >= 0) & (col < w) & (row >= 0) & (row < h)
+        mark = np.zeros((h, w), dtype=bool)
+        mark[row[inside], col[inside]] = True
+
+        side = max(int(round(size * self.scale)), 1)
+        lo = (side - 1) // 2
+        hi = side - 1 - lo
+        for axis, n in ((0, h), (1, w)):
+            sums = np.cumsum(mark, axis=axis, dtype=np.int32)
+            sums = np.concatenate((np.zeros_like(sums.take([0], axis=axis)), sums), axis=axis)
+            top = np.minimum(np.arange(n) + hi + 1, n)
+            bot = np.maximum(np.arange(n) - lo, 0)
+            mark = (sums.take(top, axis=axis) - sums.take(bot, axis=axis)) > 0
+        self.ink[mark] = ink
+
+    def crosses(self, x, y, size, ink) -> None:
+        """Crosses with arms of size mm"""
+        x = np.asarray(x)
+        y = np.asarray(y)
+        self.lines(np.r_[x - size, x], np.r_[y, y - size], np.r_[x + size, x], np.r_[y, y + size], ink)
+
+    def rect(self, x0, y0, x1, y1, rgb, alpha=1.0) -> None:
+        """Filled rectangle, blended over the image"""
+        h, w, _ = self.img.shape
+        c0, r0 = self.to_px(min(x0, x1), max(y0, y1))
+        c1, r1 = self.to_px(max(x0, x1), min(y0, y1))
+        c0, c1 = (int(np.clip(np.floor(v), 0, w)) for v in (c0, c1 + 1))
+        r0, r1 = (int(np.clip(np.floor(v), 0, h)) for v in (r0, r1 + 1))
+        if c0 < c1 and r0 < r1:
+            area = self.img[r0:r1, c0:c1]
+            area[:] = (area * (1 - alpha) + np.asarray(rgb) * alpha).astype(np.uint8)
+
+
+def clip(c0, r0, c1, r1, w, h):
+    """Liang-Barsky clipping of segments to the image, returns the kept segments and their rows"""
+    c0, r0, c1, r1 = (np.asarray(v, dtype=np.float64) for v in (c0, r0, c1, r1))
+    dc = c1 - c0
+    dr = r1 - r0
+    t0 = np.zeros(len(c0))
+    t1 = np.ones(len(c0))
+    keep = np.ones(len(c0), dtype=bool)
+    for p, q in ((-dc, c0), (dc, w - 1 - c0), (-dr, r0), (dr, h - 1 - r0)):
+        parallel = p == 0
+        keep &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(parallel, 0, q / np.where(parallel, 1, p))
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, t), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, t), t1)
+    keep &= t0 <= t1
+    rows = np.flatnonzero(keep)
+    t0 = t0[rows]
+    t1 = t1[rows]
+    return (c0[rows] + dc[rows] * t0, r0[rows] + dr[rows] * t0,
+            c0[rows] + dc[rows] * t1, r0[rows] + dr[rows] * t1, rows)
+
+
+def layout_window(wires, border=BORDER):
+    """Extents of all pads plus a border, in mm"""
+    xs = np.concatenate((wires['sx'], wires['dx']))
+    ys = np.concatenate((wires['sy'], wires['dy']))
+    return (float(xs.min()) - border, float(ys.min()) - border,
+            float(xs.max()) + border, float(ys.max()) + border)
+
+
+def render(plan, width=2000, window=None) -> np.ndarray:
+    """Preview image of a plan"""
+    wires = plan.wires
+    refs = plan.refs
+    canvas = Canvas(window or layout_window(wires), width)
+
+    if len(wires):
+        pitch = 0.1
+        canvas.rect(wires['sx'].min() - pitch, wires['sy'].min() - pitch,
+                    wires['sx'].max() + pitch, wires['sy'].max() + pitch, RGB['srce_area'])
+    for ref in refs[refs['kind'] == DEST]:
+        canvas.rect(ref['x1'], ref['y1'], ref['x2'], ref['y2'], RGB['dest_area'], alpha=0.4)
+
+    # one colour per srce ref system, cycling as the SVG groups do
+    srce_refs = np.unique(wires['srce_ref'])
+    group = np.searchsorted(srce_refs, wires['srce_ref'])
+    colors = np.array([INK[col] for col in WIRE_COLORS], dtype=np.uint8)
+    canvas.lines(wires['sx'], wires['sy'], wires['dx'], wires['dy'], colors[group % len(colors)])
+
+    canvas.squares(wires['sx'], wires['sy'], 0.08, INK['chip'])
+    canvas.squares(wires['dx'], wires['dy'], 0.15, INK['pcb'])
+    canvas.crosses(np.r_[refs['x1'], refs['x2']], np.r_[refs['y1'], refs['y2']], 0.2, INK['ref'])
+    return canvas.image()
+
+
+def write_png(path, img) -> None:
+    """8 bit RGB PNG, standard library only"""
+    height, width, _ = img.shape
+    raw = np.hstack((np.zeros((height, 1), dtype=np.uint8), img.reshape(height, width * 3)))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    with open(path, 'wb') as fout:
+        fout.write(b'\x89PNG\r\n\x1a\n')
+        fout.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        fout.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        fout.write(chunk(b'IEND', b''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PNG preview of a program')
+    parser.add_argument('program', help='.plan or .CAD file')
+    parser.add_argument('--width', type=int, default=2000, help='image width in pixels')
+    parser.add_argument('--crop', type=float, nargs=4, metavar=('X0', 'Y0', 'X1', 'Y1'),
+                        help='window in mm, defaults to the whole layout')
+    parser.add_argument('-o', '--out', help='png file name')
+    args = parser.parse_args()
+
+    out = args.out or args.program.rsplit('.', 1)[0] + '.png'
+    window = None
+    if args.crop:
+        x0, y0, x1, y1 = args.crop
+        window = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    write_png(out, render(read_program(args.program), args.width, window))
+    print(out, 'file created')
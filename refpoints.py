@@ -0,0 +1,91 @@
+"""
+Ref point selection: the two pads of a ref system furthest apart.
+
+The wider the baseline between the two ref points, the smaller the angle error
+the bonder makes when it finds them, so each ref system takes the farthest pair
+of its candidate pads. The farthest pair lies on the convex hull (monotone chain,
+O(n log n)) and is found by rotating calipers round it in O(h). Pads may carry a
+group, e.g. their side, to prefer pairs with one pad in each of two groups; the
+farthest such pair lies on the hulls of the two groups.
+Pairs are returned in the order the pads are given, so ref point 1 is bonded first.
+"""
+import numpy as np
+
+
+def _cross(ox, oy, ax, ay, bx, by):
+    """Z of (a - o) x (b - o), positive for a left turn"""
+    return (ax - ox) * (by - oy) - (ay - oy) * (bx - ox)
+
+
+def hull(x, y) -> np.ndarray:
+    """Rows of the convex hull vertices, counter-clockwise, collinear points left out"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    order = np.lexsort((y, x))
+    # one row per distinct point, the first given
+    keep = np.r_[True, (np.diff(x[order]) != 0) | (np.diff(y[order]) != 0)]
+    order = order[keep]
+    if len(order) < 3:
+        return order
+    px = x[order].tolist()
+    py = y[order].tolist()
+
+    def chain(rows):
+        out = []
+        for r in rows:
+            while len(out) > 1 and _cross(px[out[-2]], py[out[-2]], px[out[-1]], py[out[-1]], px[r], py[r]) <= 0:
+                out.pop()
+            out.append(r)
+        return out
+
+    lower = chain(range(len(order)))
+    upper = chain(range(len(order) - 1, -1, -1))
+    return order[np.array(lower[:-1] + upper[:-1], dtype=np.int64)]
+
+
+def _calipers(x, y, rows):
+    """Farthest pair of the hull rows, by rotating calipers"""
+    h = len(rows)
+    if h < 3:
+        return rows[0], rows[-1]
+    hx = x[rows].tolist()
+    hy = y[rows].tolist()
+    best = (-1.0, rows[0], rows[0])
+    j = 1
+    for i in range(h):
+        n = (i + 1) % h
+        # move the far caliper on while it gets further from edge i, n
+        while abs(_cross(hx[i], hy[i], hx[n], hy[n], hx[(j + 1) % h], hy[(j + 1) % h])) > \
+                abs(_cross(hx[i], hy[i], hx[n], hy[n], hx[j], hy[j])):
+            j = (j + 1) % h
+        for k in (i, n):
+            d = (hx[k] - hx[j]) ** 2 + (hy[k] - hy[j]) ** 2
+            if d > best[0]:
+                best = (d, rows[k], rows[j])
+    return best[1], best[2]
+
+
+def farthest_pair(x, y, group=None):
+    """
+    Rows of the two points furthest apart, the lower row first
+    With group given, and points in more than one group, the pair has a point in each of two groups
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not len(x):
+        raise ValueError('no pads to choose ref points from')
+    names = np.unique(group) if group is not None else []
+    if len(names) < 2:
+        i, j = _calipers(x, y, hull(x, y))
+    else:
+        group = np.asarray(group)
+        hulls = [np.flatnonzero(group == name)[hull(x[group == name], y[group == name])] for name in names]
+        best = -1.0
+        for a in range(len(hulls)):
+            for b in range(a + 1, len(hulls)):
+                d = np.hypot(x[hulls[a]][:, None] - x[hulls[b]][None, :], y[hulls[a]][:, None] - y[hulls[b]][None, :])
+                k = int(np.argmax(d))
+                if d.flat[k] > best:
+                    best = d.flat[k]
+                    i, j = hulls[a][k // d.shape[1]], hulls[b][k % d.shape[1]]
+    return (int(i), int(j)) if i <= j else (int(j), int(i))
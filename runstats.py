@@ -0,0 +1,102 @@
+"""
+Running statistics of a pin list or program, gathered while it is read.
+
+Min, max and sum of srce x, y and dest x, y are updated a wire at a time, or a
+block at a time for arrays, so extents, centres and centroids are known once
+the file is read, without sorting or going over the columns again.
+Each side classified afterwards gets its own statistics.
+Pure Python, arrays only need .min(), .max() and .sum(), so svg.py keeps
+working without numpy.
+"""
+INF = float('inf')
+COLUMNS = ('sx', 'sy', 'dx', 'dy')
+
+
+def _rnd(num):
+    return round(num, 3)
+
+
+class RunningStats:
+    """
+    Min, max and sum per column, srce pads in sx, sy and dest pads in dx, dy
+    """
+
+    def __init__(self):
+        self.count = {'s': 0, 'd': 0}
+        self.low = dict.fromkeys(COLUMNS, INF)
+        self.high = dict.fromkeys(COLUMNS, -INF)
+        self.total = dict.fromkeys(COLUMNS, 0.0)
+        self.sides = {}
+
+    def __len__(self):
+        return max(self.count.values())
+
+    def add_point(self, end, x, y) -> None:
+        """One srce ('s') or dest ('d') pad"""
+        kx = end + 'x'
+        ky = end + 'y'
+        self.count[end] += 1
+        self.total[kx] += x
+        self.total[ky] += y
+        if x < self.low[kx]:
+            self.low[kx] = x
+        if x > self.high[kx]:
+            self.high[kx] = x
+        if y < self.low[ky]:
+            self.low[ky] = y
+        if y > self.high[ky]:
+            self.high[ky] = y
+
+    def add(self, sx, sy, dx, dy) -> None:
+        """One wire"""
+        self.add_point('s', sx, sy)
+        self.add_point('d', dx, dy)
+
+    def add_block(self, wires) -> None:
+        """A block of wires, as arrays in fields sx, sy, dx, dy"""
+        if not len(wires):
+            return
+        self.count['s'] += len(wires)
+        self.count['d'] += len(wires)
+        for col in COLUMNS:
+            values = wires[col]
+            self.low[col] = min(self.low[col], float(values.min()))
+            self.high[col] = max(self.high[col], float(values.max()))
+            self.total[col] += float(values.sum())
+
+    def side(self, name) -> 'RunningStats':
+        """Statistics of one side, made on first use"""
+        if name not in self.sides:
+            self.sides[name] = RunningStats()
+        return self.sides[name]
+
+    def mean(self, col) -> float:
+        count = self.count[col[0]]
+        return self.total[col] / count if count else 0.0
+
+    def mid(self, col) -> float:
+        """Mid point of the extent of a column, rounded as the CAD file keeps it"""
+        return _rnd((self.low[col] + self.high[col]) / 2)
+
+    def extents(self, end='s') -> tuple:
+        """x min, y min, x max, y max of the srce ('s') or dest ('d') pads"""
+        return self.low[end + 'x'], self.low[end + 'y'], self.high[end + 'x'], self.high[end + 'y']
+
+    def centre(self, end='s') -> tuple:
+        """Mid point of the extents, as emit.srce_centre for the srce pads"""
+        return self.mid(end + 'x'), self.mid(end + 'y')
+
+    def centroid(self, end='s') -> tuple:
+        """Mean pad position"""
+        return self.mean(end + 'x'), self.mean(end + 'y')
+
+    def report(self) -> dict:
+        """Plain dict for JSON, with the sides"""
+        report = {'wires': len(self)}
+        for end, name in (('s', 'srce'), ('d', 'dest')):
+            if self.count[end]:
+                report[name] = {'extents': list(self.extents(end)), 'centre': list(self.centre(end)),
+                                'centroid': [_rnd(v) for v in self.centroid(end)]}
+        if self.sides:
+            report['sides'] = {name: side.report() for name, side in self.sides.items()}
+        return report
@@ -0,0 +1,153 @@
+"""
+Sector classification: which side of the die each wire leaves from, by wire angle.
+
+A layout is a list of sectors, each [name, start] or [name, start, axis], start in
+degrees; a sector runs counter-clockwise from its start to the next start.
+The default is four sides split at 45 degrees:
+          \\nw____ /ne
+      +    |     |
+     pi ---|     |--- 0
+      -    |_____|
+          /sw     \\se
+Other layouts, e.g. eight sectors for an octagonal tile or two for a die bonded on
+two edges, are lists of more or fewer sectors. All wires are binned at once with
+np.digitize, whatever the number of sectors.
+
+The axis is the coordinate shared by a row of pads on that side, 'x' for W and E,
+'y' for N and S; it is taken from the middle angle of the sector unless given.
+"""
+import numpy as np
+
+FOUR_SIDES = [['N', 45], ['W', 135], ['S', -135], ['E', -45]]
+CHUNK = 4_000_000  # candidate by wire cells scored at once by tune_qpi
+
+
+def four_sides(qpi=45) -> list:
+    """N, W, S, E split at qpi degrees either side of the x axis"""
+    return [['N', qpi], ['W', 180 - qpi], ['S', qpi - 180], ['E', -qpi]]
+
+
+def wire_angles(sx, sy, dx, dy):
+    """Angle of each wire from srce to dest, in radians"""
+    return np.arctan2(np.asarray(dy) - np.asarray(sy), np.asarray(dx) - np.asarray(sx))
+
+
+def sector_starts(layout):
+    """Start angles in radians in [-pi, pi), ascending, and the sector of each"""
+    starts = np.radians([float(sector[1]) for sector in layout])
+    starts = (starts + np.pi) % (2 * np.pi) - np.pi
+    order = np.argsort(starts, kind='stable')
+    return starts[order], order
+
+
+def classify(angles, layout):
+    """Sector index of each angle; angles before the first start wrap to the last sector"""
+    starts, order = sector_starts(layout)
+    bins = np.digitize(np.asarray(angles), starts)
+    return order[(bins - 1) % len(order)]
+
+
+def axes(layout) -> list:
+    """Rank axis of each sector, 'x' where its wires run mostly along x"""
+    starts, order = sector_starts(layout)
+    ends = np.roll(starts, -1)
+    ends[-1] += 2 * np.pi
+    mids = np.empty(len(layout))
+    mids[order] = (starts + ends) / 2
+    derived = np.where(np.abs(np.cos(mids)) > np.abs(np.sin(mids)), 'x', 'y')
+    return [sector[2] if len(sector) > 2 else str(axis) for sector, axis in zip(layout, derived)]
+
+
+def split_sectors(wires, sector, count) -> list:
+    """Wires grouped per sector, input order kept within each"""
+    sector = np.asarray(sector)
+    order = np.argsort(sector, kind='stable')
+    bounds = np.searchsorted(sector[order], np.arange(count + 1)).tolist()
+    order = order.tolist()
+    return [[wires[i] for i in order[lo:hi]] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def sort_by_sector(wires, layout, first=1) -> list:
+    """
+    Split wires, tuples with sx, sy, dx, dy from column first on, into the sectors of a layout
+    """
+    sector = classify(wire_angles(*_columns(wires, first)), layout)
+    return split_sectors(wires, sector, len(layout))
+
+
+def _columns(wires, first):
+    """sx, sy, dx, dy arrays of wire tuples"""
+    return np.asarray([wire[first:first + 4] for wire in wires], dtype=np.float64).reshape(-1, 4).T
+
+
+def _row_ids(values, tol):
+    """Same id for values within tol, as pads of one row"""
+    return np.unique(np.round(np.asarray(values, dtype=np.float64) / tol), return_inverse=True)[1].ravel()
+
+
+def tune_qpi(sx, sy, dx, dy, candidates=None, tol=0.001, default=45):
+    """
+    Split angle of the four sides that keeps srce rows together, in degrees.
+    Every candidate is scored at once over all wires, the cost being
+        wires alone in their srce row on their side, e.g. a corner wire on the wrong side
+        wires on a side other than the one holding the rest of their row
+    Candidates should be in order; default is kept if inside a run of best candidates,
+    else the middle of the nearest run is taken. Returns the best angle and all costs.
+    """
+    if candidates is None:
+        candidates = np.arange(20, 70.25, 0.25)
+    candidates = np.asarray(candidates, dtype=np.float64)
+    angles = np.degrees(wire_angles(sx, sy, dx, dy))
+    costs = np.zeros(len(candidates), dtype=np.int64)
+    if not len(angles):
+        return default, costs
+    xrow = _row_ids(sx, tol)
+    yrow = _row_ids(sy, tol)
+    rows = int(max(xrow.max(), yrow.max())) + 1
+
+    # candidates in chunks of about CHUNK cells of candidate by wire
+    step = max(1, CHUNK // len(angles))
+    for lo in range(0, len(candidates), step):
+        qpi = candidates[lo:lo + step, None]
+        chunk = len(qpi)
+        a = angles[None, :]
+        # as four_sides: 0 N, 1 W, 2 S, 3 E
+        side = np.where((a >= qpi) & (a < 180 - qpi), 0,
+                        np.where((a >= qpi - 180) & (a < -qpi), 2,
+                                 np.where((a >= -qpi) & (a < qpi), 3, 1)))
+        along_x = side % 2 == 1
+        offset = np.arange(chunk)[:, None] * rows
+
+        rank = np.where(along_x, xrow, yrow) + (offset * 4 + side * rows)
+        size = np.bincount(rank.ravel(), minlength=chunk * rows * 4)[rank]
+        alone = (size == 1).sum(axis=1)
+
+        xkey = xrow + offset
+        ykey = yrow + offset
+        x_ranked = np.bincount(xkey[along_x], minlength=chunk * rows) > 0
+        y_ranked = np.bincount(ykey[~along_x], minlength=chunk * rows) > 0
+        split = (along_x & y_ranked[ykey]).sum(axis=1) + (~along_x & x_ranked[xkey]).sum(axis=1)
+        costs[lo:lo + step] = alone + split
+
+    # runs of best candidates; the run nearest default, at its middle, away from the wires at its ends
+    best = np.flatnonzero(costs == costs.min())
+    runs = np.split(best, np.flatnonzero(np.diff(best) > 1) + 1)
+    lo = np.array([candidates[run].min() for run in runs])
+    hi = np.array([candidates[run].max() for run in runs])
+    near = int(np.argmin(np.maximum(lo - default, 0) + np.maximum(default - hi, 0)))
+    if lo[near] < default < hi[near]:
+        return float(default), costs
+    run = runs[near]
+    return float(candidates[run[len(run) // 2]]), costs
+
+
+def tunable(layout) -> bool:
+    """Whether a layout is the four default sides, the only layout tuning replaces"""
+    return [list(sector) for sector in layout] == FOUR_SIDES
+
+
+def tuned_sides(wires, first=1, tol=0.001) -> tuple:
+    """Four sides split at the tuned angle, the angle and its cost, for wire tuples as sort_by_sector"""
+    qpi, costs = tune_qpi(*_columns(wires, first), tol=tol)
+    cost = int(costs.min()) if len(costs) else 0
+    return four_sides(qpi), qpi, cost
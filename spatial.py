@@ -0,0 +1,174 @@
+"""
+Grid index of pad positions for nearest neighbour lookups.
+
+Points are bucketed in square cells and sorted by cell, so a query only
+looks at its own cell and the eight around it. All queries are vectorized
+over arrays of query points: the nearest point, or every point within a radius;
+single points can also ask for their k nearest, or every point in a rectangle.
+"""
+import numpy as np
+
+_SPAN = 1 << 31
+
+
+def _keys(cx, cy):
+    """One integer key per cell"""
+    return (cx + _SPAN // 2) * _SPAN + (cy + _SPAN // 2)
+
+
+class PointGrid:
+    """
+    Pads bucketed by cell, cell size should be about the search radius
+    """
+
+    def __init__(self, x, y, cell):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.cell = cell
+        keys = _keys(np.floor(self.x / cell).astype(np.int64), np.floor(self.y / cell).astype(np.int64))
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.x)
+
+    def nearest(self, qx, qy, radius=None):
+        """
+        Row of the nearest point for each query point and its distance
+        Rows are -1 where nothing lies within radius, which defaults to one cell
+        """
+        radius = self.cell if radius is None else radius
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        best = np.full(len(qx), -1, dtype=np.int64)
+        best_d = np.full(len(qx), np.inf)
+        if not len(self.x):
+            return best, best_d
+        reach = int(np.ceil(radius / self.cell))
+        cx = np.floor(qx / self.cell).astype(np.int64)
+        cy = np.floor(qy / self.cell).astype(np.int64)
+
+        for ox in range(-reach, reach + 1):
+            for oy in range(-reach, reach + 1):
+                key = _keys(cx + ox, cy + oy)
+                lo = np.searchsorted(self.keys, key, side='left')
+                hi = np.searchsorted(self.keys, key, side='right')
+                for k in range(int((hi - lo).max(initial=0))):
+                    live = np.flatnonzero(lo + k < hi)
+                    rows = self.order[lo[live] + k]
+                    d = np.hypot(self.x[rows] - qx[live], self.y[rows] - qy[live])
+                    closer = d < best_d[live]
+                    best[live[closer]] = rows[closer]
+                    best_d[live[closer]] = d[closer]
+
+        best[best_d > radius] = -1
+        return best, best_d
+
+    def pairs_within(self, qx, qy, radius):
+        """
+        Every query point and point no further apart than radius, as two arrays:
+        the query index and the row of the point, one entry per pair
+        """
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        reach = int(np.ceil(radius / self.cell))
+        cx = np.floor(qx / self.cell).astype(np.int64)
+        cy = np.floor(qy / self.cell).astype(np.int64)
+        queries = []
+        rows = []
+        for ox in range(-reach, reach + 1):
+            for oy in range(-reach, reach + 1):
+                key = _keys(cx + ox, cy + oy)
+                lo = np.searchsorted(self.keys, key, side='left')
+                n = np.searchsorted(self.keys, key, side='right') - lo
+                # every point of each query's cell, flattened
+                query = np.repeat(np.arange(len(qx)), n)
+                row = self.order[np.arange(int(n.sum())) + np.repeat(lo - np.cumsum(n) + n, n)]
+                near = np.hypot(self.x[row] - qx[query], self.y[row] - qy[query]) <= radius
+                queries.append(query[near])
+                rows.append(row[near])
+        if not queries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(queries), np.concatenate(rows)
+
+    def nearest_k(self, x, y, k):
+        """
+        Rows of the k points nearest to one point, nearest first, and their distances
+        The square searched doubles until k points lie within its inscribed circle
+        """
+        k = min(k, len(self.x))
+        if not k:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        # no point is nearer than the bounding box, nor further than its far corner
+        x0, y0, x1, y1 = self.x.min(), self.y.min(), self.x.max(), self.y.max()
+        reach = max(self.cell, np.hypot(max(x0 - x, 0, x - x1), max(y0 - y, 0, y - y1)))
+        while True:
+            rows = self.within(x - reach, y - reach, x + reach, y + reach)
+            d = np.hypot(self.x[rows] - x, self.y[rows] - y)
+            if np.count_nonzero(d <= reach) >= k:
+                break
+            reach *= 2
+        order = np.lexsort((rows, d))[:k]
+        return rows[order], d[order]
+
+    def within(self, x0, y0, x1, y1):
+        """Rows of the points inside a rectangle, edges included, in row order"""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        cx = np.arange(int(np.floor(x0 / self.cell)), int(np.floor(x1 / self.cell)) + 1, dtype=np.int64)
+        if len(cx) > len(self.x):
+            # wider than it is worth walking column by column
+            rows = np.arange(len(self.x))
+        else:
+            # cells of one column are consecutive keys, y from bottom to top
+            lo = np.searchsorted(self.keys, _keys(cx, np.int64(np.floor(y0 / self.cell))), side='left')
+            hi = np.searchsorted(self.keys, _keys(cx, np.int64(np.floor(y1 / self.cell))), side='right')
+            n = hi - lo
+            rows = self.order[np.arange(int(n.sum())) + np.repeat(lo - np.cumsum(n) + n, n)]
+        inside = (self.x[rows] >= x0) & (self.x[rows] <= x1) & (self.y[rows] >= y0) & (self.y[rows] <= y1)
+        return np.sort(rows[inside])
+
+
+def clusters(x, y, gap):
+    """
+    Label of the connected group of each point, points joined through cells of gap / 2:
+    points closer than gap / 2 always share a label, groups further apart than 1.5 gap never do.
+    Labels are 0, 1, ... in order of the first point of each group
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not len(x):
+        return np.zeros(0, dtype=np.int64)
+    cell = gap / 2
+    keys = _keys(np.floor(x / cell).astype(np.int64), np.floor(y / cell).astype(np.int64))
+    cells, point_cell = np.unique(keys, return_inverse=True)
+    point_cell = point_cell.ravel()
+
+    # edges between occupied cells and their occupied neighbours
+    src = []
+    dst = []
+    for ox, oy in ((1, -1), (1, 0), (1, 1), (0, 1)):
+        near = np.searchsorted(cells, cells + ox * _SPAN + oy)
+        near = np.minimum(near, len(cells) - 1)
+        hit = np.flatnonzero(cells[near] == cells + ox * _SPAN + oy)
+        src.append(hit)
+        dst.append(near[hit])
+    src = np.concatenate(src)
+    dst = np.concatenate(dst)
+
+    # lowest cell index wins along every edge, with pointer jumping, until settled
+    label = np.arange(len(cells))
+    while True:
+        low = np.minimum(label[src], label[dst])
+        new = label.copy()
+        np.minimum.at(new, src, low)
+        np.minimum.at(new, dst, low)
+        new = new[new]
+        if np.array_equal(new, label):
+            break
+        label = new
+
+    _, first, group = np.unique(label[point_cell], return_index=True, return_inverse=True)
+    rename = np.empty(len(first), dtype=np.int64)
+    rename[np.argsort(first)] = np.arange(len(first))
+    return rename[group.ravel()]
@@ -19,10 +19,14 @@ Limitations!
 Assumes 2 substrate ref systems.
 N.B. Area image buggy with rotated substrates!
 """
-import re
+import io
 import math
 import sys
 
+from cadfile import read_cad
+from metrics import Run
+from runstats import RunningStats
+
 
 def dbg(thing, num):
     fout = open('dbg'+str(num)+'.py', 'wt')
@@ -36,14 +40,7 @@ def rnd(flot):
 
 def min_max(num_list):
     "ok"
-    result = sorted(num_list)
-    return result[0], result[-1]
-
-
-def mid_value(num_list):
-    order = sorted(num_list)
-    mid = rnd((order[0] + order[-1]) / 2)
-    return mid
+    return min(num_list), max(num_list)
 
 
 def square(name, size):
@@ -81,6 +78,16 @@ def to_grp(group, opener):
     group.append('</g>')
 
 
+def svg_open(scale, x_size, y_size, x_abs, y_abs):
+    "opening svg tag, sized by scale"
+    return f'''    <svg xmlns="http://www.w3.org/2000/svg" version="1.1" 
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    width="{ rnd(x_size * scale) }"
+    height="{ rnd(y_size * scale) }"
+    viewBox="{ rnd(x_abs) } { rnd(y_abs) } { rnd(x_size) } { rnd(y_size) }">
+'''
+
+
 def html_head(scale, x_size, y_size, x_abs, y_abs):
     "header for html file"
     return f'''<!DOCTYPE html>
@@ -97,12 +104,7 @@ def html_head(scale, x_size, y_size, x_abs, y_abs):
 </head>
 <body>
 <div class="svgcont">
-    <svg xmlns="http://www.w3.org/2000/svg" version="1.1" 
-    xmlns:xlink="http://www.w3.org/1999/xlink"
-    width="{ rnd(x_size * scale) }"
-    height="{ rnd(y_size * scale) }"
-    viewBox="{ rnd(x_abs) } { rnd(y_abs) } { rnd(x_size) } { rnd(y_size) }">
-'''
+{ svg_open(scale, x_size, y_size, x_abs, y_abs) }'''
 
 # If using this file on its own, comment these 2 lines
 # title = sys.argv[1]
@@ -115,73 +117,100 @@ def html_head(scale, x_size, y_size, x_abs, y_abs):
 path = ''
 name = 'C100mm'
 title = path + name + '.CAD'
+# title = path + name + '.plan' # binary plan from cad2svg.py, keeps die pin numbers
 out_file = name
 
+# compact: wires as short relative paths at PRECISION decimals, pads as one path per group
+# svgz: main drawing written gzipped as out_file.svgz in place of the html
+# place_labels: wire and pin numbers slid along their wires clear of pads and each other,
+# else, or without numpy, wire numbers sit 0.5 back from the dest end and pins at the srce end
+# metrics: run metrics written to out_file_svg_metrics.prom, see metrics.py
+PRECISION = 3
+COMPACT = False
+SVGZ = False
+PLACE_LABELS = True
+METRICS = True
+if COMPACT or SVGZ:
+    # numpy only needed for compact output
+    from svgpack import wire_path, squares_path, save_text
+if PLACE_LABELS:
+    # placing labels needs numpy; without it labels keep the fixed offsets
+    try:
+        from placer import label_wires
+    except ImportError:
+        PLACE_LABELS = False
+        print('numpy not found, labels at fixed offsets')
+
 MAG = input("Change magnification or Enter (60): ")
 if not MAG:
     MAG = 60
 else:
     MAG = int(MAG)
 print("MAG", MAG)
-fin = open(title, 'rt')
-lines = fin.readlines()
-fin.close()
-
-print(len(lines), 'lines read')
-
-refpnt = re.compile('refpnt ')
-bondpnt = re.compile('bondpnt ')
 
+run = Run('svg')
 refPts = []
 crosses = []
 wNums = []
+pinNums = []
 srceR = []
 srceX = []
 srceY = []
 destR = []
 destX = []
 destY = []
-
-# read CAD file into lists per column of data
-for line in lines:
-
-    if refpnt.match(line):
-
-        line = [x.strip() for x in line.split(',')]
-        line[0] = [x.strip() for x in line[0].split(' ')][-1]
-        refPts.append([int(line[0]), int(line[1]), float(line[2]), float(line[3])])
-
-    elif bondpnt.match(line):
-
-        line = [x.strip() for x in line.split(',')]
-        line[0] = int([x.strip() for x in line[0].split(' ')][-1])
-        line[2] = int(line[2])
-        line[3] = float(line[3])
-        line[4] = float(line[4])
-
-        if line[1] == '1':
-            wNums.append(line[0])
-            srceR.append(line[2])
-            srceX.append(line[3])
-            srceY.append(line[4])
-
-        if line[1] == '2':
-            destR.append(line[2])
-            destX.append(line[3])
-            destY.append(line[4])
-
-# read last bondpnt
-print(line[0], 'wires found')
+stats = RunningStats() # extents and centres, gathered while reading
+
+if title.endswith('.plan'):
+    # numpy only needed for binary plans
+    from plan import load_plan
+    plan = load_plan(title)
+    stats.add_block(plan.wires)
+    for ref in plan.refs.tolist():
+        refPts.append([ref[0], 1, ref[3], ref[4]])
+        refPts.append([ref[0], 2, ref[5], ref[6]])
+    wNums = plan.wires['wire'].tolist()
+    pinNums = plan.wires['pin'].tolist()
+    srceR = plan.wires['srce_ref'].tolist()
+    srceX = plan.wires['sx'].tolist()
+    srceY = plan.wires['sy'].tolist()
+    destR = plan.wires['dest_ref'].tolist()
+    destX = plan.wires['dx'].tolist()
+    destY = plan.wires['dy'].tolist()
+else:
+    fin = open(title, 'rt')
+    lines = fin.readlines()
+    fin.close()
+
+    print(len(lines), 'lines read')
+
+    # read CAD file into lists per column of data
+    cad = read_cad(lines, stats)
+    refPts = cad['refs']
+    wNums = cad['wire']
+    srceR = cad['srce_ref']
+    srceX = cad['sx']
+    srceY = cad['sy']
+    destR = cad['dest_ref']
+    destX = cad['dx']
+    destY = cad['dy']
+
+print(len(wNums), 'wires found')
+run.mark('read')
 
 # test list lengths
 length = len(wNums)
-if any(len(chk) != length for chk in [srceR, srceX, srceY, destR, destX, destY]):
+# entries short or over the wire count in each list, so shortfalls and excesses do not cancel
+missing = sum(abs(length - len(chk)) for chk in [srceR, srceX, srceY, destR, destX, destY])
+if missing:
     print('data missing in list')
+run.problems.inc(missing, script='svg', level='error', check='data missing in list')
 
 refMin, refMax = min_max(srceR)
 
 colors = ['red', 'purple', 'orange', 'brown', 'green', 'blue']
 wireNums = []
+pinText = []
 refText = []
 refMark = []
 chipPads = []
@@ -219,7 +248,7 @@ for val in refPts:
         else:
             srcArea.append(ref_path)
 
-srce_centre = {'x': mid_value(srceX), 'y': mid_value(srceY)}
+srce_centre = dict(zip('xy', stats.centre()))
 refMark.append(use('centre', str(srce_centre['x']), str(-srce_centre['y'] )))
 
 # wireLists length 12 refers 0_11 converts 3_14
@@ -234,27 +263,42 @@ for i in range(len(srceX)):
         dst = str(destX[i]) + ' ' + str(-destY[i])
         wId = 'w' + str( wNums[ i ] ) # str( i + 1 )
 
-        grp.append( '\t<path id="'+wId+'" d="M'+src+'L'+dst+'z"/>' )
-
-# wire-numbers and rects affixed to wires; adjust length to slide numbers along wires
+        if COMPACT:
+            grp.append('\t<path id="'+wId+'" d="'+wire_path(srceX[i], srceY[i], destX[i], destY[i], PRECISION)+'"/>')
+        else:
+            grp.append( '\t<path id="'+wId+'" d="M'+src+'L'+dst+'z"/>' )
+
+# wire-numbers and rects affixed to wires; dx slides numbers along wires
+if PLACE_LABELS:
+    num_dx, pin_dx, _, crowded = label_wires(srceX, srceY, destX, destY, wNums, pinNums or None, 13 / MAG)
+    num_dx = num_dx.tolist()
+    pin_dx = pin_dx.tolist() if pinNums else []
+    if crowded:
+        print(crowded, 'labels overlap, no free place along their wires')
 for i in range(len(wNums)):
-    length = math.sqrt((destX[i] - srceX[i])**2 + (destY[i] - srceY[i])**2)
-
-    if srceX[i] < -500:
-    #if(destX[i] < -69 or destY[i] < 0):
-        length -= 1 # flips numbers upside-down, varies with font-size
+    if PLACE_LABELS:
+        length = num_dx[i]
     else:
-        length -= 0.5
-    length = rnd(length)
+        length = rnd(math.sqrt((destX[i] - srceX[i])**2 + (destY[i] - srceY[i])**2) - 0.5)
 
-    #print(srceX[i], length)
-    
     n = str(wNums[i])
     textpath = '<textPath xlink:href="#w'+n+'">'+n+'</textPath>'
 
     wireNums.append(text(str(length), '0', '0', '0', textpath))
-    chipPads.append(use('chip', str(srceX[i]), str(-srceY[i])))
-    pcbPads.append(use('pcb', str(destX[i]), str(-destY[i])))
+    if pinNums:
+        pin_path = '<textPath xlink:href="#w'+n+'">'+str(pinNums[i])+'</textPath>'
+        pinText.append(text(str(pin_dx[i]) if PLACE_LABELS else '0', '0', '0', '0', pin_path))
+    if not COMPACT:
+        chipPads.append(use('chip', str(srceX[i]), str(-srceY[i])))
+        pcbPads.append(use('pcb', str(destX[i]), str(-destY[i])))
+
+if COMPACT:
+    # pads need no ids, so each kind is a single path
+    chipPads.append('\t<path d="'+squares_path(srceX, srceY, 0.08, PRECISION)+'"/>')
+    pcbPads.append('\t<path d="'+squares_path(destX, destY, 0.15, PRECISION)+'"/>')
+
+run.ranks('all', len(wireGrps), len(set(destR)))
+run.mark('draw')
 
 #MAG = 100 # up to 60 for readable text on A3 print!
 # wrap lists of shapes in styled g elements Wire stroke, font-size, x1000!
@@ -267,6 +311,7 @@ for wgrp in range(len(wireGrps)):
     to_grp(wireGrps[wgrp], '<g stroke="'+col+'" stroke-width="'+stroke_width+'" id="'+rId+'">')
 
 to_grp(wireNums, '<g id="nums" font-size="'+text_size+'">') #  text-anchor="end" x1000?
+to_grp(pinText, '<g id="pins" font-size="'+text_size+'" fill="#a42">')
 to_grp(chipPads, '<g id="chipPads" fill="#ddd">')
 to_grp(pcbPads, '<g id="pcbPads"  fill="#fda">')
 to_grp(refText, '<g id="refText" font-size="'+text_size+'" fill="#089">') #  text-anchor="end"
@@ -275,12 +320,7 @@ to_grp(dstArea, '<g id="dstAreas" fill="#086" fill-opacity="0.4">')
 to_grp(srcArea, '<g id="srcAreas" fill="#fff" stroke="#fff" stroke-width="'+stroke_width+'" >')
 
 # viewBox settings
-DEST_X_RANGE = min_max(destX)
-DEST_Y_RANGE = min_max(destY)
-X_MIN = DEST_X_RANGE[0]
-X_MAX = DEST_X_RANGE[1]
-Y_MIN = DEST_Y_RANGE[0]
-Y_MAX = DEST_Y_RANGE[1]
+X_MIN, Y_MIN, X_MAX, Y_MAX = stats.extents('d')
 BORDER = 0.2
 
 X_SIZE = X_MAX - X_MIN + 2 * BORDER
@@ -297,8 +337,8 @@ bgPos_X = str(X_MIN - BORDER/2)
 bgPos_Y = str(-Y_MAX - BORDER/2)
 bg_dest = '<rect id="destarea" x="'+ bgPos_X + '" y="'+ bgPos_Y + '" height="'+ bg_Y + '" width="'+ bg_X +'" fill="#d8e8ff" />'
 
-mm_X = min_max(srceX)
-mm_Y = min_max(srceY)
+mm_X = stats.low['sx'], stats.high['sx']
+mm_Y = stats.low['sy'], stats.high['sy']
 X_pitch = srceX[1] - srceX[0]
 
 mm_W = str(mm_X[1] - mm_X[0] + 2 * X_pitch)
@@ -307,9 +347,12 @@ mmPosX = str(mm_X[0] - X_pitch)
 mmPosY = str(-mm_Y[1] - X_pitch)
 bg_srce = '<rect id="srcearea" x="'+ mmPosX + '" y="'+ mmPosY + '" height="'+ mm_H + '" width="'+ mm_W +'" fill="#def" />'
 
-FOUT = open(out_file + '.html', 'wt')
+FOUT = io.StringIO()
 
-print(html_head(MAG, X_SIZE, Y_SIZE, X_ABS, Y_ABS), file=FOUT)
+if SVGZ:
+    print(svg_open(MAG, X_SIZE, Y_SIZE, X_ABS, Y_ABS), file=FOUT)
+else:
+    print(html_head(MAG, X_SIZE, Y_SIZE, X_ABS, Y_ABS), file=FOUT)
 print(svg_defs(), file=FOUT)
 
 '''If a background colour is desired...'''
@@ -317,15 +360,26 @@ print(svg_defs(), file=FOUT)
 print(bg_srce, file=FOUT)
 
 print_lists = [chipPads, pcbPads, wireNums, refText, refMark]
+if pinNums:
+    print_lists.append(pinText)
 print_lists.extend(wireGrps)
 
 for lst in print_lists:
     for val in lst:
         print(val, file=FOUT)
 
-print('</svg></div></body></html>', file=FOUT)
+if SVGZ:
+    print('</svg>', file=FOUT)
+    text_bytes, file_bytes = save_text(out_file + '.svgz', FOUT.getvalue(), gz=True)
+    print('SVGZ file created,', text_bytes, 'bytes,', file_bytes, 'on disk')
+else:
+    print('</svg></div></body></html>', file=FOUT)
+    page = FOUT.getvalue()
+    with open(out_file + '.html', 'wt') as fout:
+        fout.write(page)
+    print('HTML file created,', len(page.encode('utf-8')), 'bytes')
 FOUT.close()
-print('HTML file created')
+run.mark('write')
 # change font size by replacing the group element style
 MAG = input("Change magnification for inset or Enter (10): ")
 if not MAG:
@@ -363,3 +417,8 @@ print('</svg></div></body></html>', file=INSET_FOUT)
 
 INSET_FOUT.close()
 print('Insets file created')
+run.mark('insets')
+run.wires(len(wNums))
+if METRICS:
+    run.finish(run.path(out_file))
+    print(run.path(out_file), 'file created')
@@ -0,0 +1,110 @@
+"""
+Compact SVG encoding shared by cad2svg.py and svg.py.
+
+Coordinates are rounded to a set number of decimals and written without trailing
+zeros; paths use relative commands, taken from rounded absolute positions so they
+do not drift; wires or pads that need no id of their own can share a single path.
+Y is inverted for SVG here, callers pass CAD coordinates.
+"""
+import gzip
+import os
+
+import numpy as np
+
+
+def quantize(values, precision):
+    """CAD values as integer steps of the last kept decimal"""
+    return np.rint(np.asarray(values, dtype=np.float64) * 10 ** precision).astype(np.int64)
+
+
+def num(q, precision) -> str:
+    """One quantized value as the shortest decimal string"""
+    scale = 10 ** precision
+    whole, frac = divmod(abs(q), scale)
+    text = str(whole)
+    if frac:
+        text += ('.' + str(frac).rjust(precision, '0')).rstrip('0')
+    return '-' + text if q < 0 else text
+
+
+def _pair(cmd, a, b, precision) -> str:
+    """Command and coordinate pair, no separator needed before a minus sign"""
+    a = num(a, precision)
+    b = num(b, precision)
+    return cmd + a + ('' if b[0] == '-' else ' ') + b
+
+
+def wire_path(sx, sy, dx, dy, precision=3) -> str:
+    """Path data for one wire, e.g. M1.2 3.4l0.5-1"""
+    s_x, s_y, d_x, d_y = quantize([sx, -sy, dx, -dy], precision).tolist()
+    return _pair('M', s_x, s_y, precision) + _pair('l', d_x - s_x, d_y - s_y, precision)
+
+
+def segments_path(sx, sy, dx, dy, precision=3) -> str:
+    """Path data for many wires as one path: a move and a line per wire, all relative"""
+    s_x = quantize(sx, precision)
+    s_y = quantize(-np.asarray(sy, dtype=np.float64), precision)
+    d_x = quantize(dx, precision)
+    d_y = quantize(-np.asarray(dy, dtype=np.float64), precision)
+    if not len(s_x):
+        return ''
+    # each move is from the end of the previous wire
+    m_x = s_x.copy()
+    m_y = s_y.copy()
+    m_x[1:] -= d_x[:-1]
+    m_y[1:] -= d_y[:-1]
+    moves = zip(m_x.tolist(), m_y.tolist(), (d_x - s_x).tolist(), (d_y - s_y).tolist())
+    parts = [_pair('m', a, b, precision) + _pair('l', c, d, precision) for a, b, c, d in moves]
+    parts[0] = 'M' + parts[0][1:]
+    return ''.join(parts)
+
+
+def squares_path(x, y, size, precision=3) -> str:
+    """Path data for pads as squares of side size centred on each point, one path for all"""
+    side = int(quantize(size, precision))
+    half = side // 2
+    c_x = quantize(x, precision) - half
+    c_y = quantize(-np.asarray(y, dtype=np.float64), precision) - half
+    if not len(c_x):
+        return ''
+    # after z the pen is back at the corner the square started from
+    m_x = np.diff(c_x, prepend=0)
+    m_y = np.diff(c_y, prepend=0)
+    box = 'h' + num(side, precision) + 'v' + num(side, precision) + 'h' + num(-side, precision) + 'z'
+    parts = [_pair('m', a, b, precision) + box for a, b in zip(m_x.tolist(), m_y.tolist())]
+    parts[0] = 'M' + parts[0][1:]
+    return ''.join(parts)
+
+
+def save_text(path, text, gz=False) -> tuple:
+    """Write text, gzipped if gz; returns bytes of the text and bytes written"""
+    data = text.encode('utf-8')
+    if gz:
+        with gzip.open(path, 'wb') as fout:
+            fout.write(data)
+        return len(data), os.path.getsize(path)
+    with open(path, 'wb') as fout:
+        fout.write(data)
+    return len(data), len(data)
+
+
+class TextFile:
+    """
+    Text written a piece at a time, gzipped if gz, as save_text writes it all at once
+    """
+
+    def __init__(self, path, gz=False):
+        self.path = path
+        self.gz = gz
+        self.text_bytes = 0
+        self.fout = gzip.open(path, 'wb') if gz else open(path, 'wb')
+
+    def write(self, text) -> None:
+        data = text.encode('utf-8')
+        self.text_bytes += len(data)
+        self.fout.write(data)
+
+    def close(self) -> tuple:
+        """Bytes of the text and bytes written, as save_text returns them"""
+        self.fout.close()
+        return self.text_bytes, os.path.getsize(self.path)
@@ -0,0 +1,263 @@
+"""
+Canvas viewer: a self-contained HTML file that draws a program from packed arrays.
+
+Instead of one SVG element per wire, label and pad, the wire table is packed into
+typed arrays (coordinates, pin numbers, wire numbers, ref group), embedded as base64
+and drawn on a <canvas> by a small inline script. No network fetches.
+    drag to pan, wheel to zoom, hover a pad for its pin and wire numbers
+    labels are drawn once zoomed in far enough to read them
+
+Usage:
+    python viewer.py name.plan [-o name_view.html]
+A .CAD file can be given in place of the .plan, without pin numbers.
+"""
+import argparse
+import base64
+import html
+import json
+
+import numpy as np
+
+from plan import read_program
+
+# as in svg.py
+WIRE_COLORS = ['red', 'purple', 'orange', 'brown', 'green', 'blue']
+
+
+def _b64(arr) -> str:
+    return base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode('ascii')
+
+
+def payload(plan) -> dict:
+    """Wire table as little-endian typed arrays, wires grouped by srce ref system"""
+    wires = plan.wires
+    order = np.argsort(wires['srce_ref'], kind='stable')
+    wires = wires[order]
+    refs, group = np.unique(wires['srce_ref'], return_inverse=True)
+    starts = np.searchsorted(group, np.arange(len(refs) + 1))
+
+    xy = np.column_stack((wires['sx'], wires['sy'], wires['dx'], wires['dy'])).astype('<f4')
+    ref_xy = np.column_stack((plan.refs['x1'], plan.refs['y1'], plan.refs['x2'], plan.refs['y2'])).astype('<f4')
+    return {
+        'n': len(wires),
+        'groups': starts.tolist(),
+        'colors': WIRE_COLORS,
+        'xy': _b64(xy),
+        'pin': _b64(wires['pin'].astype('<i4')),
+        'wire': _b64(wires['wire'].astype('<i4')),
+        'ref': _b64(wires['srce_ref'].astype('<i4')),
+        'refs': _b64(ref_xy),
+        'refnum': _b64(plan.refs['ref'].astype('<i4')),
+    }
+
+
+VIEWER = r'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>__TITLE__</title>
+<meta charset="utf-8">
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font-family: sans-serif; }
+canvas { display: block; cursor: grab; }
+#tip { position: fixed; pointer-events: none; background: #fff; border: 1px solid #089;
+       padding: 2px 4px; font-size: 12px; display: none; }
+#title { position: fixed; left: 8px; top: 4px; font-size: 14px; color: #089; }
+</style>
+</head>
+<body>
+<div id="title">__TITLE__</div>
+<canvas id="view"></canvas>
+<div id="tip"></div>
+<script>
+const DATA = __DATA__;
+(function () {
+  const buf = (s) => Uint8Array.from(atob(s), (c) => c.charCodeAt(0)).buffer;
+  const n = DATA.n;
+  const xy = new Float32Array(buf(DATA.xy));
+  const pin = new Int32Array(buf(DATA.pin));
+  const wire = new Int32Array(buf(DATA.wire));
+  const sref = new Int32Array(buf(DATA.ref));
+  const refs = new Float32Array(buf(DATA.refs));
+  const refnum = new Int32Array(buf(DATA.refnum));
+  const canvas = document.getElementById('view');
+  const tip = document.getElementById('tip');
+  const ctx = canvas.getContext('2d');
+  const LABEL_PX = 14;   // label drawn when a 0.15 mm label height spans this many pixels
+  const HIT_PX = 8;
+
+  let x0 = Infinity, y0 = Infinity, x1 = -Infinity, y1 = -Infinity;
+  for (let i = 0; i < 4 * n; i += 2) {
+    x0 = Math.min(x0, xy[i]); x1 = Math.max(x1, xy[i]);
+    y0 = Math.min(y0, xy[i + 1]); y1 = Math.max(y1, xy[i + 1]);
+  }
+  if (!n) { x0 = y0 = -1; x1 = y1 = 1; }
+
+  // grid of pads for hover hit-tests, srce pads are i, dest pads are n + i
+  const CELLS = 256;
+  const cell = Math.max(x1 - x0, y1 - y0, 1e-3) / CELLS;
+  const grid = new Map();
+  const key = (cx, cy) => cx * 65536 + cy;
+  for (let i = 0; i < 2 * n; i++) {
+    const j = i < n ? 4 * i : 4 * (i - n) + 2;
+    const k = key(Math.floor((xy[j] - x0) / cell), Math.floor((xy[j + 1] - y0) / cell));
+    if (!grid.has(k)) grid.set(k, []);
+    grid.get(k).push(i);
+  }
+
+  let scale = 1, vx = x0, vy = y1;   // screen = ((x - vx) * scale, (vy - y) * scale)
+  function fit() {
+    canvas.width = window.innerWidth;
+    canvas.height = window.innerHeight;
+    scale = 0.95 * Math.min(canvas.width / (x1 - x0 || 1), canvas.height / (y1 - y0 || 1));
+    vx = (x0 + x1) / 2 - canvas.width / 2 / scale;
+    vy = (y0 + y1) / 2 + canvas.height / 2 / scale;
+  }
+  const sx = (x) => (x - vx) * scale;
+  const sy = (y) => (vy - y) * scale;
+
+  let pending = false;
+  function redraw() {
+    if (!pending) { pending = true; requestAnimationFrame(draw); }
+  }
+
+  function draw() {
+    pending = false;
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.lineWidth = 1;
+    const g = DATA.groups;
+    for (let k = 0; k + 1 < g.length; k++) {
+      ctx.strokeStyle = DATA.colors[k % DATA.colors.length];
+      ctx.beginPath();
+      for (let i = g[k]; i < g[k + 1]; i++) {
+        ctx.moveTo(sx(xy[4 * i]), sy(xy[4 * i + 1]));
+        ctx.lineTo(sx(xy[4 * i + 2]), sy(xy[4 * i + 3]));
+      }
+      ctx.stroke();
+    }
+    pads(0, 0.08, '#bbb');
+    pads(2, 0.15, '#fda');
+
+    ctx.strokeStyle = '#089';
+    ctx.beginPath();
+    const arm = Math.max(0.2 * scale, 4);
+    for (let i = 0; i < refs.length; i += 2) {
+      const px = sx(refs[i]), py = sy(refs[i + 1]);
+      ctx.moveTo(px - arm, py); ctx.lineTo(px + arm, py);
+      ctx.moveTo(px, py - arm); ctx.lineTo(px, py + arm);
+    }
+    ctx.stroke();
+
+    if (0.15 * scale >= LABEL_PX) labels();
+  }
+
+  function pads(at, size, color) {
+    const side = Math.max(size * scale, 1.5);
+    ctx.fillStyle = color;
+    for (let i = 0; i < n; i++) {
+      const px = sx(xy[4 * i + at]), py = sy(xy[4 * i + at + 1]);
+      if (px < -side || py < -side || px > canvas.width + side || py > canvas.height + side) continue;
+      ctx.fillRect(px - side / 2, py - side / 2, side, side);
+    }
+  }
+
+  function labels() {
+    ctx.font = Math.round(0.12 * scale) + 'px sans-serif';
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'middle';
+    for (let i = 0; i < n; i++) {
+      const ax = sx(xy[4 * i]), ay = sy(xy[4 * i + 1]);
+      const bx = sx(xy[4 * i + 2]), by = sy(xy[4 * i + 3]);
+      if (Math.max(ax, bx) < 0 || Math.min(ax, bx) > canvas.width) continue;
+      if (Math.max(ay, by) < 0 || Math.min(ay, by) > canvas.height) continue;
+      ctx.fillStyle = '#a42';
+      if (pin[i] >= 0) ctx.fillText(pin[i], ax + (bx - ax) * 0.15, ay + (by - ay) * 0.15);
+      ctx.fillStyle = '#089';
+      ctx.fillText(wire[i], ax + (bx - ax) * 0.8, ay + (by - ay) * 0.8);
+    }
+    ctx.fillStyle = '#089';
+    for (let i = 0; i < refs.length; i += 2) {
+      ctx.fillText(refnum[i >> 2] + (i % 4 ? '.2' : '.1'), sx(refs[i]) + 0.2 * scale, sy(refs[i + 1]) - 0.2 * scale);
+    }
+  }
+
+  function hit(mx, my) {
+    const wx = vx + mx / scale, wy = vy - my / scale;
+    const r = HIT_PX / scale;
+    const reach = Math.min(Math.ceil(r / cell), CELLS);
+    const cx = Math.floor((wx - x0) / cell), cy = Math.floor((wy - y0) / cell);
+    let best = -1, bestD = r * r;
+    for (let gx = cx - reach; gx <= cx + reach; gx++) {
+      for (let gy = cy - reach; gy <= cy + reach; gy++) {
+        const list = grid.get(key(gx, gy));
+        if (!list) continue;
+        for (const i of list) {
+          const j = i < n ? 4 * i : 4 * (i - n) + 2;
+          const d = (xy[j] - wx) ** 2 + (xy[j + 1] - wy) ** 2;
+          if (d <= bestD) { best = i; bestD = d; }
+        }
+      }
+    }
+    return best;
+  }
+
+  let drag = null;
+  canvas.addEventListener('mousedown', (e) => { drag = [e.clientX, e.clientY]; canvas.style.cursor = 'grabbing'; });
+  window.addEventListener('mouseup', () => { drag = null; canvas.style.cursor = 'grab'; });
+  canvas.addEventListener('mousemove', (e) => {
+    if (drag) {
+      vx -= (e.clientX - drag[0]) / scale;
+      vy += (e.clientY - drag[1]) / scale;
+      drag = [e.clientX, e.clientY];
+      tip.style.display = 'none';
+      redraw();
+      return;
+    }
+    const i = hit(e.clientX, e.clientY);
+    if (i < 0) { tip.style.display = 'none'; return; }
+    const w = i % n;
+    tip.textContent = (pin[w] >= 0 ? 'pin ' + pin[w] + ', ' : '') + 'wire ' + wire[w] +
+      ', ref ' + sref[w] + (i < n ? ' (srce)' : ' (dest)');
+    tip.style.left = (e.clientX + 12) + 'px';
+    tip.style.top = (e.clientY + 12) + 'px';
+    tip.style.display = 'block';
+  });
+  canvas.addEventListener('wheel', (e) => {
+    e.preventDefault();
+    const f = Math.exp(-e.deltaY * 0.0015);
+    const wx = vx + e.clientX / scale, wy = vy - e.clientY / scale;
+    scale *= f;
+    vx = wx - e.clientX / scale;
+    vy = wy + e.clientY / scale;
+    redraw();
+  }, { passive: false });
+  window.addEventListener('resize', () => { fit(); redraw(); });
+  fit();
+  redraw();
+})();
+</script>
+</body>
+</html>
+'''
+
+
+def viewer_html(plan, title) -> str:
+    """Whole viewer page, data and script inline"""
+    return VIEWER.replace('__TITLE__', html.escape(title)).replace('__DATA__', json.dumps(payload(plan)))
+
+
+def write_viewer(plan, path, title=None) -> None:
+    with open(path, 'wt') as fout:
+        fout.write(viewer_html(plan, title or path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Canvas viewer of a program')
+    parser.add_argument('program', help='.plan or .CAD file')
+    parser.add_argument('-o', '--out', help='html file name')
+    args = parser.parse_args()
+
+    name = args.program.rsplit('.', 1)[0]
+    out = args.out or name + '_view.html'
+    write_viewer(read_program(args.program), out, name)
+    print(out, 'file created')